@@ -1,4 +1,12 @@
+import numpy as np
+import StackPoints as sp
+import records as rec
+
+
 class DrawManager(object):
+    # Database of the slabs (or line points) drawn as items, set by setup_slabs
+    frame = None
+
     def __init__(self, parent, mode=None):
         self.parent = parent
         self.mode = mode
@@ -6,109 +14,183 @@ class DrawManager(object):
     def setup(self, *args):
         pass
 
-    def draw(self, *args):
-        pass
+    def draw(self, resize=False):
+        """
+        Function to determine which items to show in the current browser view: Nodes and Slabs in the current z slice
+        +/- an offset value (1 slice by default), and EdgeSegments that have any visible endpoints. Only the slices
+        entering or leaving that range are shown or hidden (see visibility). Also rescales all items if the window is
+        resized.
 
-    def hide_slice(self, sliceZ, scroll_dir, **kwargs):
-
-        lnIdx_attrName = None
-        ptParent_attrName = None
-
-        if 'lnIdx_attrName' in kwargs:
-            lnIdx_attrName = kwargs['lnIdx_attrName']
-
-        if 'ptParent_attrName' in kwargs:
-            ptParent_attrName = kwargs['ptParent_attrName']
-
-        if sliceZ is not None:
-            if sliceZ in self.parent.slabs:
-                for s in self.parent.slabs[sliceZ]:
-                    lnIdx = getattr(s.dfentry, lnIdx_attrName)
-                    try:
-                        if not self.parent.edges[lnIdx].isSelected():
-                            s.hide()
-                        if getattr(s.dfentry, lnIdx_attrName) in self.parent.edge_segs:
-                            for es in self.parent.edge_segs[lnIdx]:
-                                cond = None
-                                if scroll_dir == 'down':
-                                    cond = es.endpoints[0].dfentry.z <= sliceZ and (
-                                        es.endpoints[1].dfentry.z <= sliceZ) and not (
-                                        self.parent.edges[es.idx].isSelected())
-                                elif scroll_dir == 'up':
-                                    cond = es.endpoints[0].dfentry.z >= sliceZ and (
-                                        es.endpoints[1].dfentry.z >= sliceZ) and not (
-                                        self.parent.edges[es.idx].isSelected())
-                                if cond:
-                                    es.hide()
-                    except KeyError:
-                        pass
-
-            if sliceZ in self.parent.nodes:
-                for n in self.parent.nodes[sliceZ]:
-                    eList = str(getattr(n.dfentry, ptParent_attrName))
-                    selected = False
-                    if not eList != eList:
-                        eList = eList.split(';')[0:-1]
-                        for idx in eList:
-                            try:
-                                if self.parent.edges[int(idx)].isSelected():
-                                    selected = True
-                            except KeyError:
-                                pass
-                    if not n.isSelected() and not selected:
-                        n.hide()
+        :param resize: A boolean indicating if the call for this function occurred during a resize event.
+
+        :type resize: bool
+
+        :return: None
+        """
+
+        # If overlay is not visible, do nothing
+        if not self.parent.isVisible:
+            return
+
+        # Else, set offset from current z to search for items to be shown, within the stack
+        offset = self.parent.offset
+        d1 = max(int(self.parent.browser.z - offset), 0)
+        d2 = min(int(self.parent.browser.z + offset), int(self.parent.browser.stack.maxz))
 
-    def resize(self):
         # Check scale out of scope so the current stored scale can be modified
         scale = float(self.parent.browser.splitter.width()) / self.parent.browser.stack.imarray.shape[1]
-        # Scale all items (both visible and invisible) via a linear iteration through each member dict,
-        # so scales of all items are easy to keep track of
-        for k in self.parent.slabs:
-            for s in self.parent.slabs[k]:
-                s.setPos(s.pos() / self.parent.cur_scale * scale)
-        for idx in self.parent.edge_segs:
-            # Handle error case of edge with one slab (shouldn't occur, but can if there was an error in the
-            # creation of the initial text file)
-            try:
-                for es in self.parent.edge_segs[idx]:
-                    temp = es.line()
-                    temp.setPoints(es.line().p1() / self.parent.cur_scale * scale,
-                                   es.line().p2() / self.parent.cur_scale * scale)
-                    es.setLine(temp)
-            except KeyError:
-                pass
-        for k in self.parent.nodes:
-            for n in self.parent.nodes[k]:
-                n.setPos(n.pos() / self.parent.cur_scale * scale)
-
-    def display(self, top, bot, **kwargs):
-
-        lnIdx_attrName = None
-
-        if 'lnIdx_attrName' in kwargs:
-            lnIdx_attrName = kwargs['lnIdx_attrName']
-
-        for z in range(top, bot + 1):
-            visible_edges = []
-            if z in self.parent.slabs:
-                for s in self.parent.slabs[z]:
-                    lnIdx = getattr(s.dfentry, lnIdx_attrName)
-                    try:  # Faster to handle exceptions than check slabs
-                        _ = self.parent.edge_segs[lnIdx]
-                        s.show()
-                        if lnIdx not in visible_edges:
-                            visible_edges.append(lnIdx)
-                    except KeyError:
-                        pass
-
-                for idx in visible_edges:
-                    try:
-                        for es in self.parent.edge_segs[idx]:
-                            if es.endpoints[0].isVisible() or es.endpoints[1].isVisible():
-                                es.show()
-                    except KeyError:
-                        pass
-
-            if z in self.parent.nodes:
-                for n in self.parent.nodes[z]:
-                    n.show()
+
+        if resize:
+            self.resize()
+
+        self.parent.visibility.update(d1, d2)
+
+        self.parent.cur_scale = scale
+
+    def resize(self):
+        """
+        Rescales all items to the current size of the image container. Items are positioned in image pixels under
+        the widget's root item, so this only changes the root's transform, whatever the number of items.
+
+        :return: None
+        """
+        scale = float(self.parent.browser.splitter.width()) / self.parent.browser.stack.imarray.shape[1]
+        self.parent.set_scale(scale)
+
+    def add_segment(self, es):
+        """
+        Adds an EdgeSegment to the layer of its slice, or to the segments spanning slices if its endpoints lie in
+        different ones.
+
+        :param es: The segment, with its endpoints set
+
+        :type es: StackPoints.DrawingPointsWidget.EdgeSegment
+
+        :return: None
+        """
+        z0, z1 = es.endpoints[0].dfentry.z, es.endpoints[1].dfentry.z
+        if z0 == z1:
+            self.parent.add_to_slice(es, z0)
+        else:
+            self.parent.add_cross_segment(es)
+
+    def setup_slabs(self, frame, parent_idx_name, rectSize, draw_tools):
+        """
+        Prepares the slabs (or line points) of a stack and the EdgeSegments joining them to be drawn as items. The
+        positions, pairing and slicing of the slabs are taken from the widget's geometry (see overlaydata), computed
+        with numpy for the whole stack; the items themselves are only created once their slice is displayed (see
+        materialize), or their edge selected.
+
+        :param frame: The slab database, in the order of the geometry
+        :param parent_idx_name: The column of the database holding each slab's edge index
+        :param rectSize: The width and height of each slab's bounding box
+        :param draw_tools: The pens and brushes of the items, as passed to setup
+
+        :type frame: pandas.DataFrame
+        :type parent_idx_name: str
+        :type rectSize: tuple(int, int)
+        :type draw_tools: tuple
+
+        :return: None
+        """
+        self.frame = frame
+        self.columns = rec.Columns(frame)
+        self.parent_idx_name = parent_idx_name
+        self.rectSize = rectSize
+        self.slab_tools = draw_tools[0]
+        self.edge_pen = draw_tools[1]
+        self.slab_items = {}
+        self.seg_items = {}
+        self.materialized = set()
+
+    def materialize(self, z):
+        """
+        Creates the items of the slabs of a slice and of the segments with an endpoint in it, unless done already.
+
+        :param z: The depth of the slice
+
+        :type z: int
+
+        :return: None
+        """
+        if self.frame is None or z in self.materialized:
+            return
+        self.materialized.add(z)
+        self._create_slabs(self.parent.geometry.slabs_in(z, z))
+        self._create_segments(self.parent.geometry.segments_at(z))
+
+    def materialize_edge(self, idx):
+        """
+        Creates the items of all slabs and segments of an edge, whatever slices are displayed, so it can be
+        highlighted as a whole.
+
+        :param idx: The edge index
+
+        :type idx: int
+
+        :return: None
+        """
+        if self.frame is None:
+            return
+        self._create_segments(self.parent.geometry.edge_segments([idx]))
+
+    def _create_slabs(self, rows):
+        """
+        Creates the Slabs of the given rows of the database that do not exist yet.
+
+        :param rows: The row positions of the slabs
+
+        :type rows: numpy.ndarray[int]
+
+        :return: None
+        """
+        rows = [row for row in rows if row not in self.slab_items]
+        if not rows:
+            return
+        rectWidth, rectHeight = self.rectSize
+        slab_pen, slab_brush = self.slab_tools
+        geometry = self.parent.geometry
+        for row in rows:
+            slab = self.columns.record(row)
+            # The bounding box is centred on the item's position, which is in image pixels
+            s = sp.DrawingPointsWidget.Slab(-rectWidth/2.0, -rectHeight/2.0, rectWidth, rectHeight, dfentry=slab,
+                                            widget=self.parent, parent_idx_name=self.parent_idx_name)
+            s.setPos(geometry.x[row], geometry.y[row])
+            s.setPen(slab_pen)
+            s.setBrush(slab_brush)
+            s.setZValue(s.zValue() + 1)
+            self.parent.slabs.setdefault(slab.z, []).append(s)
+            self.parent.add_to_slice(s, slab.z)
+            self.slab_items[row] = s
+
+    def _create_segments(self, segs):
+        """
+        Creates the EdgeSegments of the given segments of the geometry that do not exist yet, along with their
+        endpoint Slabs, and adds them to their edges.
+
+        :param segs: The segment indices
+
+        :type segs: numpy.ndarray[int]
+
+        :return: None
+        """
+        geometry = self.parent.geometry
+        segs = [seg for seg in segs if seg not in self.seg_items]
+        if not segs:
+            return
+        starts, ends = geometry.seg_start[segs], geometry.seg_end[segs]
+        self._create_slabs(np.unique(np.concatenate([starts, ends])))
+        for seg, a, b in zip(segs, starts, ends):
+            idx = geometry.edge[a].item()
+            es = sp.DrawingPointsWidget.EdgeSegment(0.0, 0.0, 0.0, 0.0, idx=idx, widget=self.parent)
+            es.endpoints = [self.slab_items[a], self.slab_items[b]]
+            es.setLine(geometry.x[a], geometry.y[a], geometry.x[b], geometry.y[b])
+            es.setPen(self.edge_pen)
+            self.parent.edge_segs.setdefault(idx, []).append(es)
+            self.add_segment(es)
+            self.seg_items[seg] = es
+            edge = self.parent.edges.get(idx)
+            if edge is not None:
+                for ep in es.endpoints:
+                    if ep not in edge.slabs:
+                        edge.slabs.append(ep)
@@ -0,0 +1,349 @@
+import struct
+import numpy as np
+import PyQt4.QtCore as qc
+import PyQt4.QtGui as qg
+
+# On-screen diameter of a slab, in pixels
+SLAB_SIZE = 9
+
+# Maximum on-screen distance from a slab for a click to select its edge, in pixels
+SELECT_RADIUS = 6
+
+# Repaints exposing less than this fraction of the image only draw the slabs and segments inside the exposed area
+CULL_FRACTION = 0.5
+
+SLAB_COLOR = qc.Qt.cyan
+SEGMENT_COLOR = qc.Qt.red
+SELECTED_COLOR = qg.QColor(255, 105, 255)
+
+
+def points_polygon(x, y):
+    """
+    Builds a QPolygonF from coordinate arrays by writing them straight into its buffer, rather than creating a QPointF
+    per point.
+
+    :param x: The x-coordinates of the points
+    :param y: The y-coordinates of the points
+
+    :type x: numpy.ndarray
+    :type y: numpy.ndarray
+
+    :rtype: PyQt4.QtGui.QPolygonF
+    """
+    polygon = qg.QPolygonF(len(x))
+    if len(x) > 0:
+        ptr = polygon.data()
+        ptr.setsize(len(x) * 2 * 8)
+        buf = np.ndarray(shape=(len(x), 2), dtype=np.float64, buffer=ptr)
+        buf[:, 0] = x
+        buf[:, 1] = y
+    return polygon
+
+
+def lines_path(x0, y0, x1, y1):
+    """
+    Builds a QPainterPath of separate line segments from coordinate arrays. The path is deserialized from a binary
+    stream written with numpy, rather than built with a moveTo and lineTo call per segment.
+
+    :param x0: The x-coordinates of the first endpoints
+    :param y0: The y-coordinates of the first endpoints
+    :param x1: The x-coordinates of the second endpoints
+    :param y1: The y-coordinates of the second endpoints
+
+    :type x0: numpy.ndarray
+    :type y0: numpy.ndarray
+    :type x1: numpy.ndarray
+    :type y1: numpy.ndarray
+
+    :rtype: PyQt4.QtGui.QPainterPath
+    """
+    path = qg.QPainterPath()
+    n = len(x0)
+    if n == 0:
+        return path
+    # QDataStream layout of a QPainterPath: element count, then (type, x, y) per element, then the index of the
+    # element starting the last subpath (cStart), then the fill rule
+    elements = np.empty(2 * n, dtype=[('type', '>i4'), ('x', '>f8'), ('y', '>f8')])
+    elements['type'][0::2] = qg.QPainterPath.MoveToElement
+    elements['type'][1::2] = qg.QPainterPath.LineToElement
+    elements['x'][0::2], elements['y'][0::2] = x0, y0
+    elements['x'][1::2], elements['y'][1::2] = x1, y1
+    data = qc.QByteArray(struct.pack('>i', 2 * n) + elements.tobytes() +
+                         struct.pack('>ii', 2 * n - 2, qc.Qt.OddEvenFill))
+    stream = qc.QDataStream(data)
+    stream >> path
+    if stream.status() != qc.QDataStream.Ok:
+        # Layout not understood by this Qt version: build the path one segment at a time
+        path = qg.QPainterPath()
+        for ax, ay, bx, by in zip(x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist()):
+            path.moveTo(ax, ay)
+            path.lineTo(bx, by)
+    return path
+
+
+class OverlayItem(qg.QGraphicsItem):
+    """
+    Graphics item drawing all slabs and edge segments of the visible range of slices at once, as a polygon of points
+    and a path of lines built from numpy arrays, instead of one item (and one Python paint call) per slab or segment.
+    Coordinates are image pixels; the item is scaled to the displayed image size by its parent's transform.
+
+    Clicking selects the node, slab or segment under the cursor, found through spatial indices (see spatialindex)
+    rather than Qt's index of the scene. The item's drawing is cached in a pixmap by the view, so repaints that don't
+    change it (e.g. when other items move or are selected) only copy the pixmap; repaints of part of the cache (e.g.
+    after a selection change, or when zoomed in) only draw what lies in the exposed area, also found through the
+    indices.
+    """
+    def __init__(self, data, width, height, widget, *_args):
+        """
+        Initializer for OverlayItem. Uses _args to call initializer of superclass (QGraphicsItem).
+
+        :param data: The slab and segment geometry to draw
+        :param width: The width of the image, in pixels
+        :param height: The height of the image, in pixels
+        :param widget: The DrawingPointsWidget managing the overlay, notified of edge selection
+        :param _args: Default positional arguments for the QGraphicsItem initializer (unmodified)
+
+        :type data: overlaydata.OverlayData
+        :type width: int
+        :type height: int
+        :type widget: StackPoints.DrawingPointsWidget
+        :type _args: list
+        """
+        super(OverlayItem, self).__init__(*_args)
+        # Needed for paint() to be told which part of the item is exposed
+        self.setFlag(qg.QGraphicsItem.ItemUsesExtendedStyleOption)
+        # Drawn again only when the slices shown, the selection or the view's transform change
+        self.setCacheMode(qg.QGraphicsItem.DeviceCoordinateCache)
+        self.data = data
+        self.widget = widget
+        self.selected = set()
+        self._rect = qc.QRectF(0, 0, width, height)
+        self._visible = np.zeros(len(data.x), dtype=bool)
+        self._visible_segments = np.zeros(len(data.seg_start), dtype=bool)
+        # Number of endpoints of each segment in the slices shown; segments are drawn while it is not 0
+        self._ends_shown = np.zeros(len(data.seg_start), dtype=np.int8)
+        self._shown = set()
+        self._dirty = False
+        self._slabs = qg.QPolygonF()
+        self._segments = qg.QPainterPath()
+        self._selected_slabs = qg.QPolygonF()
+        self._selected_segments = qg.QPainterPath()
+
+        self._slab_pen = self._pen(SLAB_COLOR, SLAB_SIZE)
+        self._segment_pen = self._pen(SEGMENT_COLOR, 1)
+        self._selected_slab_pen = self._pen(SELECTED_COLOR, SLAB_SIZE)
+        self._selected_segment_pen = self._pen(SELECTED_COLOR, 3)
+
+    def _scale(self):
+        # On-screen size of an image pixel, set by the transforms of the item's parents
+        return max(self.sceneTransform().m11(), 1e-6)
+
+    @staticmethod
+    def _pen(color, width):
+        # Cosmetic pens keep their on-screen width whatever the item's scale
+        pen = qg.QPen(qg.QColor(color), width, qc.Qt.SolidLine, qc.Qt.RoundCap)
+        pen.setCosmetic(True)
+        return pen
+
+    def set_range(self, top, bot):
+        """
+        Draws the slabs with a depth in a range, and the segments with an endpoint in it, instead of those drawn.
+
+        :param top: The first slice of the range
+        :param bot: The last slice of the range
+
+        :type top: int
+        :type bot: int
+
+        :return: None
+        """
+        window = set(range(top, bot + 1))
+        self.hide_slices(self._shown - window)
+        self.show_slices(window - self._shown)
+
+    def show_slices(self, zs):
+        """
+        Starts drawing the slabs of the given slices, and the segments with an endpoint in them.
+
+        :param zs: The depths of the slices
+
+        :type zs: list[int]
+
+        :return: None
+        """
+        self._change_slices([z for z in zs if z not in self._shown], 1)
+
+    def hide_slices(self, zs):
+        """
+        Stops drawing the slabs of the given slices, and the segments left without an endpoint in a slice drawn.
+
+        :param zs: The depths of the slices
+
+        :type zs: list[int]
+
+        :return: None
+        """
+        self._change_slices([z for z in zs if z in self._shown], -1)
+
+    def _change_slices(self, zs, step):
+        """
+        Shows (step 1) or hides (step -1) slices, only visiting their own slabs and segments. Consecutive slices are
+        handled together as a range, so large depth windows cost a few numpy operations rather than a loop per slice.
+        The polygon and path drawn are rebuilt on the next paint.
+
+        :param zs: The depths of the slices, none of which is shown (or all of which are, when hiding)
+        :param step: 1 to show the slices, -1 to hide them
+
+        :type zs: list[int]
+        :type step: int
+
+        :return: None
+        """
+        if not zs:
+            return
+        data = self.data
+        zs = np.unique(zs)
+        for run in np.split(zs, np.flatnonzero(np.diff(zs) != 1) + 1):
+            top, bot = int(run[0]), int(run[-1])
+            self._visible[data.slabs_in(top, bot)] = step > 0
+            segs, ends = data.segment_ends_in(top, bot)
+            # A segment spanning slices within the run appears once per endpoint
+            np.add.at(self._ends_shown, segs, (step * ends).astype(np.int8))
+            self._visible_segments[segs] = self._ends_shown[segs] > 0
+        if step > 0:
+            self._shown.update(zs.tolist())
+        else:
+            self._shown.difference_update(zs.tolist())
+        self._dirty = True
+        self.update()
+
+    def _rebuild(self):
+        """
+        Rebuilds the polygon and path of all drawn slabs and segments.
+
+        :return: None
+        """
+        slabs = np.flatnonzero(self._visible)
+        self._slabs = points_polygon(self.data.x[slabs], self.data.y[slabs])
+        self._segments = self._path(np.flatnonzero(self._visible_segments))
+        self._dirty = False
+
+    def select(self, edges):
+        """
+        Highlights the given edges (and only them), whatever slices are drawn. Only the area covered by the edges
+        whose selection changes is repainted.
+
+        :param edges: The edge indices
+
+        :type edges: list[int] | set[int]
+
+        :return: None
+        """
+        edges = set(edges)
+        changed = self.data.edge_slabs(self.selected ^ edges)
+        self.selected = edges
+        slabs = self.data.edge_slabs(edges)
+        self._selected_slabs = points_polygon(self.data.x[slabs], self.data.y[slabs])
+        self._selected_segments = self._path(self.data.edge_segments(edges))
+        if len(changed) > 0:
+            x, y = self.data.x[changed], self.data.y[changed]
+            margin = SLAB_SIZE / self._scale()
+            self.update(qc.QRectF(x.min() - margin, y.min() - margin, x.max() - x.min() + 2 * margin,
+                                  y.max() - y.min() + 2 * margin))
+
+    def _path(self, segments):
+        """
+        Builds the path of the given segments.
+
+        :param segments: The segment indices
+
+        :type segments: numpy.ndarray[int]
+
+        :rtype: PyQt4.QtGui.QPainterPath
+        """
+        start, end = self.data.seg_start[segments], self.data.seg_end[segments]
+        return lines_path(self.data.x[start], self.data.y[start], self.data.x[end], self.data.y[end])
+
+    def boundingRect(self):
+        # Slabs are drawn with a cosmetic pen, so may stick out of the image by half their on-screen size
+        margin = SLAB_SIZE / self._scale()
+        return self._rect.adjusted(-margin, -margin, margin, margin)
+
+    def paint(self, painter, option, widget=0):
+        """
+        Overloaded function from QGraphicsItem; draws the visible segments and slabs, then the selected ones on top.
+
+        :param painter: A QPainter object, which manages low-level painting functions
+        :param option: A QStyleOptionGraphicsItem instance Qt uses to store the options used when drawing the item.
+        :param widget: The QWidget to paint on
+
+        :type painter: PyQt4.QtGui.QPainter
+        :type option: PyQt4.QtGui.QStyleOptionGraphicsItem
+        :type widget: PyQt4.QtGui.QWidget
+
+        :return: None
+        """
+        painter.setBrush(qc.Qt.NoBrush)
+        if self._dirty:
+            self._rebuild()
+        slabs, segments = self._slabs, self._segments
+        exposed = option.exposedRect
+        if exposed.width() * exposed.height() < CULL_FRACTION * self._rect.width() * self._rect.height():
+            # Only draw what lies in the exposed area (widened by the on-screen size of a slab)
+            margin = SLAB_SIZE / self._scale()
+            rect = exposed.adjusted(-margin, -margin, margin, margin)
+            bounds = (rect.left(), rect.top(), rect.right(), rect.bottom())
+            culled = self.data.slab_index.query_rect(*bounds)
+            culled = culled[self._visible[culled]]
+            slabs = points_polygon(self.data.x[culled], self.data.y[culled])
+            culled = self.data.segment_index.query_rect(*bounds)
+            segments = self._path(culled[self._visible_segments[culled]])
+        painter.setPen(self._segment_pen)
+        painter.drawPath(segments)
+        painter.setPen(self._slab_pen)
+        painter.drawPoints(slabs)
+        painter.setPen(self._selected_segment_pen)
+        painter.drawPath(self._selected_segments)
+        painter.setPen(self._selected_slab_pen)
+        painter.drawPoints(self._selected_slabs)
+
+    def mousePressEvent(self, event):
+        """
+        Overloaded function from QGraphicsItem; selects the node under the cursor or, failing that, the edge of the
+        drawn slab or segment nearest to the click, if any is close enough. Shift-clicking adds the edge to the
+        selection, or removes it. Otherwise deselects everything (unless Ctrl or Shift is held) and passes the click
+        on to the items below.
+
+        :param event: The mouse event
+
+        :type event: PyQt4.QtGui.QGraphicsSceneMouseEvent
+
+        :return: None
+        """
+        pos = event.pos()
+        radius = SELECT_RADIUS / self._scale()
+        keep = event.modifiers() & qc.Qt.ControlModifier
+        toggle = event.modifiers() & qc.Qt.ShiftModifier
+        node = self.widget.node_at(pos.x(), pos.y(), radius)
+        if node is not None:
+            if not keep:
+                self.scene().clearSelection()
+            node.setSelected(True)
+            return
+
+        slab = self.data.slab_index.nearest(pos.x(), pos.y(), radius, mask=self._visible)
+        if slab is not None:
+            edge = self.data.edge[slab]
+        else:
+            segment = self.data.segment_index.nearest(pos.x(), pos.y(), radius, mask=self._visible_segments)
+            edge = None if segment is None else self.data.seg_edge[segment]
+        if edge is None:
+            if not keep and not toggle:
+                self.scene().clearSelection()
+                self.widget.select_edges([])
+            event.ignore()
+            return
+        if toggle:
+            self.widget.toggle_edge(edge.item())
+        else:
+            self.widget.select_edges([edge.item()])
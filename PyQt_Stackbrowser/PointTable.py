@@ -1,24 +1,266 @@
+import collections
+import numpy as np
 import PyQt4.QtCore as qc
+import pointquery as pq
 
+# Number of rows handed to the view at a time, as it scrolls towards the end of those it has (see ChunkedRows)
+FETCH_ROWS = 1000
 
-class PointTable(qc.QAbstractTableModel):
-    def __init__(self, data, parent=None):
-        super(PointTable, self).__init__(parent)
-        self._data = data
+# Number of formatted cells kept, enough for a few screens of the table
+CELL_CACHE = 4096
+
+
+class ChunkedRows(object):
+    """
+    Mixin for the flat models of the point list, handing their rows to the view in chunks of FETCH_ROWS as it scrolls.
+    The model sets its number of rows through set_row_total, when created and whenever that number changes.
+    """
+    def set_row_total(self, rows):
+        """
+        Sets the number of rows of the model, handing the view the first chunk of them only.
+
+        :param rows: The number of rows, whether or not the view has them yet
+
+        :type rows: int
+
+        :return: None
+        """
+        self._row_total = rows
+        self._fetched = min(FETCH_ROWS, rows)
+
+    def fetch_to(self, row):
+        """
+        Hands the view all rows up to a given row, if it doesn't have them yet (e.g. to select a row it hasn't
+        scrolled to).
+
+        :param row: The row
+
+        :type row: int
+
+        :return: None
+        """
+        last = min(int(row), self._row_total - 1)
+        if last >= self._fetched:
+            self.beginInsertRows(qc.QModelIndex(), self._fetched, last)
+            self._fetched = last + 1
+            self.endInsertRows()
+
+    def canFetchMore(self, parent=None):
+        if parent is not None and parent.isValid():
+            return False
+        return self._fetched < self._row_total
+
+    def fetchMore(self, parent=None):
+        if parent is not None and parent.isValid():
+            return
+        self.fetch_to(self._fetched + FETCH_ROWS - 1)
+
+    def fetch_all(self):
+        """
+        Hands the view all rows it doesn't have yet.
+
+        :return: None
+        """
+        self.fetch_to(self._row_total - 1)
 
     def rowCount(self, parent=None, *args, **kwargs):
-        return len(self._data.values)
+        if parent is not None and parent.isValid():
+            return 0
+        return self._fetched
+
+
+class PointTable(ChunkedRows, qc.QAbstractTableModel):
+    """
+    Table model of a database for the point list. The columns are taken from the DataFrame once, as typed numpy arrays,
+    and cells are only formatted when shown (keeping the most recent in a small cache), so showing a cell costs the
+    same whatever the size of the database. Rows are handed to the view in chunks as it scrolls (see ChunkedRows).
+    """
+    def __init__(self, data, parent=None):
+        """
+        Constructor.
+
+        :param data: The database
+        :param parent: The parent object
+
+        :type data: pandas.DataFrame
+        :type parent: PyQt4.QtCore.QObject
+        """
+        super(PointTable, self).__init__(parent)
+        self.dframe = data
+        self._columns = [data[name].values for name in data.columns]
+        self._headers = list(data.columns)
+        self._cells = collections.OrderedDict()
+        self.set_row_total(len(data.index))
 
     def columnCount(self, parent=None, *args, **kwargs):
-        return self._data.columns.size
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self._columns)
 
     def data(self, index, role=qc.Qt.DisplayRole):
         if index.isValid():
             if role == qc.Qt.DisplayRole:
-                return str(self._data.values[index.row()][index.column()])
+                return self._cell(index.row(), index.column())
         return None
 
     def headerData(self, col, orientation, role=None):
         if orientation == qc.Qt.Horizontal and role == qc.Qt.DisplayRole:
-            return self._data.columns[col]
+            return self._headers[col]
+        return None
+
+    def _cell(self, row, col):
+        """
+        Returns the text of a cell, formatted on first use and cached (least recently used cells are dropped first).
+
+        :param row: The row of the cell
+        :param col: The column of the cell
+
+        :type row: int
+        :type col: int
+
+        :rtype: str
+        """
+        key = (row, col)
+        text = self._cells.pop(key, None)
+        if text is None:
+            value = self._columns[col][row]
+            text = str(value.item() if isinstance(value, np.generic) else value)
+            if len(self._cells) >= CELL_CACHE:
+                self._cells.popitem(last=False)
+        self._cells[key] = text
+        return text
+
+
+class PointProxy(ChunkedRows, qc.QAbstractProxyModel):
+    """
+    Sorted and filtered view of a PointTable, for the point list. The proxy only keeps the source row of each of its
+    rows (see pointquery.PointQuery for how they are found); cells are read from the source model through
+    mapToSource, so selections map back to the source rows, i.e. the nodes' indices.
+    """
+    def __init__(self, source, parent=None):
+        """
+        Constructor; shows all rows of the source model, in order.
+
+        :param source: The model of the database
+        :param parent: The parent object
+
+        :type source: PointTable
+        :type parent: PyQt4.QtCore.QObject
+        """
+        super(PointProxy, self).__init__(parent)
+        # Rows are handed to the view by the proxy, so the source needs all of its own
+        source.fetch_all()
+        self.setSourceModel(source)
+        self.query = pq.PointQuery(source.dframe)
+        self._filter = ''
+        self._sort_column = -1
+        self._sort_order = qc.Qt.AscendingOrder
+        self._source_rows = np.arange(len(self.query))
+        self._positions = None
+        self.set_row_total(len(self._source_rows))
+
+    def set_filter(self, text):
+        """
+        Shows only the rows satisfying a filter (see pointquery.PointQuery.filter), keeping the current sort order.
+
+        :param text: The filter
+
+        :type text: str
+
+        :raises ValueError: If the filter can't be read; the rows shown are then left unchanged
+
+        :return: None
+        """
+        rows = self.query.filter(text)
+        self._filter = text
+        self._show(rows)
+
+    def sort(self, column, order=qc.Qt.AscendingOrder):
+        """
+        Sorts the rows shown by a column (or restores the order of the source for a negative column).
+
+        :param column: The column
+        :param order: The sort order
+
+        :type column: int
+        :type order: PyQt4.QtCore.Qt.SortOrder
+
+        :return: None
+        """
+        self._sort_column = column
+        self._sort_order = order
+        self._show(self.query.filter(self._filter))
+
+    def _show(self, rows):
+        """
+        Replaces the rows shown by the given source rows, sorted by the current sort column.
+
+        :param rows: The source rows, in order
+
+        :type rows: numpy.ndarray[int]
+
+        :return: None
+        """
+        if 0 <= self._sort_column < len(self.query.columns):
+            rows = self.query.sort(rows, self.query.columns[self._sort_column],
+                                   descending=self._sort_order == qc.Qt.DescendingOrder)
+        self.beginResetModel()
+        self._source_rows = rows
+        self._positions = None
+        self.set_row_total(len(rows))
+        self.endResetModel()
+
+    def source_position(self, source_row):
+        """
+        Returns the row showing a source row, handing the view all rows up to it (e.g. to select it).
+
+        :param source_row: The source row
+
+        :type source_row: int
+
+        :return: The row, or -1 if the source row is filtered out
+        :rtype: int
+        """
+        row = self._position(source_row)
+        if row >= 0:
+            self.fetch_to(row)
+        return row
+
+    def _position(self, source_row):
+        # Row showing each source row (-1 for those filtered out), made when first needed after the rows change
+        if self._positions is None:
+            self._positions = np.full(len(self.query), -1, dtype=np.intp)
+            self._positions[self._source_rows] = np.arange(len(self._source_rows))
+        return int(self._positions[int(source_row)])
+
+    def columnCount(self, parent=None, *args, **kwargs):
+        if parent is not None and parent.isValid():
+            return 0
+        return self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=None):
+        if (parent is not None and parent.isValid()) or not (0 <= row < self._fetched and
+                                                             0 <= column < self.columnCount()):
+            return qc.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return qc.QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return qc.QModelIndex()
+        return self.sourceModel().index(int(self._source_rows[proxy_index.row()]), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return qc.QModelIndex()
+        return self.index(self._position(source_index.row()), source_index.column())
+
+    def headerData(self, section, orientation, role=None):
+        if orientation == qc.Qt.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        if role == qc.Qt.DisplayRole and 0 <= section < self._fetched:
+            # Number the rows by their source row, i.e. the node's index
+            return str(self._source_rows[section])
         return None
@@ -0,0 +1,201 @@
+import time
+import collections
+import numpy as np
+import sip
+import PyQt4.QtCore as qc
+import PyQt4.QtGui as qg
+
+# Number of recent frames kept for latency statistics
+LATENCY_FRAMES = 100
+
+# Side length of a tile, in slice pixels
+TILE_SIZE = 256
+
+# Maximum number of converted tiles kept for reuse
+TILE_CACHE_SIZE = 256
+
+
+class SliceItem(qg.QGraphicsItem):
+    """
+    Graphics item displaying one stack slice as a grid of tiles. Only the tiles intersecting the exposed area of the
+    view are converted to display values and painted, so when zoomed in the per-frame cost shrinks with the visible
+    area. Converted tiles are cached per slice, pyramid level, contrast setting and position.
+
+    Tiles wrap numpy buffers in QImages without copying (8-bit tiles are not even converted; their contrast is applied
+    through the colour table), and any scaling is done by the item's transform. The item also records the latency of
+    recent frames, from the start of the slice change to its first paint.
+    """
+    def __init__(self, *_args):
+        """
+        Initializer for SliceItem. Uses _args to call initializer of superclass (QGraphicsItem).
+
+        :param _args: Default positional arguments for the QGraphicsItem initializer (unmodified)
+
+        :type _args: list
+        """
+        super(SliceItem, self).__init__(*_args)
+        # Needed for paint() to be told which part of the item is exposed
+        self.setFlag(qg.QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.tiles = collections.OrderedDict()
+        self.zero_copy = None
+        self.tiles_painted = 0
+        self.latencies = collections.deque(maxlen=LATENCY_FRAMES)
+        self._slice = None
+        self._slice_key = None
+        self._engine = None
+        self._palette = None
+        self._frame_start = None
+
+    def setSlice(self, stack_slice, slice_key, engine, palette, frame_start=None):
+        """
+        Displays a new slice. Nothing is converted until the slice is painted.
+
+        :param stack_slice: The unconverted slice to display
+        :param slice_key: Hashable identifier of the slice (e.g. stack, depth and pyramid level), used to key its tiles
+        :param engine: The contrast engine converting the slice to display values
+        :param palette: The colour table of the channel, as qRgb values
+        :param frame_start: When the slice change started, as returned by time.time(); used to record its latency
+
+        :type stack_slice: numpy.ndarray
+        :type slice_key: tuple
+        :type engine: contrast.ContrastEngine
+        :type palette: list[int]
+        :type frame_start: float
+
+        :return: None
+        """
+        if self._slice is None or stack_slice.shape != self._slice.shape:
+            self.prepareGeometryChange()
+        self._slice = stack_slice
+        self._slice_key = slice_key
+        self._engine = engine
+        self._palette = palette
+        self._frame_start = frame_start
+        self.update()
+
+    def fitWidth(self, width):
+        """
+        Scales the item so the slice spans the given width in scene coordinates.
+
+        :param width: The width to fit the slice to
+
+        :type width: int
+
+        :return: None
+        """
+        if self._slice is not None:
+            self.setScale(float(width) / self._slice.shape[1])
+
+    def invalidate(self, slice_key=None):
+        """
+        Drops cached tiles so they are converted again when next painted.
+
+        :param slice_key: Only drop the tiles of this slice (all tiles by default)
+
+        :type slice_key: tuple
+
+        :return: None
+        """
+        if slice_key is None:
+            self.tiles.clear()
+        else:
+            for key in [k for k in self.tiles if k[0] == slice_key]:
+                del self.tiles[key]
+        self.update()
+
+    def latency(self):
+        """
+        Summarizes the latency of recent frames.
+
+        :return: The number of frames measured, their mean and maximum latency in milliseconds, the number of tiles
+                 painted in the last frame, and whether the last tile converted shares its pixels with numpy
+
+        :rtype: dict[str, int | float | bool]
+        """
+        times = np.array(self.latencies) * 1000
+        return {'frames': len(times), 'mean_ms': times.mean() if len(times) else 0.0,
+                'max_ms': times.max() if len(times) else 0.0, 'tiles': self.tiles_painted,
+                'zero_copy': self.zero_copy}
+
+    def boundingRect(self):
+        if self._slice is None:
+            return qc.QRectF()
+        return qc.QRectF(0, 0, self._slice.shape[1], self._slice.shape[0])
+
+    def paint(self, painter, option, widget=0):
+        """
+        Overloaded function from QGraphicsItem; draws the tiles intersecting the exposed area, scaled by the item and
+        view transforms.
+
+        :param painter: A QPainter object, which manages low-level painting functions
+        :param option: A QStyleOptionGraphicsItem instance Qt uses to store the options used when drawing the item.
+        :param widget: The QWidget to paint on
+
+        :type painter: PyQt4.QtGui.QPainter
+        :type option: PyQt4.QtGui.QStyleOptionGraphicsItem
+        :type widget: PyQt4.QtGui.QWidget
+
+        :return: None
+        """
+        if self._slice is None:
+            return
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        tx0, ty0 = int(exposed.left()) // TILE_SIZE, int(exposed.top()) // TILE_SIZE
+        tx1 = (int(np.ceil(exposed.right())) - 1) // TILE_SIZE
+        ty1 = (int(np.ceil(exposed.bottom())) - 1) // TILE_SIZE
+        self.tiles_painted = 0
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                image = self._tile(ty, tx)
+                if image is not None:
+                    painter.drawImage(qc.QPointF(tx * TILE_SIZE, ty * TILE_SIZE), image)
+                    self.tiles_painted += 1
+        if self._frame_start is not None:
+            self.latencies.append(time.time() - self._frame_start)
+            self._frame_start = None
+
+    def _tile(self, ty, tx):
+        """
+        Returns the image of a tile of the current slice, converting and caching it if necessary.
+
+        :param ty: Row of the tile
+        :param tx: Column of the tile
+
+        :type ty: int
+        :type tx: int
+
+        :return: The tile, or None if it lies outside the slice
+
+        :rtype: PyQt4.QtGui.QImage | None
+        """
+        y0, x0 = ty * TILE_SIZE, tx * TILE_SIZE
+        if y0 >= self._slice.shape[0] or x0 >= self._slice.shape[1]:
+            return None
+        dtype = self._slice.dtype
+        # Tiles displayed through the colour table don't depend on the contrast setting
+        contrast_key = None if self._engine.folds(dtype) else self._engine.key
+        key = (self._slice_key, contrast_key, ty, tx)
+
+        if key in self.tiles:
+            entry = self.tiles.pop(key)
+        else:
+            data = self._engine.apply(self._slice[y0:y0 + TILE_SIZE, x0:x0 + TILE_SIZE])
+            if data.strides[1] != 1:
+                data = np.ascontiguousarray(data)
+            # Wrap the tile where it lies in memory, using the row stride of its array
+            image = qg.QImage(sip.voidptr(data.ctypes.data), data.shape[1], data.shape[0], data.strides[0],
+                              qg.QImage.Format_Indexed8)
+            self.zero_copy = int(image.constBits()) == data.ctypes.data
+            # The array is kept with the image, which reads from its buffer
+            entry = [image, data, None]
+            while len(self.tiles) >= TILE_CACHE_SIZE:
+                self.tiles.popitem(last=False)
+        self.tiles[key] = entry
+
+        table = self._engine.color_table(self._palette, dtype)
+        if entry[2] is not table:
+            entry[0].setColorTable(table)
+            entry[2] = table
+        return entry[0]
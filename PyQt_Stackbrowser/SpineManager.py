@@ -1,5 +1,6 @@
 import StackPoints as sp
 import DrawManager as dm
+import records as rec
 
 
 class SpineManager(dm.DrawManager):
@@ -10,86 +11,14 @@ class SpineManager(dm.DrawManager):
         super(dm.DrawManager, self).__init__()
         self.parent = parent
 
-    def setup(self, loc_params, rectSize, draw_tools):
-        self.setup_spines(loc_params, rectSize, draw_tools)
-        self.setup_lines(loc_params, rectSize, draw_tools)
-        self.setup_edges()
-
-    def setup_lines(self, loc_params, rectSize, draw_tools):
-        xfactor = loc_params[0]
-        yfactor = loc_params[1]
-        xtranslate = loc_params[2]
-        ytranslate = loc_params[3]
-
-        rectWidth = rectSize[0]
-        rectHeight = rectSize[1]
-
-        slab_pen = draw_tools[0][0]
-        slab_brush = draw_tools[0][1]
-
-        edge_pen = draw_tools[1]
-
-        # Place all items in the correct position, and store them in dicts
-        time = 0
-        prev_slab = None
-        prev_pos = (0, 0)
-
-        for slab in self.parent.browser.stack.line_db.dframe.itertuples():
-            s = sp.DrawingPointsWidget.Slab(0.0, 0.0, rectWidth, rectHeight, dfentry=slab, widget=self.parent,
-                                            parent_idx_name='ID')
-            xpos = slab.x * xfactor / self.parent.browser.stack.dx + xtranslate
-            ypos = slab.y * yfactor / self.parent.browser.stack.dy + ytranslate
-            s.setPos(xpos - rectWidth/2, ypos - rectHeight/2)  # Note: Coordinates for QGraphicsEllipseItems are the
-                                                               # upper-left corner of the item's bounding box,
-                                                               # so need to translate to center
-            s.setPen(slab_pen)
-            s.setBrush(slab_brush)
-            s.setZValue(s.zValue() + 1)
-            s.hide()
-
-            if slab.z not in self.parent.slabs:
-                self.parent.slabs[slab.z] = [s]
-            else:
-                self.parent.slabs[slab.z].append(s)
-            self.parent.browser.scene.addItem(s)
-
-            time, prev_slab, prev_pos = self._connect_slabs(time, prev_slab, prev_pos, s, (xpos, ypos), edge_pen)
-
-    def _connect_slabs(self, time, prev_slab, prev_pos, cur_slab, cur_pos, edge_pen):
-        # Connect each Slab that has a neighbor of the same edge index with an EdgeSegment
-        entry = cur_slab.dfentry
-        if time == 0:
-            prev_slab = cur_slab
-            prev_xpos = cur_pos[0]
-            prev_ypos = cur_pos[1]
-            time += 1
-        else:
-            if entry.ID == prev_slab.dfentry.ID and (
-                        entry.prevNode == prev_slab.dfentry.prevNode + 1 or entry.prevNode == -1):
-                # Connect
-                es = sp.DrawingPointsWidget.EdgeSegment(0.0, 0.0, 0.0, 0.0, idx=entry.ID, widget=self.parent)
-                es.endpoints = [prev_slab, cur_slab]
-                es.setLine(prev_pos[0], prev_pos[1], cur_pos[0], cur_pos[1])
-                es.setPen(edge_pen)
-                es.hide()
-                if entry.ID not in self.parent.edge_segs:
-                    self.parent.edge_segs[entry.ID] = [es]
-                else:
-                    self.parent.edge_segs[entry.ID].append(es)
-                self.parent.browser.scene.addItem(es)
-            prev_slab = cur_slab
-            prev_xpos = cur_pos[0]
-            prev_ypos = cur_pos[1]
-            time += 1
-
-        return time, prev_slab, (prev_xpos, prev_ypos)
-
-    def setup_spines(self, loc_params, rectSize, draw_tools):
-        xfactor = loc_params[0]
-        yfactor = loc_params[1]
-        xtranslate = loc_params[2]
-        ytranslate = loc_params[3]
+    def setup(self, rectSize, draw_tools):
+        self.setup_spines(rectSize, draw_tools)
+        # Lines and their segments are drawn by the batched overlay, if there is one
+        if self.parent.overlay is None:
+            self.setup_slabs(self.parent.browser.stack.line_db.dframe, 'ID', rectSize, draw_tools)
+            self.setup_edges()
 
+    def setup_spines(self, rectSize, draw_tools):
         rectWidth = rectSize[0]
         rectHeight = rectSize[1]
 
@@ -99,88 +28,32 @@ class SpineManager(dm.DrawManager):
         stack_df = self.parent.browser.stack.stack_db.dframe
         spines = stack_df.loc[stack_df.roiType == 'spineROI']
 
-        for node in spines.itertuples():
-            n = sp.DrawingPointsWidget.Node(0.0, 0.0, rectWidth, rectHeight, dfentry=node, widget=self.parent)
-            xpos = node.x * xfactor / self.parent.browser.stack.dx + xtranslate
-            ypos = node.y * yfactor / self.parent.browser.stack.dy + ytranslate
-            n.setPos(xpos - rectWidth/2, ypos - rectHeight/2)
+        for node in rec.Columns(spines).records():
+            # Positioned in image pixels, with the bounding box centred on the position
+            n = sp.DrawingPointsWidget.Node(-rectWidth/2.0, -rectHeight/2.0, rectWidth, rectHeight, dfentry=node,
+                                            widget=self.parent)
+            n.setPos(node.x / self.parent.browser.stack.dx, node.y / self.parent.browser.stack.dy)
             n.setPen(node_pen)
             n.setBrush(node_brush)
             n.setZValue(n.zValue() + 1)
-            n.hide()
             if node.z not in self.parent.nodes:
                 self.parent.nodes[node.z] = [n]
             else:
                 self.parent.nodes[node.z].append(n)
             self.parent.nodes_by_idx[node.Idx] = n
-            self.parent.browser.scene.addItem(n)
+            self.parent.add_to_slice(n, node.z)
 
     def setup_edges(self):
+        # Lines without any segment are never drawn; the segments and points of the others are added to them as they
+        # are created
+        drawn = set(self.parent.geometry.seg_edge.tolist())
         lines = self.parent.browser.stack.line_db.dframe
-        for edge in lines.loc[lines.prevNode == -1].itertuples():
+        for edge in rec.Columns(lines.loc[lines.prevNode == -1]).records():
             idx = edge.ID
-            try:
-                e = sp.DrawingPointsWidget.Edge(widget=self.parent, idx=idx, dfentry=edge,
-                                                edge_segs=self.parent.edge_segs[idx])
-                # e.source = self.parent.nodes_by_idx[e.dfentry.sourceIdx]
-                # e.target = self.parent.nodes_by_idx[e.dfentry.targetIdx]
-                for seg in e.edge_segs:
-                    for ep in seg.endpoints:
-                        if ep not in e.slabs:
-                            e.slabs.append(ep)
-                self.parent.edges[idx] = e
-            except KeyError:
-                pass
-
-    def draw(self, resize=False):
-        """
-        Function to determine which items to show in the current browser view. Checks for Nodes and Slabs in the
-        current z slice +/- an offset value (1 slice by default), and EdgeSegments that have any visible endpoints,
-        and displays them. Also rescales all items if the window is resized.
-
-        :param resize: A boolean indicating if the call for this function occurred during a resize event.
-
-        :type resize: bool
-
-        :return: None
-        """
-
-        # If overlay is not visible, do nothing
-        if not self.parent.isVisible:
-            return
-
-        # Else, set offset from current z to search for items to be shown
-        offset = self.parent.offset
-
-        slab_parent_idx_name = 'ID'
-        node_parent_list_name = 'parentID'
-
-        # Calculate min slice in range
-        d1 = int(self.parent.browser.z - offset)
-        prev = d1 - 1
-        if d1 < 0:
-            d1 = 0
-            prev = None
-
-        # If scrolling down, hide items in previous uppermost visible slice (if not selected)
-        self.hide_slice(prev, 'down', lnIdx_attrName=slab_parent_idx_name, ptParent_attrName=node_parent_list_name)
-
-        # Calculate max slice of range
-        d2 = int(self.parent.browser.z + offset)
-        nxt = d2 + 1
-        if d2 > self.parent.browser.stack.maxz:
-            d2 = int(self.parent.browser.stack.maxz)
-            nxt = None
-
-        # If scrolling up, hide items in previous lowermost visible slice
-        self.hide_slice(nxt, 'up', lnIdx_attrName=slab_parent_idx_name, ptParent_attrName=node_parent_list_name)
-
-        # Check scale out of scope so the current stored scale can be modified
-        scale = float(self.parent.browser.splitter.width()) / self.parent.browser.stack.imarray.shape[1]
-
-        if resize:
-            self.resize()
-
-        self.display(d1, d2, lnIdx_attrName=slab_parent_idx_name)
-
-        self.parent.cur_scale = scale
+            if idx not in drawn:
+                continue
+            e = sp.DrawingPointsWidget.Edge(widget=self.parent, idx=idx, dfentry=edge,
+                                            edge_segs=self.parent.edge_segs.setdefault(idx, []))
+            # e.source = self.parent.nodes_by_idx[e.dfentry.sourceIdx]
+            # e.target = self.parent.nodes_by_idx[e.dfentry.targetIdx]
+            self.parent.edges[idx] = e
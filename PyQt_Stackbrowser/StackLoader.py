@@ -0,0 +1,162 @@
+import itertools
+import threading
+import Queue
+import PyQt4.QtCore as qc
+import tiffstack as ts
+
+# Queue priorities; stacks asked for by the user are loaded before speculative ones
+_REQUEST, _PRELOAD = 0, 1
+
+
+class StackLoader(qc.QObject):
+    """
+    Loads TiffStacks on a background thread so the GUI stays responsive while switching time points and channels.
+    Only the most recent request is delivered: asking for another stack cancels any request still waiting (a stack
+    already being read is finished and kept, but not delivered). Neighbouring stacks can be preloaded speculatively;
+    they are kept in the stack pool, within its memory budget, and are then handed out immediately when asked for.
+
+    Results are delivered through the 'loaded' and 'failed' signals, which are queued to the GUI thread.
+    """
+    loaded = qc.pyqtSignal(object, object)
+    failed = qc.pyqtSignal(object, object)
+
+    def __init__(self, pool, parent=None):
+        """
+        Constructor; starts the loading thread.
+
+        :param pool: Function returning the pool of open stacks, which holds the preloaded stacks until they are asked
+                     for (or evicted); called only once stacks are requested or loaded
+        :param parent: Parent QObject
+
+        :type pool: function
+        :type parent: PyQt4.QtCore.QObject
+        """
+        super(StackLoader, self).__init__(parent)
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._queue = Queue.PriorityQueue()
+        self._order = itertools.count()
+        self._generation = 0
+        self._wanted = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """
+        Path of the stack requested but not yet delivered, if any.
+
+        :rtype: str | None
+        """
+        return self._wanted
+
+    def request(self, path):
+        """
+        Asks for a stack, cancelling the previous request and any preloads still queued. If the stack was preloaded
+        it is returned at once; otherwise it is loaded in the background and delivered through the 'loaded' signal.
+
+        :param path: Path of the stack's TIFF file
+
+        :type path: str
+
+        :return: The stack if it is already loaded, else None
+
+        :rtype: tiffstack.TiffStack | None
+        """
+        with self._lock:
+            self._generation += 1
+            stack = self.pool().get(path)
+            if stack is not None:
+                self._wanted = None
+                return stack
+            self._wanted = path
+            generation = self._generation
+        self._queue.put((_REQUEST, next(self._order), generation, path))
+        return None
+
+    def cancel(self):
+        """
+        Cancels the current request and any queued preloads.
+
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            self._wanted = None
+
+    def preload(self, paths):
+        """
+        Queues stacks to be loaded speculatively, after the current request. Preloads are dropped by the next request.
+
+        :param paths: Paths of the stacks' TIFF files
+
+        :type paths: list[str]
+
+        :return: None
+        """
+        with self._lock:
+            generation = self._generation
+        for path in paths:
+            self._queue.put((_PRELOAD, next(self._order), generation, path))
+
+    def close(self):
+        """
+        Cancels all loading and stops the loading thread. Preloaded stacks are left to the pool.
+
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            self._wanted = None
+        self._queue.put((_REQUEST, -1, None, None))
+
+    def _run(self):
+        """
+        Body of the loading thread. Loads queued stacks until stopped, skipping those cancelled or already in the pool.
+        Stacks are delivered if requested, and otherwise added to the pool, whose budget they then count against.
+
+        :return: None
+        """
+        while True:
+            priority, _, generation, path = self._queue.get()
+            if path is None:
+                return
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                if path in self.pool() or (priority == _REQUEST and path != self._wanted):
+                    self._deliver(path, self.pool().get(path) if path == self._wanted else None)
+                    continue
+            try:
+                stack = ts.TiffStack(path)
+            except Exception as e:
+                # Keep the thread alive whatever goes wrong; only the user's own request is reported
+                with self._lock:
+                    if path == self._wanted:
+                        self._wanted = None
+                        self.failed.emit(path, str(e))
+                continue
+            with self._lock:
+                if not self._deliver(path, stack):
+                    self.pool().add(stack)
+
+    def _deliver(self, path, stack):
+        """
+        Hands a loaded stack to the GUI if it is the one requested. Must be called with the lock held.
+
+        :param path: Path of the stack's TIFF file
+        :param stack: The stack, or None if it is not loaded
+
+        :type path: str
+        :type stack: tiffstack.TiffStack | None
+
+        :return: Whether the stack was delivered
+
+        :rtype: bool
+        """
+        if path == self._wanted and stack is not None:
+            self._wanted = None
+            self.loaded.emit(path, stack)
+            return True
+        return False
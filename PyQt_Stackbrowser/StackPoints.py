@@ -1,7 +1,64 @@
+import numpy as np
 import PyQt4.QtCore as qc
 import PyQt4.QtGui as qg
 import VascManager as vm
 import SpineManager as sm
+import OverlayItem as oi
+import overlaydata as od
+import spatialindex as si
+import visibility as vis
+
+# How slabs and edge segments are drawn: 'items' creates a QGraphicsItem for each, 'batched' draws those of the
+# visible slices with a single OverlayItem (see 'benchmark.py overlay'). Nodes are always separate items.
+OVERLAY_RENDERER = 'batched'
+
+
+def cosmetic_pen(color, width):
+    """
+    Returns a pen for edge segments whose width is in screen pixels, whatever the scale of the items.
+
+    :param color: The color of the pen
+    :param width: The width of the pen, in screen pixels
+
+    :type color: PyQt4.QtGui.QColor | PyQt4.QtCore.Qt.GlobalColor
+    :type width: int
+
+    :rtype: PyQt4.QtGui.QPen
+    """
+    pen = qg.QPen(qg.QColor(color), width, qc.Qt.SolidLine, qc.Qt.RoundCap)
+    pen.setCosmetic(True)
+    return pen
+
+
+# Pens and brushes of the items, shared by all of them rather than created on every selection change
+SELECTED_COLOR = qg.QColor(255, 105, 255)
+SLAB_PEN = qg.QPen(qc.Qt.cyan, 4, qc.Qt.SolidLine, qc.Qt.RoundCap)
+SLAB_BRUSH = qg.QBrush(qc.Qt.cyan)
+SELECTED_SLAB_PEN = qg.QPen(SELECTED_COLOR, 4, qc.Qt.SolidLine, qc.Qt.RoundCap)
+SELECTED_SLAB_BRUSH = qg.QBrush(SELECTED_COLOR)
+EDGE_PEN = cosmetic_pen(qc.Qt.red, 1)
+SELECTED_EDGE_PEN = cosmetic_pen(SELECTED_COLOR, 3)
+NODE_PEN = qg.QPen(qc.Qt.red, 7, qc.Qt.SolidLine, qc.Qt.RoundCap)
+NODE_BRUSH = qg.QBrush(qc.Qt.red)
+SELECTED_NODE_PEN = qg.QPen(qc.Qt.yellow, 7, qc.Qt.SolidLine, qc.Qt.RoundCap)
+SELECTED_NODE_BRUSH = qg.QBrush(qc.Qt.yellow)
+TARGET_PEN = qg.QPen(qc.Qt.green, 7, qc.Qt.SolidLine, qc.Qt.RoundCap)
+TARGET_BRUSH = qg.QBrush(qc.Qt.green)
+
+
+def shift_as_control(event):
+    """
+    Makes Shift-clicks on an item behave as Ctrl-clicks, which Qt uses to add items to the selection or remove them
+    without deselecting the others.
+
+    :param event: The mouse event
+
+    :type event: PyQt4.QtGui.QGraphicsSceneMouseEvent
+
+    :return: None
+    """
+    if event.modifiers() & qc.Qt.ShiftModifier:
+        event.setModifiers(event.modifiers() | qc.Qt.ControlModifier)
 
 
 class DrawingPointsWidget(qg.QWidget):
@@ -17,6 +74,19 @@ class DrawingPointsWidget(qg.QWidget):
             * nodes, a dictionary of Node lists organized by z slice: dict[int z, list[Node n]]
             * slabs, a dictionary of Slab lists organized by z slice: dict[int z, list[Slab s]]
             * edge_segs, a dictionary of EdgeSegments organized by edge index: dict[int edgeIdx, list[EdgeSegment es]]
+            * layers, a dictionary of Layers organized by z slice, holding the items of each slice: dict[int z, Layer]
+            * cross_segs, a dictionary of EdgeSegments spanning several slices, organized by the z of each endpoint:
+              dict[int z, list[EdgeSegment es]]
+            * geometry, the slab and segment geometry of the stack as numpy arrays (see overlaydata)
+
+        Slabs and EdgeSegments are created the first time their slice is shown (or their edge selected), so the
+        dictionaries above only hold the items created so far. Items are shown and hidden a slice at a time through
+        their layer. EdgeSegments spanning several slices belong to no slice, and are shown and hidden individually.
+        Selected items are moved to a layer of their own that is always shown, and moved back once deselected.
+
+        With the batched renderer (see OVERLAY_RENDERER) no Slab, EdgeSegment or Edge items are made, so slabs,
+        edge_segs and edges stay empty: slabs and segments are drawn by the overlay, and edges are selected through
+        select_edges and toggle_edge (the selected edges are in overlay.selected) rather than through items.
 
         :param browser: The stack browser instance this widget will be a member of; passed so that all attributes are
                         passed by reference between both, and are up-to-date.
@@ -31,6 +101,19 @@ class DrawingPointsWidget(qg.QWidget):
 
         self.nodes_by_idx = {}
 
+        self.layers = {}
+        self.cross_segs = {}
+        self.cross_layer = None
+        self.selection_layer = None
+        self.root = None
+        self.visibility = None
+        self.geometry = None
+        self.overlay = None
+        self.node_index = None
+        self._node_keys = []
+        self._labelled = set()
+        self._edge_ends = None
+
         # Want to pass reference to keep z up-to-date
         self.browser = browser
         self.drawManager = None
@@ -98,14 +181,30 @@ class DrawingPointsWidget(qg.QWidget):
                 self.browser.scene.removeItem(item)
                 del item
 
+        # All items are positioned in image pixels under a root item, whose transform alone follows the size of the
+        # image container
+        self.root = self.Layer()
+        self.root.setZValue(1)
+        self.browser.scene.addItem(self.root)
+
+        # Slices shown, moved along as the browser scrolls
+        self.visibility = vis.VisibilityManager(self.show_slices, self.hide_slices)
+        self._labelled = set()
+
+        # Layers holding segments that span slices, and selected items; both always shown
+        self.cross_layer = self.Layer(self.root)
+        self.cross_layer.setZValue(1)
+        self.selection_layer = self.Layer(self.root)
+        self.selection_layer.setZValue(2)
+
         # Create pens and brushes to color nodes, slabs, and edges
-        slab_pen = qg.QPen(qc.Qt.cyan, 4, qc.Qt.SolidLine, qc.Qt.RoundCap)
-        slab_brush = qg.QBrush(qc.Qt.cyan)
+        slab_pen = SLAB_PEN
+        slab_brush = SLAB_BRUSH
 
-        edge_pen = qg.QPen(qc.Qt.red, 1, qc.Qt.SolidLine, qc.Qt.RoundCap)
+        edge_pen = EDGE_PEN
 
-        node_pen = qg.QPen(qc.Qt.red, 7, qc.Qt.SolidLine, qc.Qt.RoundCap)
-        node_brush = qg.QBrush(qc.Qt.red)
+        node_pen = NODE_PEN
+        node_brush = NODE_BRUSH
 
         # Size of each node/slab's bounding box
         rectWidth = 7
@@ -115,27 +214,39 @@ class DrawingPointsWidget(qg.QWidget):
         self.start_scale = float(self.browser.splitter.width()) / self.browser.stack.imarray.shape[1]
         self.cur_scale = self.start_scale
 
-        if xfactor is None:
-            xfactor = self.start_scale
-        else:
-            xfactor *= self.start_scale
+        self._factors = (xfactor or 1.0, yfactor or 1.0)
+        self._translate = (xtranslate or 0, ytranslate or 0)
+        self.set_scale(self.start_scale)
 
-        if yfactor is None:
-            yfactor = self.start_scale
+        # Slab positions, segments and slicing, computed up front with numpy for both renderers
+        stack = self.browser.stack
+        if stack.type == 'Vascular':
+            self.geometry = od.OverlayData.from_slabs(stack.slab_db.dframe, stack.dx, stack.dy)
         else:
-            yfactor *= self.start_scale
-
-        if xtranslate is None:
-            xtranslate = 0
+            self.geometry = od.OverlayData.from_lines(stack.line_db.dframe, stack.dx, stack.dy)
 
-        if ytranslate is None:
-            ytranslate = 0
+        if OVERLAY_RENDERER == 'batched':
+            self.overlay = oi.OverlayItem(self.geometry, stack.imarray.shape[2], stack.imarray.shape[1], self,
+                                          self.root)
+            # Below the nodes, so clicks reach them first
+            self.overlay.setZValue(0.5)
 
-        loc_params = (xfactor, yfactor, xtranslate, ytranslate)
         rectSize = (rectWidth, rectHeight)
         draw_tools = ((slab_pen, slab_brush), edge_pen, (node_pen, node_brush))
 
-        self.drawManager.setup(loc_params, rectSize, draw_tools)
+        self.drawManager.setup(rectSize, draw_tools)
+
+        if self.overlay is not None:
+            # Nodes are hit-tested by the overlay through an index of their positions, not by Qt's scene index. Only
+            # the batched renderer uses the spatial indices; with 'items', clicks go through Qt's scene index
+            stack = self.browser.stack
+            self._node_keys = list(self.nodes_by_idx)
+            entries = [self.nodes_by_idx[k].dfentry for k in self._node_keys]
+            self.node_index = si.GridIndex(np.array([e.x for e in entries], dtype=float) / stack.dx,
+                                           np.array([e.y for e in entries], dtype=float) / stack.dy,
+                                           np.array([e.z for e in entries]))
+            for n in self.nodes_by_idx.values():
+                n.setAcceptedMouseButtons(qc.Qt.NoButton)
 
     def draw(self, resize=False):
         """
@@ -151,6 +262,243 @@ class DrawingPointsWidget(qg.QWidget):
 
         self.drawManager.draw(resize)
 
+    def set_scale(self, scale):
+        """
+        Scales all items at once, by setting the transform of their root item. Items keep their positions in image
+        pixels, so repeated rescaling never accumulates rounding errors.
+
+        :param scale: The size of the image container relative to the image
+
+        :type scale: float
+
+        :return: None
+        """
+        self.root.setTransform(qg.QTransform.fromScale(self._factors[0] * scale, self._factors[1] * scale))
+        # The translation is given at the initial scale
+        ratio = scale / self.start_scale
+        self.root.setPos(self._translate[0] * ratio, self._translate[1] * ratio)
+
+    def layer(self, z):
+        """
+        Returns the layer holding the items of a slice, creating it (hidden) if necessary.
+
+        :param z: The depth of the slice
+
+        :type z: int
+
+        :rtype: DrawingPointsWidget.Layer
+        """
+        if z not in self.layers:
+            layer = self.Layer(self.root)
+            layer.setZValue(1)
+            layer.hide()
+            self.layers[z] = layer
+        return self.layers[z]
+
+    def add_to_slice(self, item, z):
+        """
+        Adds an item to the scene in the layer of a slice, so it is shown and hidden with the slice.
+
+        :param item: The item to add
+        :param z: The depth of the slice
+
+        :type item: PyQt4.QtGui.QGraphicsItem
+        :type z: int
+
+        :return: None
+        """
+        item.layer = self.layer(z)
+        item.setParentItem(item.layer)
+
+    def add_cross_segment(self, es):
+        """
+        Adds an EdgeSegment whose endpoints lie in different slices to the scene. It is shown while either endpoint's
+        slice is.
+
+        :param es: The segment to add
+
+        :type es: DrawingPointsWidget.EdgeSegment
+
+        :return: None
+        """
+        es.layer = self.cross_layer
+        es.setParentItem(self.cross_layer)
+        es.hide()
+        for z in set(ep.dfentry.z for ep in es.endpoints):
+            self.cross_segs.setdefault(z, []).append(es)
+
+    def lift(self, item):
+        """
+        Moves an item to the selection layer, so it stays visible whatever slice is shown.
+
+        :param item: The item to move
+
+        :type item: PyQt4.QtGui.QGraphicsItem
+
+        :return: None
+        """
+        item.setParentItem(self.selection_layer)
+        item.show()
+
+    def lower(self, item):
+        """
+        Moves an item from the selection layer back to its own layer, so it is again shown only with its slice.
+        Segments spanning slices stay shown if the slice of either endpoint is.
+
+        :param item: The item to move
+
+        :type item: PyQt4.QtGui.QGraphicsItem
+
+        :return: None
+        """
+        if item.parentItem() is not self.selection_layer:
+            return
+        item.setParentItem(item.layer)
+        if item.layer is self.cross_layer:
+            item.setVisible(any(ep.dfentry.z in self.visibility for ep in item.endpoints))
+
+    def show_slices(self, zs):
+        """
+        Shows the items of the given slices, creating them (and the labels of their nodes) if necessary, along with the
+        segments spanning slices that have an endpoint in them.
+
+        :param zs: The depths of the slices
+
+        :type zs: list[int]
+
+        :return: None
+        """
+        if self.overlay is not None:
+            self.overlay.show_slices(zs)
+        for z in zs:
+            self.drawManager.materialize(z)
+            if z not in self._labelled:
+                self._labelled.add(z)
+                for n in self.nodes.get(z, ()):
+                    n.add_label()
+            if z in self.layers:
+                self.layers[z].show()
+            for es in self.cross_segs.get(z, ()):
+                es.show()
+
+    def hide_slices(self, zs):
+        """
+        Hides the unselected items of the given slices. Segments spanning slices stay shown while the slice of their
+        other endpoint is.
+
+        :param zs: The depths of the slices
+
+        :type zs: list[int]
+
+        :return: None
+        """
+        if self.overlay is not None:
+            self.overlay.hide_slices(zs)
+        for z in zs:
+            if z in self.layers:
+                self.layers[z].hide()
+            for es in self.cross_segs.get(z, ()):
+                if es.parentItem() is self.cross_layer and not any(
+                        ep.dfentry.z in self.visibility for ep in es.endpoints):
+                    es.hide()
+
+    def select_edges(self, edges):
+        """
+        Selects the given edges (and deselects all others) in the batched overlay. As with Edge.setSelect, the
+        endpoints of selected vascular edges stay visible. Only the edges whose selection changes are visited.
+
+        :param edges: The edge indices
+
+        :type edges: list[int]
+
+        :return: None
+        """
+        if self.overlay is None:
+            return
+        edges = set(edges)
+        previous = self.overlay.selected
+        for idx in previous - edges:
+            for n in self._edge_nodes(idx):
+                if not n.isSelected():
+                    self.lower(n)
+        for idx in edges - previous:
+            for n in self._edge_nodes(idx):
+                self.lift(n)
+        self.overlay.select(edges)
+
+    def toggle_edge(self, idx):
+        """
+        Adds an edge to the edges selected in the batched overlay, or removes it if it is selected.
+
+        :param idx: The edge index
+
+        :type idx: int
+
+        :return: None
+        """
+        if self.overlay is not None:
+            self.select_edges(self.overlay.selected ^ set([idx]))
+
+    def node_at(self, x, y, radius):
+        """
+        Finds the node closest to a position within the slices currently shown (the current slice +/- the offset), or
+        among the selected nodes.
+
+        :param x: The x-coordinate of the position, in image pixels
+        :param y: The y-coordinate of the position, in image pixels
+        :param radius: The maximum distance from the position, in image pixels
+
+        :type x: float
+        :type y: float
+        :type radius: float
+
+        :return: The closest node, or None if none is within the distance
+
+        :rtype: DrawingPointsWidget.Node | None
+        """
+        if self.node_index is None:
+            return None
+        zrange = (self.browser.z - self.offset, self.browser.z + self.offset)
+        i = self.node_index.nearest(x, y, radius, zrange=zrange)
+        if i is None:
+            selected = np.array([self.nodes_by_idx[k].isSelected() for k in self._node_keys], dtype=bool)
+            i = self.node_index.nearest(x, y, radius, mask=selected)
+        return None if i is None else self.nodes_by_idx[self._node_keys[i]]
+
+    def _edge_nodes(self, idx):
+        """
+        Returns the source and target Nodes of a vascular edge (none for other stacks).
+
+        :param idx: The edge index
+
+        :type idx: int
+
+        :rtype: list[DrawingPointsWidget.Node]
+        """
+        if self.browser.stack.type != 'Vascular':
+            return []
+        if self._edge_ends is None:
+            # Endpoints of every edge, looked up once rather than searching the database for each edge
+            edges = self.browser.stack.edge_db.dframe
+            self._edge_ends = dict(zip(edges['i'].tolist(), zip(edges['sourceIdx'].tolist(),
+                                                                edges['targetIdx'].tolist())))
+        return [self.nodes_by_idx[n] for n in self._edge_ends.get(idx, ()) if n in self.nodes_by_idx]
+
+    class Layer(qg.QGraphicsItem):
+        """
+        Empty item grouping the items of one slice (or the selected items), so they can be shown and hidden together
+        rather than one at a time. Child items keep handling their own events, so stay individually selectable.
+        """
+        def __init__(self, *_args):
+            super(DrawingPointsWidget.Layer, self).__init__(*_args)
+            self.setFlag(qg.QGraphicsItem.ItemHasNoContents)
+
+        def boundingRect(self):
+            return qc.QRectF()
+
+        def paint(self, painter, option, widget=0):
+            pass
+
     class Node(qg.QGraphicsEllipseItem):
         """
         Class for nodes in the scene derived from QGraphicsEllipseItem. Useful for event handling and linking each
@@ -170,13 +518,24 @@ class DrawingPointsWidget(qg.QWidget):
             """
             super(qg.QGraphicsEllipseItem, self).__init__(*_args)
             self.setFlag(qg.QGraphicsItem.ItemIsSelectable)
+            # Positioned in image pixels, but drawn at a fixed size on screen
+            self.setFlag(qg.QGraphicsItem.ItemIgnoresTransformations)
             self.dfentry = None
             self.label = None
+            self.layer = None
             self.isspine = False
             if 'widget' in kwargs:
                 self.widget = kwargs['widget']
             if 'dfentry' in kwargs:
                 self.dfentry = kwargs['dfentry']
+
+        def add_label(self):
+            """
+            Creates the node's label, unless done already. Labels are only created once their node is first shown.
+
+            :return: None
+            """
+            if self.label is None and self.dfentry is not None:
                 self.label = self._Label(self)
 
         class _Label(qg.QGraphicsSimpleTextItem):
@@ -193,8 +552,10 @@ class DrawingPointsWidget(qg.QWidget):
                     self.setFont(qg.QFont('Arial', 9))
                     self.setBrush(qg.QBrush(qc.Qt.white))
                     self.setPos(18, -18)
-                    self.line = qg.QGraphicsLineItem(qc.QLineF(parent.pos() + qc.QPointF(5, -3), self.pos() +
-                                                               qc.QPointF(-3, 5)), parent)
+                    # The leader line is a child of the node, so it starts from the node's own origin (labels are
+                    # created once the node has been positioned, so its pos() is no longer the origin)
+                    self.line = qg.QGraphicsLineItem(qc.QLineF(qc.QPointF(5, -3), self.pos() + qc.QPointF(-3, 5)),
+                                                     parent)
                     self.line.setPen(qg.QPen(qc.Qt.white))
 
             def itemChange(self, change, value):
@@ -205,8 +566,10 @@ class DrawingPointsWidget(qg.QWidget):
                 return qg.QGraphicsSimpleTextItem.itemChange(self, change, value)
 
         def show(self):
-            self.label.show()
-            self.label.line.show()
+            self.add_label()
+            if self.label is not None:
+                self.label.show()
+                self.label.line.show()
             qg.QGraphicsEllipseItem.show(self)
 
         def paint(self, painter, option, widget=0):
@@ -234,15 +597,14 @@ class DrawingPointsWidget(qg.QWidget):
                 # Note: Need to use '==' operator for condition to evaluate correctly. (Qt will cast the QVariant
                 # 'value' to a boolean when evaluating only if the boolean equivalent operator is used.)
                 if value == 1:
-                    self.setBrush(qc.Qt.yellow)
-                    self.setPen(qg.QPen(qc.Qt.yellow, 7, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    self.show()
+                    self.setBrush(SELECTED_NODE_BRUSH)
+                    self.setPen(SELECTED_NODE_PEN)
+                    self.widget.lift(self)
                     self.widget.browser.action_handler('_node_select', self)
                 else:
-                    self.setBrush(qc.Qt.red)
-                    self.setPen(qg.QPen(qc.Qt.red, 7, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    self.hide()
-                    self.widget.draw()
+                    self.setBrush(NODE_BRUSH)
+                    self.setPen(NODE_PEN)
+                    self.widget.lower(self)
                     self.widget.browser.action_handler('_node_select', self, deselect=True)
             return qg.QGraphicsEllipseItem.itemChange(self, change, value)
 
@@ -265,7 +627,10 @@ class DrawingPointsWidget(qg.QWidget):
             """
             super(qg.QGraphicsEllipseItem, self).__init__(*_args)
             self.setFlag(qg.QGraphicsItem.ItemIsSelectable)
+            # Positioned in image pixels, but drawn at a fixed size on screen
+            self.setFlag(qg.QGraphicsItem.ItemIgnoresTransformations)
             self.dfentry = None
+            self.layer = None
             if 'dfentry' in kwargs:
                 self.dfentry = kwargs['dfentry']
             if 'widget' in kwargs:
@@ -293,6 +658,15 @@ class DrawingPointsWidget(qg.QWidget):
             tempop.state &= not qg.QStyle.State_Selected
             qg.QGraphicsEllipseItem.paint(self, painter, tempop, widget)
 
+        def mousePressEvent(self, event):
+            # Shift-clicks add edges to the selection
+            shift_as_control(event)
+            qg.QGraphicsEllipseItem.mousePressEvent(self, event)
+
+        def mouseReleaseEvent(self, event):
+            shift_as_control(event)
+            qg.QGraphicsEllipseItem.mouseReleaseEvent(self, event)
+
         def itemChange(self, change, value):
             if change == qg.QGraphicsItem.ItemSelectedChange:
                 # Note: Need to use '==' operator for condition to evaluate correctly. (Qt will cast the QVariant
@@ -301,7 +675,6 @@ class DrawingPointsWidget(qg.QWidget):
                     self.widget.edges[getattr(self.dfentry, self.parent_idx_name)].setSelect(True)
                 else:
                     self.widget.edges[getattr(self.dfentry, self.parent_idx_name)].setSelect(False)
-                    self.widget.draw()
             return qg.QGraphicsEllipseItem.itemChange(self, change, value)
 
     class EdgeSegment(qg.QGraphicsLineItem):
@@ -324,30 +697,38 @@ class DrawingPointsWidget(qg.QWidget):
             super(qg.QGraphicsLineItem, self).__init__(*_args)
             self.setFlag(qg.QGraphicsItem.ItemIsSelectable)
             self.idx = None
+            self.layer = None
             if 'idx' in kwargs:
                 self.idx = kwargs['idx']
             if 'widget' in kwargs:
                 self.widget = kwargs['widget']
 
             self.endpoints = []
+            self._shape = None
+
+        def setLine(self, *args):
+            # The cached shape follows the line
+            self._shape = None
+            qg.QGraphicsLineItem.setLine(self, *args)
 
         def shape(self):
             """
             Overrides default QGraphicsLineItem implementation to increase the bounds of the line for easier mouse
-            selection.
+            selection. The path is built once and kept until the line changes, since Qt asks for it on every hit test.
 
             :return: path, the path the item's painter will follow to draw the segment
 
             :rtype: qg.QPainterPath
             """
-            rect = qc.QRectF(self.line().p1(), self.line().p2()).normalized()
+            if self._shape is None:
+                rect = qc.QRectF(self.line().p1(), self.line().p2()).normalized()
 
-            rect.adjust(-1, -1, 1, 1)
+                rect.adjust(-1, -1, 1, 1)
 
-            path = qg.QPainterPath()
-            path.addRect(rect)
+                self._shape = qg.QPainterPath()
+                self._shape.addRect(rect)
 
-            return path
+            return self._shape
 
         def paint(self, painter, option, widget=0):
             """
@@ -369,6 +750,15 @@ class DrawingPointsWidget(qg.QWidget):
             tempop.state &= not qg.QStyle.State_Selected
             qg.QGraphicsLineItem.paint(self, painter, tempop, widget)
 
+        def mousePressEvent(self, event):
+            # Shift-clicks add edges to the selection
+            shift_as_control(event)
+            qg.QGraphicsLineItem.mousePressEvent(self, event)
+
+        def mouseReleaseEvent(self, event):
+            shift_as_control(event)
+            qg.QGraphicsLineItem.mouseReleaseEvent(self, event)
+
         def itemChange(self, change, value):
             if change == qg.QGraphicsItem.ItemSelectedChange:
                 # Note: Need to use '==' operator for condition to evaluate correctly. (Qt will cast the QVariant
@@ -377,10 +767,11 @@ class DrawingPointsWidget(qg.QWidget):
                     self.widget.edges[self.idx].setSelect(True)
                 else:
                     self.widget.edges[self.idx].setSelect(False)
-                    self.widget.draw()
             return qg.QGraphicsLineItem.itemChange(self, change, value)
 
-    class Edge:  # Could make this an invisible QGraphicsItem if necessary
+    class Edge(object):  # Could make this an invisible QGraphicsItem if necessary
+        __slots__ = ('widget', 'idx', 'dfentry', 'edge_segs', 'slabs', 'source', 'target', '_selected')
+
         def __init__(self, **kwargs):
             self.widget = None
             self.idx = None
@@ -403,43 +794,46 @@ class DrawingPointsWidget(qg.QWidget):
 
         def setSelect(self, selected):
             self._selected = selected
-            # Could possibly toggle component visibility below
+            if selected:
+                # Highlight the whole edge, including the parts in slices not displayed yet
+                self.widget.drawManager.materialize_edge(self.idx)
+            # Selected components are moved to the selection layer; deselected ones go back to their slice
             for es in self.edge_segs:
                 if selected:
-                    es.setPen(qg.QPen(qg.QColor(255, 105, 255), 3, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    if not es.isVisible():
-                        es.show()
+                    es.setPen(SELECTED_EDGE_PEN)
+                    self.widget.lift(es)
                 else:
-                    es.setPen(qg.QPen(qc.Qt.red, 1, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    es.hide()
+                    es.setPen(EDGE_PEN)
+                    self.widget.lower(es)
             for s in self.slabs:
                 if selected:
-                    s.setBrush(qg.QColor(255, 105, 255))
-                    s.setPen(qg.QPen(qg.QColor(255, 105, 255), 4, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    if not s.isVisible():
-                        s.show()
+                    s.setBrush(SELECTED_SLAB_BRUSH)
+                    s.setPen(SELECTED_SLAB_PEN)
+                    self.widget.lift(s)
                 else:
-                    s.setBrush(qc.Qt.cyan)
-                    s.setPen(qg.QPen(qc.Qt.cyan, 4, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    s.hide()
+                    s.setBrush(SLAB_BRUSH)
+                    s.setPen(SLAB_PEN)
+                    self.widget.lower(s)
             if self.widget.browser.stack.type == 'Vascular':
+                # The endpoints of a selected edge stay visible, as in hide_slice
+                for n in (self.source, self.target):
+                    if selected:
+                        self.widget.lift(n)
+                    elif not n.isSelected():
+                        self.widget.lower(n)
                 if selected and self.widget.browser.stack.mode == 'Vascular':
-                    self.source.setBrush(qc.Qt.red)
-                    self.source.setPen(qg.QPen(qc.Qt.red, 7, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    self.source.show()
+                    self.source.setBrush(NODE_BRUSH)
+                    self.source.setPen(NODE_PEN)
 
-                    self.target.setBrush(qc.Qt.green)
-                    self.target.setPen(qg.QPen(qc.Qt.green, 7, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    self.target.show()
+                    self.target.setBrush(TARGET_BRUSH)
+                    self.target.setPen(TARGET_PEN)
 
-                else:
+                elif not selected:
                     # self.source.setBrush(qc.Qt.red)
                     # self.source.setPen(qg.QPen(qc.Qt.red, 7, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    self.source.hide()
 
-                    self.target.setBrush(qc.Qt.red)
-                    self.target.setPen(qg.QPen(qc.Qt.red, 7, qc.Qt.SolidLine, qc.Qt.RoundCap))
-                    self.target.hide()
+                    self.target.setBrush(NODE_BRUSH)
+                    self.target.setPen(NODE_PEN)
 
         def isSelected(self):
             return self._selected
@@ -2,6 +2,7 @@ import pandas as pd
 import PyQt4.QtCore as qc
 import PyQt4.QtGui as qg
 import PointTable as pt
+import stackpool as sp
 
 
 class TimeSeriesHelper:
@@ -26,6 +27,8 @@ class TimeSeriesHelper:
             self.windict.update({window2.id: window2})
         self.map = None
         self.map_table = None
+        # Stacks opened by any window, shared so a time point is only loaded once; those displayed are kept
+        self.pool = sp.StackPool(in_use=lambda: [win.stack for win in self.windict.values() if win.stack is not None])
 
     def setup_map(self, id_num):
         """
@@ -0,0 +1,408 @@
+"""
+Timing benchmarks for the stack browser's hot paths. Run as
+
+    python benchmark.py [name ...]
+
+to run the named benchmarks (all of them by default). Each prints a table of its timings.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+import numpy as np
+import pandas as pd
+import contrast
+import mapmanager
+import records
+
+# Side lengths of the square slices used for per-frame benchmarks
+SLICE_SIZES = (512, 1024, 2048)
+
+# Number of body rows of the synthetic MapManager files
+MAPMANAGER_ROWS = 1000000
+
+# Number of slabs (and edges they make up) of the synthetic overlay
+OVERLAY_SLABS = 100000
+OVERLAY_EDGES = 1000
+# Size of the synthetic vascular network converted to a graph
+GRAPH_SLABS = 50000
+GRAPH_EDGES = 500
+# Number of rows of the synthetic point list, and the filter applied to it
+QUERY_ROWS = 1000000
+QUERY_FILTER = 'nmEdges >= 3, z 40..60'
+
+
+def _best_ms(func, repeat=5, number=10):
+    """
+    Times a function with timeit and returns its best per-call time.
+
+    :param func: The function to time (called without arguments)
+    :param repeat: Number of timing runs
+    :param number: Number of calls per run
+
+    :type func: function
+    :type repeat: int
+    :type number: int
+
+    :return: The best time per call, in milliseconds
+
+    :rtype: float
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number * 1000
+
+
+def _adjust_contrast_float(stack_slice, new_min, new_max):
+    # Per-frame contrast stretching as originally done by tiffstack.adjust_contrast, kept as the baseline
+    stack_slice = (stack_slice - new_min * 1.0) * 255 / (new_max - new_min)
+    stack_slice[stack_slice <= 0] = 0
+    stack_slice[stack_slice >= 255] = 255
+    return stack_slice.astype('uint8')
+
+
+def bench_contrast():
+    """
+    Per-frame latency of contrast adjustment: the original floating point version, a lookup table applied with
+    np.take, and, for 8-bit data, folding the window into the colour table (no pixels touched).
+
+    :return: None
+    """
+    palette = list(range(256))
+    print('{:>6} {:>7} {:>12} {:>12} {:>14}'.format('size', 'dtype', 'float (ms)', 'lut (ms)', 'colortable (ms)'))
+    for size in SLICE_SIZES:
+        for dtype, top in (('uint8', 255), ('uint16', 65535)):
+            stack_slice = np.random.randint(0, top + 1, (size, size)).astype(dtype)
+            new_min, new_max = top // 32, top // 2
+            engine = contrast.ContrastEngine(new_min, new_max, fold_8bit=False)
+            folding = contrast.ContrastEngine(new_min, new_max)
+            engine.lut(dtype)  # Tables are built once per contrast window, not per frame
+
+            float_ms = _best_ms(lambda: _adjust_contrast_float(stack_slice, new_min, new_max))
+            lut_ms = _best_ms(lambda: engine.apply(stack_slice))
+            table_ms = '-'
+            if dtype == 'uint8':
+                # Worst case: the window changed, so the folded table is rebuilt every frame
+                def fold():
+                    folding._tables.clear()
+                    folding.color_table(palette, stack_slice.dtype)
+                table_ms = '{:.3f}'.format(_best_ms(fold))
+            print('{:>6} {:>7} {:>12.3f} {:>12.3f} {:>14}'.format(size, dtype, float_ms, lut_ms, table_ms))
+
+
+def _read_mapmanager_reference(fname, line_file):
+    # Header parsing and body reading as originally done by StackDb and LineDb, kept as the baseline
+    data = {}
+    skip = 7
+    with open(fname, 'rU') as f:
+        line = f.readline().split(';')
+        if len(line) > 0:
+            line = line[:-1]
+        for pair in line:
+            _ = pair.split('=')
+            val = _[1]
+            if val.isdigit():
+                val = int(val)
+            elif val == 'None':
+                val = None
+            else:
+                try:
+                    val = float(val)
+                except ValueError:
+                    pass
+            data.update({_[0]: val})
+    if not line_file:
+        return data, pd.read_csv(fname, skiprows=1)
+    if 'numHeaderRow' in data:
+        skip = data['numHeaderRow'] + 2
+    return data, pd.read_csv(fname, skiprows=skip, index_col=False)
+
+
+def _write_mapmanager_files(directory, rows):
+    """
+    Writes synthetic stackdb (db2) and line files with the given number of body rows.
+
+    :param directory: Directory to write the files to
+    :param rows: Number of body rows
+
+    :type directory: str
+    :type rows: int
+
+    :return: Paths of the db2 and line files
+
+    :rtype: tuple(str, str)
+    """
+    rng = np.random.RandomState(0)
+    db2 = os.path.join(directory, 'bench_s0_db2.txt')
+    with open(db2, 'w') as f:
+        f.write('voxelx=0.12;voxely=0.12;voxelz=1;numSlices=80;date=20170101;\n')
+        pd.DataFrame({'Idx': np.arange(rows),
+                      'roiType': np.where(rng.rand(rows) < 0.8, 'spineROI', 'otherROI'),
+                      'x': rng.rand(rows) * 100, 'y': rng.rand(rows) * 100, 'z': rng.randint(0, 80, rows),
+                      'parentID': rng.randint(0, 50, rows)}).to_csv(f, index=False)
+    line = os.path.join(directory, 'bench_s0_l.txt')
+    with open(line, 'w') as f:
+        f.write('numHeaderRow=5;voxelx=0.12;voxely=0.12;\n')
+        for i in range(5):
+            f.write('headerRow{}\n'.format(i))
+        f.write('\n')
+        pd.DataFrame({'ID': np.arange(rows) // 100, 'prevNode': np.arange(rows) % 100 - 1,
+                      'x': rng.rand(rows) * 100, 'y': rng.rand(rows) * 100,
+                      'z': rng.randint(0, 80, rows)}).to_csv(f, index=False)
+    return db2, line
+
+
+def bench_mapmanager():
+    """
+    Time to read synthetic MapManager stackdb and line files: the original two-open reading, with all column types
+    inferred, versus mapmanager.read.
+
+    :return: None
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        db2, line = _write_mapmanager_files(directory, MAPMANAGER_ROWS)
+        line_skip = lambda header: header.get('numHeaderRow', 5) + 2
+        print('{:>6} {:>10} {:>16} {:>16} {:>18}'.format('file', 'rows', 'original (ms)', 'mapmanager (ms)',
+                                                         'memory (MB, old/new)'))
+        for name, fname, line_file in (('db2', db2, False), ('line', line, True)):
+            old_ms = _best_ms(lambda: _read_mapmanager_reference(fname, line_file), repeat=3, number=1)
+            if line_file:
+                read = lambda: mapmanager.read(fname, skip=line_skip, index_col=False)
+            else:
+                read = lambda: mapmanager.read(fname)
+            new_ms = _best_ms(read, repeat=3, number=1)
+            old_mb = _read_mapmanager_reference(fname, line_file)[1].memory_usage(deep=True).sum() / 1e6
+            new_mb = read()[1].memory_usage(deep=True).sum() / 1e6
+            print('{:>6} {:>10} {:>16.1f} {:>16.1f} {:>18}'.format(name, MAPMANAGER_ROWS, old_ms, new_ms,
+                                                                   '{:.1f}/{:.1f}'.format(old_mb, new_mb)))
+    finally:
+        shutil.rmtree(directory)
+
+
+def _synthetic_slabs(n, edges, size):
+    """
+    Generates a slab database of random-walk edges inside a square image.
+
+    :param n: Number of slabs
+    :param edges: Number of edges the slabs are split into
+    :param size: Side length of the image, in pixels
+
+    :type n: int
+    :type edges: int
+    :type size: int
+
+    :return: Slab positions (in pixels), depths, edge indices and positions along their edge
+
+    :rtype: pandas.DataFrame
+    """
+    rng = np.random.RandomState(0)
+    edge = np.repeat(np.arange(edges), n // edges)
+    i = np.tile(np.arange(n // edges), edges)
+    steps = rng.randn(len(edge), 2) * 2
+    steps[i == 0] = rng.rand(edges, 2) * size
+    # Random walks restarting at a random position for each edge
+    walk = np.cumsum(steps, axis=0)
+    xy = walk - np.repeat(walk[i == 0] - steps[i == 0], n // edges, axis=0)
+    return pd.DataFrame({'x': np.clip(xy[:, 0], 0, size - 1), 'y': np.clip(xy[:, 1], 0, size - 1),
+                         'z': rng.randint(0, 3, len(edge)), 'edgeIdx': edge, 'i': i})
+
+
+def bench_overlay():
+    """
+    Time to repaint a dense vascular overlay: one Python-subclassed QGraphicsItem per slab and segment (the 'items'
+    renderer) versus a single batched OverlayItem. A full render draws every item, as after a change of the slices
+    shown; a view repaint draws the scene through a view, as when other items change, which the batched overlay
+    answers from its pixmap cache. Requires PyQt4.
+
+    :return: None
+    """
+    import PyQt4.QtGui as qg
+    import StackPoints as sps
+    import OverlayItem
+    import overlaydata
+    app = qg.QApplication.instance() or qg.QApplication([])
+    size = 1024
+    frame = _synthetic_slabs(OVERLAY_SLABS, OVERLAY_EDGES, size)
+    data = overlaydata.OverlayData.from_slabs(frame, 1.0, 1.0)
+
+    items = qg.QGraphicsScene(0, 0, size, size)
+    for x, y in zip(data.x, data.y):
+        s = sps.DrawingPointsWidget.Slab(-3.5, -3.5, 7, 7)
+        s.setPos(x, y)
+        items.addItem(s)
+    for a, b in zip(data.seg_start, data.seg_end):
+        items.addItem(sps.DrawingPointsWidget.EdgeSegment(data.x[a], data.y[a], data.x[b], data.y[b]))
+    batched = qg.QGraphicsScene(0, 0, size, size)
+    overlay = OverlayItem.OverlayItem(data, size, size, None)
+    overlay.set_range(0, 2)
+    batched.addItem(overlay)
+
+    image = qg.QImage(size, size, qg.QImage.Format_ARGB32_Premultiplied)
+
+    def render(scene):
+        # Drops the overlay's cached pixmap, as showing other slices does
+        overlay.update()
+        image.fill(0)
+        painter = qg.QPainter(image)
+        scene.render(painter)
+        painter.end()
+
+    views = {}
+
+    def repaint(scene):
+        if scene not in views:
+            views[scene] = qg.QGraphicsView(scene)
+            views[scene].resize(size + 4, size + 4)
+        image.fill(0)
+        views[scene].viewport().render(image)
+
+    print('{:>8} {:>10} {:>16} {:>12} {:>14}'.format('slabs', 'segments', 'repaint', 'items (ms)', 'batched (ms)'))
+    for name, draw in (('full render', render), ('view repaint', repaint)):
+        print('{:>8} {:>10} {:>16} {:>12.1f} {:>14.1f}'.format(len(data.x), len(data.seg_start), name,
+                                                               _best_ms(lambda: draw(items), repeat=3, number=1),
+                                                               _best_ms(lambda: draw(batched), repeat=3, number=3)))
+
+
+def bench_records():
+    """
+    Memory and build time of the per-row entries kept by overlay items for the slabs of the synthetic overlay:
+    namedtuples from DataFrame.itertuples() versus slotted Records reading shared column arrays. Sizes are counted
+    with sys.getsizeof, including the Python scalars held by each namedtuple and, for Records, the column arrays.
+
+    :return: None
+    """
+    frame = _synthetic_slabs(OVERLAY_SLABS, OVERLAY_EDGES, 1024)
+
+    def tuples_size(rows):
+        return sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in rows)
+
+    def records_size(rows):
+        columns = rows[0].columns
+        return sum(sys.getsizeof(row) for row in rows) + columns.index.nbytes + sum(
+            array.nbytes for array in columns.arrays.values())
+
+    tuples = list(frame.itertuples())
+    recs = records.Columns(frame).records()
+    print('{:>10} {:>10} {:>12} {:>14}'.format('entries', 'rows', 'build (ms)', 'memory (MB)'))
+    for name, rows, build, size in (
+            ('itertuples', tuples, lambda: list(frame.itertuples()), tuples_size),
+            ('records', recs, lambda: records.Columns(frame).records(), records_size)):
+        print('{:>10} {:>10} {:>12.1f} {:>14.1f}'.format(name, len(rows), _best_ms(build, repeat=3, number=1),
+                                                         size(rows) / 1e6))
+
+
+def _tograph_reference(nodes, edges, slabs):
+    """
+    The previous TiffStack.tograph, without writing the file: edges added one at a time, each with a full scan of the
+    slab database for its slabs.
+    """
+    import igraph as ig
+    g = ig.Graph()
+    g.add_vertices(nodes.shape[0])
+    for field in list(nodes):
+        g.vs[field] = nodes[field].values.tolist()
+    for edge in edges.itertuples():
+        g.add_edges([(int(edge.targetIdx), int(edge.sourceIdx))])
+        g.es[edge.i]['Slabs'] = str(list(slabs.loc[slabs['edgeIdx'] == edge.i].T.to_dict().values()))
+    for field in list(edges):
+        g.es[field] = edges[field].values.tolist()
+    return g
+
+
+def _synthetic_graph():
+    """
+    Generates the node, edge and slab databases of a synthetic vascular network, of GRAPH_SLABS slabs split into
+    GRAPH_EDGES edges joining random nodes.
+
+    :rtype: tuple(pandas.DataFrame, pandas.DataFrame, pandas.DataFrame)
+    """
+    slabs = _synthetic_slabs(GRAPH_SLABS, GRAPH_EDGES, 1024)
+    rng = np.random.RandomState(0)
+    node_count = GRAPH_EDGES // 2
+    nodes = pd.DataFrame({'x': rng.rand(node_count), 'y': rng.rand(node_count), 'z': rng.randint(0, 3, node_count)})
+    edges = pd.DataFrame({'i': np.arange(GRAPH_EDGES), 'sourceIdx': rng.randint(0, node_count, GRAPH_EDGES),
+                          'targetIdx': rng.randint(0, node_count, GRAPH_EDGES)})
+    return nodes, edges, slabs
+
+
+def bench_tograph():
+    """
+    Time to build the graph of a synthetic vascular network: the previous per-edge loop versus graphbuild.build_graph.
+
+    :return: None
+    """
+    import graphbuild
+    nodes, edges, slabs = _synthetic_graph()
+    print('{:>10} {:>10} {:>10} {:>12}'.format('build', 'slabs', 'edges', 'time (ms)'))
+    for name, build in (('per-edge', _tograph_reference), ('bulk', graphbuild.build_graph)):
+        print('{:>10} {:>10} {:>10} {:>12.1f}'.format(name, GRAPH_SLABS, GRAPH_EDGES, _best_ms(
+            lambda: build(nodes, edges, slabs), repeat=3, number=1)))
+
+
+def bench_export():
+    """
+    Time to write the graph of a synthetic vascular network, and size of the file written: building the graph and
+    writing it with igraph, streaming GraphML from the databases (graphexport.write_graphml), and the binary format
+    (graphexport.write_binary), uncompressed and compressed.
+
+    :return: None
+    """
+    import graphbuild
+    import graphexport
+    nodes, edges, slabs = _synthetic_graph()
+    directory = tempfile.mkdtemp()
+    try:
+        print('{:>12} {:>10} {:>10} {:>12} {:>12}'.format('export', 'slabs', 'edges', 'time (ms)', 'size (MB)'))
+        for name, ext, write in (
+                ('igraph', '.graphml',
+                 lambda fname: graphbuild.write_graphml(graphbuild.build_graph(nodes, edges, slabs), fname)),
+                ('streamed', '.graphml', lambda fname: graphexport.write_graphml(nodes, edges, slabs, fname)),
+                ('binary', '.npz', lambda fname: graphexport.write_binary(nodes, edges, slabs, fname)),
+                ('compressed', '.npz',
+                 lambda fname: graphexport.write_binary(nodes, edges, slabs, fname, compressed=True))):
+            fname = os.path.join(directory, name + ext)
+            ms = _best_ms(lambda: write(fname), repeat=3, number=1)
+            print('{:>12} {:>10} {:>10} {:>12.1f} {:>12.2f}'.format(name, GRAPH_SLABS, GRAPH_EDGES, ms,
+                                                                    os.path.getsize(fname) / 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_pointquery():
+    """
+    Time to filter and sort a synthetic point list: a pandas boolean mask over every row versus pointquery.PointQuery,
+    whose first query on a column also builds its index.
+
+    :return: None
+    """
+    import pointquery
+    rng = np.random.RandomState(0)
+    frame = pd.DataFrame({'x': rng.rand(QUERY_ROWS) * 1024, 'y': rng.rand(QUERY_ROWS) * 1024,
+                          'z': rng.randint(0, 100, QUERY_ROWS).astype(float),
+                          'nmEdges': rng.choice([1.0, 2.0, 3.0, np.nan], QUERY_ROWS)})
+    query = pointquery.PointQuery(frame)
+    first = _best_ms(lambda: query.filter(QUERY_FILTER), repeat=1, number=1)
+    rows = query.filter(QUERY_FILTER)
+    print('{:>24} {:>10} {:>10} {:>12}'.format('operation', 'rows', 'matches', 'time (ms)'))
+    for name, ms in (
+            ('pandas mask', _best_ms(lambda: np.flatnonzero(((frame['nmEdges'] >= 3) & (frame['z'] >= 40) &
+                                                             (frame['z'] <= 60)).values))),
+            ('query (building index)', first),
+            ('query (indexed)', _best_ms(lambda: query.filter(QUERY_FILTER))),
+            ('sort matches by x', _best_ms(lambda: query.sort(rows, 'x')))):
+        print('{:>24} {:>10} {:>10} {:>12.1f}'.format(name, QUERY_ROWS, len(rows), ms))
+
+
+BENCHMARKS = {'contrast': bench_contrast, 'mapmanager': bench_mapmanager, 'overlay': bench_overlay,
+              'records': bench_records, 'tograph': bench_tograph, 'export': bench_export,
+              'pointquery': bench_pointquery}
+
+
+def main(names):
+    for name in names or sorted(BENCHMARKS):
+        print('== {} =='.format(name))
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
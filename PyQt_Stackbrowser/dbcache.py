@@ -0,0 +1,188 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Suffix of the directory holding the binary cache of a text database, created next to the text file
+CACHE_SUFFIX = '.cache'
+
+# Layout version of the cache; changing it makes existing caches stale
+CACHE_VERSION = 2
+
+# File listing the cached columns and the text file they were read from
+META_FILE = 'meta.json'
+
+
+def read_csv(fname, **kwargs):
+    """
+    Reads a CSV database into a DataFrame through a binary cache. The first read parses the text with pandas and
+    saves each column as a .npy file in a sidecar directory; later reads memory-map those files instead of parsing.
+    Numeric columns of the database returned then stay backed by their files, while text columns are read into memory.
+    The cache is keyed on the size and modification time of the text file (and the parsing options), so it is
+    regenerated automatically whenever the text changes. If the cache cannot be written (e.g. a read-only data
+    directory), or the database holds columns or labels it can't store faithfully (see _save), the text is simply
+    parsed every time.
+
+    :param fname: Path to the CSV file
+    :param kwargs: Keyword arguments for pandas.read_csv
+
+    :type fname: str
+    :type kwargs: dict
+
+    :return: The database
+
+    :rtype: pandas.DataFrame
+    """
+    cache_dir = cache_path(fname)
+    stat = os.stat(fname)
+    key = {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime,
+           'options': repr(sorted(kwargs.items()))}
+
+    dframe = _load(cache_dir, key)
+    if dframe is None:
+        dframe = pd.read_csv(fname, **kwargs)
+        try:
+            _save(cache_dir, key, dframe)
+        except (IOError, OSError):
+            pass
+    return dframe
+
+
+def cache_path(fname):
+    """
+    Returns the path of the cache directory of a text database.
+
+    :param fname: Path to the text file
+
+    :type fname: str
+
+    :rtype: str
+    """
+    head, tail = os.path.split(fname)
+    return os.path.join(head, '.' + tail + CACHE_SUFFIX)
+
+
+def _load(cache_dir, key):
+    """
+    Loads a database from its cache, if the cache exists and matches the text file.
+
+    :param cache_dir: The cache directory
+    :param key: Description of the text file and parsing options the cache must have been made from
+
+    :type cache_dir: str
+    :type key: dict
+
+    :return: The database, or None if there is no valid cache
+
+    :rtype: pandas.DataFrame | None
+    """
+    try:
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if meta.get('key') != key:
+        return None
+
+    columns = []
+    try:
+        for i, (name, kind) in enumerate(meta['columns']):
+            values = np.load(os.path.join(cache_dir, '{}.npy'.format(i)), mmap_mode='r')
+            if kind in ('text', 'bool'):
+                # Text and boolean columns with missing values are stored as an array plus a mask of missing values
+                missing = np.load(os.path.join(cache_dir, '{}.missing.npy'.format(i)))
+                values = values.astype(object)
+                values[missing] = np.nan
+            columns.append((name, values))
+    except (IOError, OSError, ValueError):
+        return None
+    if not columns:
+        return pd.DataFrame()
+    # Joined as separate blocks: the DataFrame constructor would consolidate columns of the same type into new
+    # arrays, copying the memory-mapped files into memory
+    return pd.concat([pd.Series(values, name=name, copy=False) for name, values in columns], axis=1, copy=False)
+
+
+def _save(cache_dir, key, dframe):
+    """
+    Writes a database to its cache. The metadata is written last, so an interrupted write leaves no valid cache.
+    Besides numeric columns, only object columns holding text or booleans (and missing values) are stored, and column
+    labels must survive a JSON round trip; for any other database no cache is written.
+
+    :param cache_dir: The cache directory
+    :param key: Description of the text file and parsing options the database was read with
+    :param dframe: The database
+
+    :type cache_dir: str
+    :type key: dict
+    :type dframe: pandas.DataFrame
+
+    :return: None
+    """
+    columns = []
+    for name in dframe.columns:
+        label = name.item() if isinstance(name, np.generic) else name
+        kind = _column_kind(np.asarray(dframe[name]))
+        if kind is None or not _json_safe(label):
+            return
+        columns.append((label, kind))
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    meta_file = os.path.join(cache_dir, META_FILE)
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    for i, (name, (label, kind)) in enumerate(zip(dframe.columns, columns)):
+        values = np.asarray(dframe[name])
+        if kind in ('text', 'bool'):
+            missing = np.asarray(pd.isnull(values), dtype=bool)
+            np.save(os.path.join(cache_dir, '{}.missing.npy'.format(i)), missing)
+            if kind == 'text':
+                values = np.array([u'' if m else u'{}'.format(v) for v, m in zip(values, missing)], dtype='U')
+            else:
+                values = np.array([False if m else bool(v) for v, m in zip(values, missing)], dtype=bool)
+        np.save(os.path.join(cache_dir, '{}.npy'.format(i)), values)
+
+    with open(meta_file, 'w') as f:
+        json.dump({'key': key, 'columns': columns}, f)
+
+
+def _column_kind(values):
+    """
+    Returns how a database column is stored in the cache: 'array' for numeric columns, 'text' or 'bool' for object
+    columns holding only strings or only booleans besides missing values.
+
+    :param values: The column values
+
+    :type values: numpy.ndarray
+
+    :return: The kind of the column, or None if it can't be stored faithfully
+
+    :rtype: str | None
+    """
+    if values.dtype.kind in 'biufc':
+        return 'array'
+    present = [v for v, m in zip(values, pd.isnull(values)) if not m]
+    if all(isinstance(v, (str, type(u''))) for v in present):
+        return 'text'
+    if all(isinstance(v, (bool, np.bool_)) for v in present):
+        return 'bool'
+    return None
+
+
+def _json_safe(label):
+    """
+    Tells whether a column label is read back unchanged from the JSON metadata.
+
+    :param label: The column label
+
+    :type label: object
+
+    :rtype: bool
+    """
+    try:
+        loaded = json.loads(json.dumps(label))
+    except (TypeError, ValueError):
+        return False
+    return type(loaded) in (type(label), type(u'')) and loaded == label
@@ -1,3 +1,6 @@
+import dbcache
+
+
 class EdgeDb:
     """
     Pandas DataFrame of graph nodes, representing vascular junctions.
@@ -11,3 +14,16 @@ class EdgeDb:
         :type dataframe: pandas.DataFrame
         """
         self.dframe = dataframe
+
+    @classmethod
+    def from_csv(cls, fname):
+        """
+        Loads the database from its CSV txt file, through the file's binary cache (see dbcache.read_csv).
+
+        :param fname: Path to the CSV txt file
+
+        :type fname: str
+
+        :rtype: EdgeDb
+        """
+        return cls(dbcache.read_csv(fname))
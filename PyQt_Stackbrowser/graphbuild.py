@@ -0,0 +1,122 @@
+import numpy as np
+
+# Prefix of the edge attributes holding the geometry of each edge's slabs, one attribute per slab column
+SLAB_PREFIX = 'slab_'
+
+
+def slab_runs(slabs, edge_ids, key='edgeIdx'):
+    """
+    Sorts a slab database by edge once, so each edge's slabs are a contiguous run found by binary search, instead of
+    scanning the whole database for every edge.
+
+    :param slabs: The slab database
+    :param edge_ids: The indices of the edges, in the order wanted
+    :param key: The column of the slab database holding each slab's edge index
+
+    :type slabs: pandas.DataFrame
+    :type edge_ids: numpy.ndarray
+    :type key: str
+
+    :return: The slab rows sorted by edge (in file order within an edge), and the start and end of each edge's run in
+             that order
+    :rtype: tuple(numpy.ndarray[int], numpy.ndarray[int], numpy.ndarray[int])
+    """
+    order = np.argsort(slabs[key].values, kind='mergesort')
+    sorted_keys = slabs[key].values[order]
+    lo = np.searchsorted(sorted_keys, edge_ids, side='left')
+    hi = np.searchsorted(sorted_keys, edge_ids, side='right')
+    return order, lo, hi
+
+
+def group_slabs(slabs, edge_ids, key='edgeIdx'):
+    """
+    Splits the columns of a slab database by edge (see slab_runs).
+
+    :param slabs: The slab database
+    :param edge_ids: The indices of the edges, in the order wanted
+    :param key: The column of the slab database holding each slab's edge index
+
+    :type slabs: pandas.DataFrame
+    :type edge_ids: numpy.ndarray
+    :type key: str
+
+    :return: For each column but the key, the values of every edge's slabs (in file order), as one array per edge
+    :rtype: dict[str, list[numpy.ndarray]]
+    """
+    order, lo, hi = slab_runs(slabs, edge_ids, key)
+    groups = {}
+    for column in slabs.columns:
+        if column == key:
+            continue
+        values = slabs[column].values[order]
+        groups[column] = [values[a:b] for a, b in zip(lo, hi)]
+    return groups
+
+
+def frame_attribute(series):
+    """
+    Converts a database column to a list of graph attribute values: numbers are kept as they are, unless the column
+    has missing values, in which case all values are stored as strings (as igraph can't store missing numbers).
+
+    :param series: The column
+
+    :type series: pandas.Series
+
+    :rtype: list
+    """
+    values = series.values.tolist()
+    if not series.isnull().values.any():
+        return values
+    return [str(value) for value in values]
+
+
+def build_graph(nodes, edges, slabs):
+    """
+    Builds the graph of a vascular stack from its databases: a vertex per node and an edge per edge (joining its
+    target and source nodes), added in one call each, with the databases' columns as attributes. The slabs of each edge
+    are attached as numeric arrays, one edge attribute per slab column (named with SLAB_PREFIX).
+
+    :param nodes: The node database
+    :param edges: The edge database
+    :param slabs: The slab database
+
+    :type nodes: pandas.DataFrame
+    :type edges: pandas.DataFrame
+    :type slabs: pandas.DataFrame
+
+    :rtype: igraph.Graph
+    """
+    # Imported here so the slab grouping above (used by the streaming export) works without igraph installed
+    import igraph as ig
+
+    g = ig.Graph()
+    g.add_vertices(len(nodes))
+    for field in nodes.columns:
+        g.vs[field] = frame_attribute(nodes[field])
+    g.add_edges(list(zip(edges['targetIdx'].values.astype(int).tolist(),
+                         edges['sourceIdx'].values.astype(int).tolist())))
+    for field in edges.columns:
+        g.es[field] = frame_attribute(edges[field])
+    for column, values in group_slabs(slabs, edges['i'].values).items():
+        g.es[SLAB_PREFIX + column] = values
+    return g
+
+
+def write_graphml(g, fname):
+    """
+    Writes a graph built by build_graph to a GraphML file with igraph. GraphML has no array type, so the slab
+    attributes are written as space-separated numbers.
+
+    :param g: The graph
+    :param fname: Path of the GraphML file
+
+    :type g: igraph.Graph
+    :type fname: str
+
+    :return: None
+    """
+    g = g.copy()
+    for name in g.es.attributes():
+        if name.startswith(SLAB_PREFIX):
+            g.es[name] = [' '.join(map(repr, values.tolist())) for values in g.es[name]]
+    g.write_graphml(fname)
@@ -0,0 +1,154 @@
+import numpy as np
+from xml.sax.saxutils import escape, quoteattr
+import graphbuild as gb
+
+# Number of nodes or edges formatted before each write to the GraphML file, bounding the memory used by the text
+GRAPHML_CHUNK = 10000
+
+GRAPHML_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns"
+         xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+         xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns
+         http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">
+'''
+
+# GraphML attribute type of each numpy dtype kind (anything else is written as a string)
+GRAPHML_TYPES = {'f': 'double', 'i': 'long', 'u': 'long', 'b': 'boolean'}
+
+
+def _graphml_column(series):
+    """
+    Returns the GraphML type and the text of each value of a database column. As in graphbuild.frame_attribute,
+    columns with missing values are written as strings.
+
+    :param series: The column
+
+    :type series: pandas.Series
+
+    :return: The attribute type, and the text of each value
+    :rtype: tuple(str, list[str])
+    """
+    values = series.values
+    attr_type = GRAPHML_TYPES.get(values.dtype.kind, 'string')
+    if series.isnull().values.any():
+        attr_type = 'string'
+    if attr_type == 'double':
+        return attr_type, list(map(repr, values.tolist()))
+    if attr_type == 'boolean':
+        return attr_type, ['true' if value else 'false' for value in values.tolist()]
+    if attr_type == 'long':
+        return attr_type, [str(value) for value in values.tolist()]
+    return attr_type, [escape(str(value)) for value in values.tolist()]
+
+
+def _graphml_key(prefix, target, name, attr_type):
+    return '  <key id={} for="{}" attr.name={} attr.type="{}"/>\n'.format(
+        quoteattr(prefix + name), target, quoteattr(name), attr_type)
+
+
+def _graphml_data(prefix, name, text):
+    return '      <data key={}>{}</data>\n'.format(quoteattr(prefix + name), text)
+
+
+def write_graphml(nodes, edges, slabs, fname):
+    """
+    Streams the graph of a vascular stack (as built by graphbuild.build_graph) to a GraphML file, straight from its
+    databases: the nodes and edges are formatted and written a chunk at a time, without building the graph. Each
+    edge's slabs are written as one attribute per slab column, holding space-separated numbers.
+
+    :param nodes: The node database
+    :param edges: The edge database
+    :param slabs: The slab database
+    :param fname: Path of the GraphML file
+
+    :type nodes: pandas.DataFrame
+    :type edges: pandas.DataFrame
+    :type slabs: pandas.DataFrame
+    :type fname: str
+
+    :return: None
+    """
+    node_columns = [(name,) + _graphml_column(nodes[name]) for name in nodes.columns]
+    edge_columns = [(name,) + _graphml_column(edges[name]) for name in edges.columns]
+    order, lo, hi = gb.slab_runs(slabs, edges['i'].values)
+    slab_columns = [(gb.SLAB_PREFIX + name, slabs[name].values[order]) for name in slabs.columns if name != 'edgeIdx']
+    source = edges['targetIdx'].values.astype(int).tolist()
+    target = edges['sourceIdx'].values.astype(int).tolist()
+    with open(fname, 'w') as f:
+        f.write(GRAPHML_HEADER)
+        f.writelines(_graphml_key('v_', 'node', name, attr_type) for name, attr_type, _ in node_columns)
+        f.writelines(_graphml_key('e_', 'edge', name, attr_type) for name, attr_type, _ in edge_columns)
+        f.writelines(_graphml_key('e_', 'edge', name, 'string') for name, _ in slab_columns)
+        f.write('  <graph id="G" edgedefault="undirected">\n')
+        for start in range(0, len(nodes), GRAPHML_CHUNK):
+            lines = []
+            for row in range(start, min(start + GRAPHML_CHUNK, len(nodes))):
+                lines.append('    <node id="n{}">\n'.format(row))
+                lines.extend(_graphml_data('v_', name, texts[row]) for name, _, texts in node_columns)
+                lines.append('    </node>\n')
+            f.writelines(lines)
+        for start in range(0, len(edges), GRAPHML_CHUNK):
+            lines = []
+            for row in range(start, min(start + GRAPHML_CHUNK, len(edges))):
+                lines.append('    <edge source="n{}" target="n{}">\n'.format(source[row], target[row]))
+                lines.extend(_graphml_data('e_', name, texts[row]) for name, _, texts in edge_columns)
+                lines.extend(_graphml_data('e_', name, ' '.join(map(repr, values[lo[row]:hi[row]].tolist())))
+                             for name, values in slab_columns)
+                lines.append('    </edge>\n')
+            f.writelines(lines)
+        f.write('  </graph>\n</graphml>\n')
+
+
+def _binary_column(values):
+    # Columns of Python objects (e.g. strings, or numbers mixed with missing values) are stored as text, so the file
+    # loads without unpickling
+    return values.astype(str) if values.dtype.kind == 'O' else values
+
+
+def write_binary(nodes, edges, slabs, fname, compressed=False):
+    """
+    Writes the graph of a vascular stack to a numpy .npz file: the adjacency in compressed sparse row (CSR) form, the
+    columns of the databases, and the slabs of every edge as contiguous runs of flat arrays.
+
+    Arrays of the file:
+        - indptr, indices, edges: the neighbours of node k are indices[indptr[k]:indptr[k + 1]], reached through the
+          edges (rows of the edge database) edges[indptr[k]:indptr[k + 1]]; each edge is listed at both of its nodes
+        - slab_offsets: the slabs of edge k are entries slab_offsets[k] to slab_offsets[k + 1] of the slab arrays
+        - node_<column>, edge_<column>, slab_<column>: the columns of the node, edge and slab databases
+
+    :param nodes: The node database
+    :param edges: The edge database
+    :param slabs: The slab database
+    :param fname: Path of the .npz file
+    :param compressed: Whether to compress the arrays (smaller, but slower to write and read)
+
+    :type nodes: pandas.DataFrame
+    :type edges: pandas.DataFrame
+    :type slabs: pandas.DataFrame
+    :type fname: str
+    :type compressed: bool
+
+    :return: None
+    """
+    source = edges['targetIdx'].values.astype(np.intp)
+    target = edges['sourceIdx'].values.astype(np.intp)
+    ends = np.concatenate([source, target])
+    order = np.argsort(ends, kind='mergesort')
+    arrays = {
+        'indptr': np.concatenate([[0], np.cumsum(np.bincount(ends, minlength=len(nodes)))]),
+        'indices': np.concatenate([target, source])[order],
+        'edges': np.concatenate([np.arange(len(edges))] * 2)[order],
+    }
+    slab_order, lo, hi = gb.slab_runs(slabs, edges['i'].values)
+    lengths = hi - lo
+    arrays['slab_offsets'] = np.concatenate([[0], np.cumsum(lengths)])
+    # Positions lo[k], lo[k] + 1, ..., hi[k] - 1 of every edge's run, concatenated
+    runs = slab_order[np.repeat(lo - arrays['slab_offsets'][:-1], lengths) + np.arange(lengths.sum())]
+    for name in nodes.columns:
+        arrays['node_' + name] = _binary_column(nodes[name].values)
+    for name in edges.columns:
+        arrays['edge_' + name] = _binary_column(edges[name].values)
+    for name in slabs.columns:
+        if name != 'edgeIdx':
+            arrays[gb.SLAB_PREFIX + name] = _binary_column(slabs[name].values[runs])
+    (np.savez_compressed if compressed else np.savez)(fname, **arrays)
@@ -0,0 +1,225 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import overlaydata as od
+
+# Depth of a slice of a vascular stack, in um; slab x and y positions are already in um, but z is a slice number
+DZ = 1.0
+
+# Edge column flagging the diving (penetrating) vessels, the roots of the branch order
+ROOT_COLUMN = 'isDiving'
+
+
+def _edge_rows(edge_ids, keys):
+    """
+    Returns the row of the edge database of each edge index, or -1 for indices not in it.
+
+    :param edge_ids: The index of each edge of the database ('i' column)
+    :param keys: The edge indices to find
+
+    :type edge_ids: numpy.ndarray
+    :type keys: numpy.ndarray
+
+    :rtype: numpy.ndarray[int]
+    """
+    if not len(edge_ids):
+        return np.full(len(keys), -1, dtype=np.intp)
+    order = np.argsort(edge_ids, kind='mergesort')
+    rows = order[np.minimum(np.searchsorted(edge_ids[order], keys), len(order) - 1)]
+    return np.where(edge_ids[rows] == keys, rows, -1)
+
+
+def edge_geometry(slabs, edge_ids, dz=DZ):
+    """
+    Computes the length, chord and mean diameter of each edge from its slabs. The length sums the distances between
+    consecutive slabs of the edge (those joined by a segment in the overlay, see overlaydata.pair_segments), the chord
+    is the distance between its first and last slabs, and the mean diameter is twice the mean of its valid (positive)
+    slab radii.
+
+    :param slabs: The slab database
+    :param edge_ids: The index of each edge of the edge database ('i' column)
+    :param dz: Depth of a slice, in um
+
+    :type slabs: pandas.DataFrame
+    :type edge_ids: numpy.ndarray
+    :type dz: float
+
+    :return: The length, chord and mean diameter of each edge, in um (NaN for edges without slabs or radii)
+    :rtype: tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    n = len(edge_ids)
+    rows = _edge_rows(edge_ids, slabs['edgeIdx'].values)
+    xyz = np.column_stack([slabs['x'].values, slabs['y'].values, slabs['z'].values * dz]).astype(np.float64)
+
+    start, end = od.pair_segments(slabs['edgeIdx'].values, slabs['i'].values)
+    seg_rows = rows[start]
+    steps = np.sqrt(((xyz[end] - xyz[start]) ** 2).sum(axis=1))
+    keep = seg_rows >= 0
+    length = np.bincount(seg_rows[keep], weights=steps[keep], minlength=n)
+
+    # Slabs sorted by edge, then position along it, so each edge's first and last slabs end its run
+    order = np.lexsort((slabs['i'].values, rows))
+    sorted_rows = rows[order]
+    lo = np.searchsorted(sorted_rows, np.arange(n), side='left')
+    hi = np.searchsorted(sorted_rows, np.arange(n), side='right')
+    has_slabs = hi > lo
+    chord = np.full(n, np.nan)
+    first, last = order[lo[has_slabs]], order[hi[has_slabs] - 1]
+    chord[has_slabs] = np.sqrt(((xyz[last] - xyz[first]) ** 2).sum(axis=1))
+    length[~has_slabs] = np.nan
+
+    diameter = np.full(n, np.nan)
+    if 'radius' in slabs.columns:
+        radius = slabs['radius'].values.astype(np.float64)
+        valid = (rows >= 0) & (radius > 0)
+        counts = np.bincount(rows[valid], minlength=n)
+        sums = np.bincount(rows[valid], weights=radius[valid], minlength=n)
+        measured = counts > 0
+        diameter[measured] = 2 * sums[measured] / counts[measured]
+    return length, chord, diameter
+
+
+def degrees(node_count, source, target):
+    """
+    Returns the number of edge ends at each node (a loop counts twice).
+
+    :param node_count: Number of nodes
+    :param source: The source node of each edge
+    :param target: The target node of each edge
+
+    :type node_count: int
+    :type source: numpy.ndarray[int]
+    :type target: numpy.ndarray[int]
+
+    :rtype: numpy.ndarray[int]
+    """
+    return np.bincount(np.concatenate([source, target]), minlength=node_count)
+
+
+def branch_orders(source, target, degree, roots):
+    """
+    Computes the branch order of each edge: 0 for the root edges, and one more for every branch point (node of degree
+    3 or more) on the way from the nearest root. Edges joined through a node of degree 2 are parts of the same branch,
+    so share their order. The search advances one order at a time over all edges at once.
+
+    :param source: The source node of each edge
+    :param target: The target node of each edge
+    :param degree: The degree of each node
+    :param roots: Which edges are roots
+
+    :type source: numpy.ndarray[int]
+    :type target: numpy.ndarray[int]
+    :type degree: numpy.ndarray[int]
+    :type roots: numpy.ndarray[bool]
+
+    :return: The branch order of each edge, NaN for edges not connected to a root
+    :rtype: numpy.ndarray
+    """
+    order = np.full(len(source), np.nan)
+    frontier = np.flatnonzero(roots)
+    order[frontier] = 0
+    level = 0
+    while frontier.size:
+        # Spread the current order along the branches, through unbranched nodes
+        reached = frontier
+        while reached.size:
+            nodes = np.concatenate([source[reached], target[reached]])
+            nodes = np.unique(nodes[degree[nodes] == 2])
+            reached = np.flatnonzero(np.isnan(order) & (np.in1d(source, nodes) | np.in1d(target, nodes)))
+            order[reached] = level
+            frontier = np.concatenate([frontier, reached])
+        # Then step over the branch points at their ends
+        nodes = np.concatenate([source[frontier], target[frontier]])
+        nodes = np.unique(nodes[degree[nodes] > 2])
+        frontier = np.flatnonzero(np.isnan(order) & (np.in1d(source, nodes) | np.in1d(target, nodes)))
+        level += 1
+        order[frontier] = level
+    return order
+
+
+def compute(node_db, edge_db, slab_db, dz=DZ):
+    """
+    Computes the metrics of a vascular network: the length, tortuosity (length over chord), mean diameter and branch
+    order of each edge (see edge_geometry and branch_orders; the roots are the edges flagged in ROOT_COLUMN), and the
+    degree of each node, with the lowest branch order of its edges.
+
+    :param node_db: The node database
+    :param edge_db: The edge database
+    :param slab_db: The slab database
+    :param dz: Depth of a slice, in um
+
+    :type node_db: nodedb.NodeDb
+    :type edge_db: edgedb.EdgeDb
+    :type slab_db: slabdb.SlabDb
+    :type dz: float
+
+    :return: The node metrics and edge metrics, indexed as the node and edge databases
+    :rtype: tuple(pandas.DataFrame, pandas.DataFrame)
+    """
+    nodes, edges = node_db.dframe, edge_db.dframe
+    source = edges['sourceIdx'].values.astype(np.intp)
+    target = edges['targetIdx'].values.astype(np.intp)
+    length, chord, diameter = edge_geometry(slab_db.dframe, edges['i'].values, dz)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tortuosity = np.where(chord > 0, length / chord, np.nan)
+
+    degree = degrees(len(nodes), source, target)
+    if ROOT_COLUMN in edges.columns:
+        roots = edges[ROOT_COLUMN].values == 1
+    else:
+        roots = np.zeros(len(edges), dtype=bool)
+    edge_order = branch_orders(source, target, degree, roots)
+    node_order = np.full(len(nodes), np.inf)
+    ordered = ~np.isnan(edge_order)
+    for ends in (source, target):
+        np.minimum.at(node_order, ends[ordered], edge_order[ordered])
+    node_order[np.isinf(node_order)] = np.nan
+
+    node_metrics = pd.DataFrame({'degree': degree, 'branchOrder': node_order}, index=nodes.index,
+                                columns=['degree', 'branchOrder'])
+    edge_metrics = pd.DataFrame({'length': length, 'tortuosity': tortuosity, 'meanDiameter': diameter,
+                                 'branchOrder': edge_order}, index=edges.index,
+                                columns=['length', 'tortuosity', 'meanDiameter', 'branchOrder'])
+    return node_metrics, edge_metrics
+
+
+def main(argv=None):
+    """
+    Batch command line: computes the metrics of vascular stacks from their databases (without loading the images), and
+    writes those of all stacks to one node and one edge CSV file, with the stack of each row.
+
+    :param argv: The arguments (sys.argv[1:] by default)
+
+    :type argv: list[str]
+
+    :return: None
+    """
+    import stackfiles as sf
+    import nodedb as nd
+    import edgedb as ed
+    import slabdb as sd
+
+    parser = argparse.ArgumentParser(description='Computes the graph metrics of vascular stacks.')
+    parser.add_argument('stacks', nargs='+', help='paths of the stack images (e.g. X20140523_a153_001_ch1.tif)')
+    parser.add_argument('--nodes', default='node_metrics.csv', help='node metrics file (default: %(default)s)')
+    parser.add_argument('--edges', default='edge_metrics.csv', help='edge metrics file (default: %(default)s)')
+    parser.add_argument('--dz', type=float, default=DZ, help='depth of a slice, in um (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    node_frames, edge_frames = [], []
+    for path in args.stacks:
+        node_dir, slab_dir, edge_dir = sf.vascular_db_paths(path)
+        node_metrics, edge_metrics = compute(nd.NodeDb.from_csv(node_dir, sf.DX, sf.DY), ed.EdgeDb.from_csv(edge_dir),
+                                             sd.SlabDb.from_csv(slab_dir, sf.DX, sf.DY), args.dz)
+        name = os.path.basename(path).split('_ch')[0]
+        node_metrics.insert(0, 'stack', name)
+        edge_metrics.insert(0, 'stack', name)
+        node_frames.append(node_metrics)
+        edge_frames.append(edge_metrics)
+    pd.concat(node_frames).to_csv(args.nodes, index_label='node')
+    pd.concat(edge_frames).to_csv(args.edges, index_label='edge')
+
+
+if __name__ == '__main__':
+    main()
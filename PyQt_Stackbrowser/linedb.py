@@ -1,4 +1,4 @@
-import pandas as pd
+import mapmanager
 
 
 class LineDb:
@@ -14,26 +14,6 @@ class LineDb:
 
         :type fname: str
         """
-        self.data = {}
-        skip = 7
-        with open(fname, 'rU') as f:
-            line = f.readline().split(';')
-            if len(line) > 0:
-                line = line[:-1]
-            for pair in line:
-                _ = pair.split('=')
-                val = _[1]
-                if val.isdigit():
-                    val = int(val)
-                elif val == 'None':
-                    val = None
-                else:
-                    try:
-                        val = float(val)
-                    except ValueError:
-                        pass
-                self.data.update({_[0]: val})
-
-        if 'numHeaderRow' in self.data:
-            skip = self.data['numHeaderRow'] + 2
-        self.dframe = pd.read_csv(fname, skiprows=skip, index_col=False)
+        # The body follows numHeaderRow rows of header information (5 if not given) and a blank line
+        self.data, self.dframe = mapmanager.read(fname, skip=lambda header: header.get('numHeaderRow', 5) + 2,
+                                                 index_col=False)
@@ -0,0 +1,115 @@
+import csv
+import numpy as np
+import pandas as pd
+
+# Body column types of MapManager files. The ROI type is read as a category rather than Python string objects, to save
+# memory; columns missing from a file are ignored, and the types of all others are inferred by pandas.
+COLUMN_DTYPES = {'roiType': 'category', 'x': np.float64, 'y': np.float64}
+
+
+def parse_header(line):
+    """
+    Parses a MapManager header line of 'key=value;' pairs. Values are converted to int, float or None where they
+    look like one, and kept as strings otherwise.
+
+    :param line: The header line
+
+    :type line: str
+
+    :return: The header values by key
+
+    :rtype: dict[str, int | float | str | None]
+    """
+    header = {}
+    for pair in line.strip().split(';'):
+        if '=' not in pair:
+            continue
+        key, val = pair.split('=', 1)
+        header[key] = _typed(val)
+    return header
+
+
+def column_names(line):
+    """
+    Parses the line of column names of a MapManager body the way pandas.read_csv names its columns: quotes are removed
+    but whitespace is kept, empty names become 'Unnamed: <position>' and repeated names get a '.<count>' suffix.
+
+    :param line: The line of column names
+
+    :type line: str
+
+    :rtype: list[str]
+    """
+    names = []
+    counts = {}
+    for i, name in enumerate(next(csv.reader([line.rstrip('\r\n')]))):
+        name = name or 'Unnamed: {}'.format(i)
+        if name in counts:
+            counts[name] += 1
+            name = '{}.{}'.format(name, counts[name])
+        counts.setdefault(name, 0)
+        names.append(name)
+    return names
+
+
+def _typed(val):
+    """
+    Converts a header value to the type it represents.
+
+    :param val: The value as written in the header
+
+    :type val: str
+
+    :rtype: int | float | str | None
+    """
+    if val == 'None':
+        return None
+    for cast in (int, float):
+        try:
+            return cast(val)
+        except ValueError:
+            pass
+    return val
+
+
+def read(fname, skip=1, dtypes=None, as_arrays=False, **kwargs):
+    """
+    Reads a MapManager file (a header line followed by a CSV body) in a single pass: the header and any other lines
+    before the body are read from the same open file that is then handed to pandas to parse the body. Column names
+    are read as pandas would, and the columns in COLUMN_DTYPES are given their types.
+
+    :param fname: Path to the file
+    :param skip: Number of lines before the body's column names, including the header line; or a function returning
+                 that number given the parsed header
+    :param dtypes: Column types to use in addition to (or instead of) COLUMN_DTYPES
+    :param as_arrays: Whether to return the body as a dict of numpy arrays instead of a DataFrame
+    :param kwargs: Further keyword arguments for pandas.read_csv
+
+    :type fname: str
+    :type skip: int | function
+    :type dtypes: dict[str, object]
+    :type as_arrays: bool
+    :type kwargs: dict
+
+    :return: The header values and the body
+
+    :rtype: tuple(dict, pandas.DataFrame | dict[str, numpy.ndarray])
+    """
+    with open(fname, 'rU') as f:
+        header = parse_header(f.readline())
+        if callable(skip):
+            skip = skip(header)
+        for _ in range(skip - 1):
+            f.readline()
+        names = column_names(f.readline())
+
+        column_dtypes = dict(COLUMN_DTYPES)
+        if dtypes is not None:
+            column_dtypes.update(dtypes)
+        column_dtypes = dict((name, dtype) for name, dtype in column_dtypes.items() if name in names)
+
+        body = pd.read_csv(f, header=None, names=names, dtype=column_dtypes, **kwargs)
+
+    if as_arrays:
+        body = dict((name, body[name].values) for name in body.columns)
+    return header, body
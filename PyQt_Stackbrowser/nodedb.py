@@ -1,3 +1,6 @@
+import dbcache
+
+
 class NodeDb:
     """
     Pandas DataFrame of graph nodes, representing vascular junctions.
@@ -17,3 +20,20 @@ class NodeDb:
         self.dframe = dataframe
         self.dx = dx
         self.dy = dy
+
+    @classmethod
+    def from_csv(cls, fname, dx, dy):
+        """
+        Loads the database from its CSV txt file, through the file's binary cache (see dbcache.read_csv).
+
+        :param fname: Path to the CSV txt file
+        :param dx: scaling factor for x positions, in um/pixel
+        :param dy: scaling factor for y positions, in um/pixel
+
+        :type fname: str
+        :type dx: float
+        :type dy: float
+
+        :rtype: NodeDb
+        """
+        return cls(dbcache.read_csv(fname), dx, dy)
@@ -0,0 +1,261 @@
+import numpy as np
+import spatialindex
+
+
+def pair_segments(edge, order, restart=None):
+    """
+    Finds the consecutive points joined by a segment: each point is joined to the previous one if both belong to the
+    same edge and it follows it directly (or starts the edge anew, where 'restart' is given).
+
+    :param edge: The edge index of each point, in file order
+    :param order: The position of each point along its edge
+    :param restart: Which points are joined to the previous point of the same edge regardless of their position
+
+    :type edge: numpy.ndarray
+    :type order: numpy.ndarray
+    :type restart: numpy.ndarray[bool]
+
+    :return: The indices of the first and second endpoint of each segment
+
+    :rtype: tuple(numpy.ndarray[int], numpy.ndarray[int])
+    """
+    edge = np.asarray(edge)
+    order = np.asarray(order)
+    joined = order[1:] == order[:-1] + 1
+    if restart is not None:
+        joined |= np.asarray(restart)[1:]
+    joined &= edge[1:] == edge[:-1]
+    ends = np.flatnonzero(joined) + 1
+    return ends - 1, ends
+
+
+class OverlayData(object):
+    """
+    Slab and edge segment geometry of a stack as flat numpy arrays, in image pixels. Slabs and segments are also
+    indexed by depth, so those of a slice or range of slices are found without visiting the others, and both are
+    indexed by position (see spatialindex), for hit-testing and culling to the viewport. The position indices only
+    serve the batched renderer (OverlayItem), so they are built when first used; with the 'items' renderer, clicks and
+    culling go through Qt's index of the scene.
+    """
+    def __init__(self, x, y, z, edge, seg_start, seg_end):
+        """
+        Constructor; indexes the slabs and segments by depth (and, when first used, by position).
+
+        :param x: The x-coordinate of each slab, in image pixels
+        :param y: The y-coordinate of each slab, in image pixels
+        :param z: The depth of each slab
+        :param edge: The index of the edge each slab belongs to
+        :param seg_start: The first endpoint (slab index) of each segment
+        :param seg_end: The second endpoint (slab index) of each segment
+
+        :type x: numpy.ndarray
+        :type y: numpy.ndarray
+        :type z: numpy.ndarray
+        :type edge: numpy.ndarray
+        :type seg_start: numpy.ndarray[int]
+        :type seg_end: numpy.ndarray[int]
+        """
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.z = np.asarray(z).astype(np.int64)
+        self.edge = np.asarray(edge)
+        self.seg_start = np.asarray(seg_start, dtype=np.intp)
+        self.seg_end = np.asarray(seg_end, dtype=np.intp)
+        self.seg_edge = self.edge[self.seg_start]
+        # Slabs of edges without any segment are never drawn
+        self.drawn = np.in1d(self.edge, self.seg_edge)
+        self.z_order = np.argsort(self.z, kind='mergesort')
+        self.sorted_z = self.z[self.z_order]
+        # Segments by the depth of each endpoint (listed twice if they span slices), so those touching a slice are
+        # a contiguous run
+        segs = np.arange(len(self.seg_start))
+        z0, z1 = self.z[self.seg_start], self.z[self.seg_end]
+        cross = z0 != z1
+        seg_z = np.concatenate([z0, z1[cross]])
+        order = np.argsort(seg_z, kind='mergesort')
+        self.slice_segments = np.concatenate([segs, segs[cross]])[order]
+        self.slice_segment_z = seg_z[order]
+        # Number of the segment's endpoints each entry stands for: both, unless the segment spans slices
+        self.slice_segment_ends = np.concatenate([np.where(cross, 1, 2), np.ones(cross.sum())]).astype(np.int8)[order]
+        # Slabs and segments sorted by edge, so those of a few edges are found without visiting the others
+        self.edge_order = np.argsort(self.edge, kind='mergesort')
+        self.sorted_edge = self.edge[self.edge_order]
+        self.seg_edge_order = np.argsort(self.seg_edge, kind='mergesort')
+        self.sorted_seg_edge = self.seg_edge[self.seg_edge_order]
+        self._slab_index = None
+        self._segment_index = None
+
+    @property
+    def slab_index(self):
+        """
+        Index of the slabs' positions, built on first use.
+
+        :rtype: spatialindex.GridIndex
+        """
+        if self._slab_index is None:
+            self._slab_index = spatialindex.GridIndex(self.x, self.y, self.z)
+        return self._slab_index
+
+    @property
+    def segment_index(self):
+        """
+        Index of the segments' positions, built on first use.
+
+        :rtype: spatialindex.SegmentIndex
+        """
+        if self._segment_index is None:
+            self._segment_index = spatialindex.SegmentIndex(
+                self.x[self.seg_start], self.y[self.seg_start], self.x[self.seg_end], self.y[self.seg_end],
+                self.z[self.seg_start], self.z[self.seg_end])
+        return self._segment_index
+
+    @classmethod
+    def from_slabs(cls, frame, dx, dy):
+        """
+        Builds the geometry of a vascular stack from its slab database.
+
+        :param frame: The slab database
+        :param dx: Size of a pixel along x, in the units of the database
+        :param dy: Size of a pixel along y, in the units of the database
+
+        :type frame: pandas.DataFrame
+        :type dx: float
+        :type dy: float
+
+        :rtype: OverlayData
+        """
+        edge = frame['edgeIdx'].values
+        start, end = pair_segments(edge, frame['i'].values)
+        return cls(frame['x'].values / dx, frame['y'].values / dy, frame['z'].values, edge, start, end)
+
+    @classmethod
+    def from_lines(cls, frame, dx, dy):
+        """
+        Builds the geometry of a spine stack from its line database.
+
+        :param frame: The line database
+        :param dx: Size of a pixel along x, in the units of the database
+        :param dy: Size of a pixel along y, in the units of the database
+
+        :type frame: pandas.DataFrame
+        :type dx: float
+        :type dy: float
+
+        :rtype: OverlayData
+        """
+        edge = frame['ID'].values
+        prev = frame['prevNode'].values
+        start, end = pair_segments(edge, prev, restart=prev == -1)
+        return cls(frame['x'].values / dx, frame['y'].values / dy, frame['z'].values, edge, start, end)
+
+    def slabs_in(self, top, bot):
+        """
+        Returns the drawn slabs with a depth in a range.
+
+        :param top: The first slice of the range
+        :param bot: The last slice of the range
+
+        :type top: int
+        :type bot: int
+
+        :rtype: numpy.ndarray[int]
+        """
+        lo = np.searchsorted(self.sorted_z, top, side='left')
+        hi = np.searchsorted(self.sorted_z, bot, side='right')
+        slabs = self.z_order[lo:hi]
+        return slabs[self.drawn[slabs]]
+
+    def segments_in(self, top, bot):
+        """
+        Returns the segments with an endpoint at a depth in a range.
+
+        :param top: The first slice of the range
+        :param bot: The last slice of the range
+
+        :type top: int
+        :type bot: int
+
+        :return: The segment indices, each once
+        :rtype: numpy.ndarray[int]
+        """
+        return np.unique(self.segment_ends_in(top, bot)[0])
+
+    def segment_ends_in(self, top, bot):
+        """
+        Returns the segment endpoints at a depth in a range, found by binary search in the segments sorted by the
+        depth of their endpoints, so the cost does not depend on the size of the range beyond the number of segments
+        found.
+
+        :param top: The first slice of the range
+        :param bot: The last slice of the range
+
+        :type top: int
+        :type bot: int
+
+        :return: The segment indices, listed twice for segments spanning slices within the range, and the number of
+                 endpoints each entry stands for
+        :rtype: tuple(numpy.ndarray[int], numpy.ndarray[numpy.int8])
+        """
+        lo = np.searchsorted(self.slice_segment_z, top, side='left')
+        hi = np.searchsorted(self.slice_segment_z, bot, side='right')
+        return self.slice_segments[lo:hi], self.slice_segment_ends[lo:hi]
+
+    def segments_at(self, z):
+        """
+        Returns the segments with an endpoint in a slice.
+
+        :param z: The depth of the slice
+
+        :type z: int
+
+        :return: The segment indices, each once
+        :rtype: numpy.ndarray[int]
+        """
+        return self.segment_ends_in(z, z)[0]
+
+    def edge_slabs(self, edges):
+        """
+        Returns the slabs of the given edges.
+
+        :param edges: The edge indices
+
+        :type edges: list[int]
+
+        :rtype: numpy.ndarray[int]
+        """
+        return _runs(self.edge_order, self.sorted_edge, edges)
+
+    def edge_segments(self, edges):
+        """
+        Returns the segments of the given edges.
+
+        :param edges: The edge indices
+
+        :type edges: list[int]
+
+        :rtype: numpy.ndarray[int]
+        """
+        return _runs(self.seg_edge_order, self.sorted_seg_edge, edges)
+
+
+def _runs(order, keys, wanted):
+    """
+    Returns the items with any of the wanted keys, from an ordering of the items by key.
+
+    :param order: The item indices, sorted by key
+    :param keys: The keys, in the same order
+    :param wanted: The keys to find
+
+    :type order: numpy.ndarray[int]
+    :type keys: numpy.ndarray
+    :type wanted: list
+
+    :rtype: numpy.ndarray[int]
+    """
+    wanted = np.unique(np.asarray(list(wanted), dtype=keys.dtype))
+    lo = np.searchsorted(keys, wanted, side='left')
+    hi = np.searchsorted(keys, wanted, side='right')
+    lengths = hi - lo
+    # Positions lo[k], lo[k] + 1, ..., hi[k] - 1 of every run, concatenated
+    starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+    return order[starts + np.arange(lengths.sum())]
@@ -0,0 +1,169 @@
+import re
+import numpy as np
+
+# A condition of a filter: a column, a comparison and a value (e.g. 'nmEdges >= 3'), or a column and an inclusive
+# range of values (e.g. 'z 40..60')
+COMPARISON = re.compile(r'^(\w+)\s*(<=|>=|==|!=|<|>|=)\s*(\S+)$')
+RANGE = re.compile(r'^(\w+)\s+(\S+)\s*\.\.\s*(\S+)$')
+
+# Separators of the conditions of a filter, all of which must hold
+SEPARATOR = re.compile(r'\s*(?:,|&|\band\b)\s*')
+
+# Values accepted for boolean columns, in lower case
+BOOLEANS = {'true': True, 'false': False, '1': True, '0': False}
+
+
+class PointQuery(object):
+    """
+    Sorting and filtering of the rows of a database, for the point list. Each column is indexed the first time it is
+    queried: its sort permutation, its sorted values and the rank of each row in that order. A condition on a column
+    is then a range of ranks, found by binary search, so a filter takes the rows of its narrowest condition straight
+    from the sort permutation and checks the others by rank, without comparing every row's values.
+    """
+    def __init__(self, frame):
+        """
+        Constructor; keeps the column arrays of a DataFrame. Columns are only indexed when first queried.
+
+        :param frame: The database
+
+        :type frame: pandas.DataFrame
+        """
+        self.columns = list(frame.columns)
+        self._arrays = dict((name, np.asarray(frame[name].values)) for name in frame.columns)
+        self._rows = len(frame.index)
+        self._indexes = {}
+
+    def __len__(self):
+        return self._rows
+
+    def _index(self, name):
+        """
+        Returns the index of a column, building it on first use. Columns of Python objects (e.g. text) are ordered
+        by their text; missing numbers sort last and are left out of every range.
+
+        :param name: The column
+
+        :type name: str
+
+        :return: The sort permutation, the sorted values, the rank of each row and the number of rows with a value
+        :rtype: tuple(numpy.ndarray[int], numpy.ndarray, numpy.ndarray[int], int)
+        """
+        if name not in self._indexes:
+            if name not in self._arrays:
+                raise ValueError('No column {!r}; columns are {}'.format(name, ', '.join(map(str, self.columns))))
+            values = self._arrays[name]
+            if values.dtype.kind == 'O':
+                values = values.astype(str)
+            order = np.argsort(values, kind='mergesort')
+            keys = values[order]
+            rank = np.empty(self._rows, dtype=np.intp)
+            rank[order] = np.arange(self._rows)
+            valid = self._rows - int(np.isnan(keys).sum()) if keys.dtype.kind == 'f' else self._rows
+            self._indexes[name] = (order, keys, rank, valid)
+        return self._indexes[name]
+
+    def _value(self, name, text):
+        """
+        Converts the text of a value to the type of a column's sorted values.
+
+        :param name: The column
+        :param text: The value
+
+        :type name: str
+        :type text: str
+        """
+        keys = self._index(name)[1]
+        if keys.dtype.kind == 'b':
+            value = BOOLEANS.get(text.lower())
+            if value is None:
+                raise ValueError('{!r} is not true or false, as needed for column {!r}'.format(text, name))
+            return value
+        if keys.dtype.kind in 'fiu':
+            try:
+                return float(text)
+            except ValueError:
+                raise ValueError('{!r} is not a number, as needed for column {!r}'.format(text, name))
+        return text
+
+    def condition(self, text):
+        """
+        Parses a condition on a column (see COMPARISON and RANGE) into the range of ranks satisfying it.
+
+        :param text: The condition
+
+        :type text: str
+
+        :return: The column, the first and last (excluded) ranks of the range, and whether the condition holds
+                 outside it rather than in it
+        :rtype: tuple(str, int, int, bool)
+        """
+        text = text.strip()
+        match = RANGE.match(text)
+        if match:
+            name, low, high = match.groups()
+            _, keys, _, valid = self._index(name)
+            return (name, np.searchsorted(keys[:valid], self._value(name, low), side='left'),
+                    np.searchsorted(keys[:valid], self._value(name, high), side='right'), False)
+        match = COMPARISON.match(text)
+        if not match:
+            raise ValueError('Cannot read condition {!r}; use e.g. "nmEdges >= 3" or "z 40..60"'.format(text))
+        name, op, value = match.groups()
+        _, keys, _, valid = self._index(name)
+        value = self._value(name, value)
+        left = np.searchsorted(keys[:valid], value, side='left')
+        right = np.searchsorted(keys[:valid], value, side='right')
+        return {'<': (name, 0, left, False), '<=': (name, 0, right, False),
+                '>': (name, right, valid, False), '>=': (name, left, valid, False),
+                '=': (name, left, right, False), '==': (name, left, right, False),
+                '!=': (name, left, right, True)}[op]
+
+    def filter(self, text):
+        """
+        Returns the rows satisfying all conditions of a filter (see SEPARATOR), in order.
+
+        :param text: The filter; all rows satisfy an empty filter
+
+        :type text: str
+
+        :rtype: numpy.ndarray[int]
+        """
+        conditions = [self.condition(part) for part in SEPARATOR.split(text.strip()) if part]
+        if not conditions:
+            return np.arange(self._rows)
+        # Start from the narrowest range, and check the other conditions on its rows by rank
+        ranges = sorted((c for c in conditions if not c[3]), key=lambda c: c[2] - c[1])
+        if ranges:
+            name, lo, hi, _ = ranges[0]
+            rows = self._index(name)[0][lo:hi]
+            conditions.remove(ranges[0])
+        else:
+            rows = np.arange(self._rows)
+        for name, lo, hi, outside in conditions:
+            rank = self._index(name)[2][rows]
+            inside = (rank >= lo) & (rank < hi)
+            rows = rows[~inside if outside else inside]
+        return np.sort(rows)
+
+    def sort(self, rows, name, descending=False):
+        """
+        Orders rows by the values of a column (rows with equal values keep their order, and rows missing a value come
+        last in either direction).
+
+        :param rows: The rows
+        :param name: The column
+        :param descending: Whether to put the largest values first
+
+        :type rows: numpy.ndarray[int]
+        :type name: str
+        :type descending: bool
+
+        :rtype: numpy.ndarray[int]
+        """
+        _, keys, rank, valid = self._index(name)
+        rank = rank[rows]
+        if descending:
+            # Ranked from the largest value down, equal values sharing a rank; missing values keep their ranks, from
+            # valid on
+            present = rank < valid
+            rank[present] = valid - np.searchsorted(keys[:valid], keys[rank[present]], side='right')
+        return rows[np.argsort(rank, kind='mergesort')]
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class Columns(object):
+    """
+    The columns of a database as numpy arrays, shared by lightweight Records of its rows. Replaces the namedtuples of
+    DataFrame.itertuples(), which copy every field of every row into Python objects.
+    """
+    def __init__(self, frame):
+        """
+        Constructor; keeps the column arrays of a DataFrame (not copied where pandas stores them as numpy arrays).
+
+        :param frame: The database
+
+        :type frame: pandas.DataFrame
+        """
+        self.index = frame.index.values
+        self.arrays = dict((name, frame[name].values) for name in frame.columns)
+
+    def __len__(self):
+        return len(self.index)
+
+    def record(self, row):
+        """
+        Returns a Record of a row.
+
+        :param row: The position of the row in the database
+
+        :type row: int
+
+        :rtype: Record
+        """
+        return Record(self, row)
+
+    def records(self):
+        """
+        Returns Records of all rows, in order.
+
+        :rtype: list[Record]
+        """
+        return [Record(self, row) for row in range(len(self.index))]
+
+
+class Record(object):
+    """
+    One row of a database, read on access from the shared column arrays. Fields are accessed by name, as on the
+    namedtuples of DataFrame.itertuples() (including 'Index', the row's label), and are returned as Python scalars.
+    """
+    __slots__ = ('columns', 'row')
+
+    def __init__(self, columns, row):
+        """
+        Constructor.
+
+        :param columns: The columns of the database
+        :param row: The position of the row in the database
+
+        :type columns: Columns
+        :type row: int
+        """
+        self.columns = columns
+        self.row = row
+
+    def __getattr__(self, name):
+        # Only called for names that are not slots, i.e. fields of the row (or slots not set yet, when copying)
+        if name in Record.__slots__ or name.startswith('__'):
+            raise AttributeError(name)
+        if name == 'Index':
+            array = self.columns.index
+        else:
+            try:
+                array = self.columns.arrays[name]
+            except KeyError:
+                raise AttributeError(name)
+        value = array[self.row]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def __repr__(self):
+        return 'Record({})'.format(', '.join('{}={!r}'.format(name, getattr(self, name))
+                                             for name in ['Index'] + sorted(self.columns.arrays)))
@@ -0,0 +1,179 @@
+import threading
+import Queue
+from collections import OrderedDict
+
+# Default memory budget of each stack's slice cache, in bytes
+CACHE_BYTES = 256 * 1024 * 1024
+
+# Default number of slices to read ahead in the scroll direction
+PREFETCH_DEPTH = 4
+
+
+class SliceCache(object):
+    """
+    Bounded least-recently-used cache of stack slices. Slices are evicted oldest-first once the cached bytes exceed
+    the budget. A background thread can prefetch the slices ahead of the current scroll direction, so scrolling
+    through a lazily loaded stack rarely has to wait on the disk.
+    """
+    def __init__(self, loader, maxz, max_bytes=CACHE_BYTES, depth=PREFETCH_DEPTH):
+        """
+        Constructor; creates an empty cache. The prefetch thread is started on the first prefetch request.
+
+        :param loader: Function returning the slice at a given depth; called from both the GUI and prefetch threads
+        :param maxz: The index of the last slice of the stack
+        :param max_bytes: Memory budget of the cache, in bytes
+        :param depth: Number of slices to prefetch ahead of the scroll direction
+
+        :type loader: function
+        :type maxz: int
+        :type max_bytes: int
+        :type depth: int
+        """
+        self.loader = loader
+        self.maxz = maxz
+        self.max_bytes = max_bytes
+        self.depth = depth
+
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+        self._slices = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = Queue.Queue()
+        self._generation = 0
+        self._thread = None
+
+    def __contains__(self, z):
+        return z in self._slices
+
+    def get(self, z):
+        """
+        Returns the slice at depth z, loading and caching it if necessary.
+
+        :param z: The depth of the slice
+
+        :type z: int
+
+        :return: The slice
+
+        :rtype: numpy.ndarray
+        """
+        with self._lock:
+            if z in self._slices:
+                self.hits += 1
+                stack_slice = self._slices.pop(z)
+                self._slices[z] = stack_slice
+                return stack_slice
+            self.misses += 1
+        stack_slice = self.loader(z)
+        self._store(z, stack_slice)
+        return stack_slice
+
+    def prefetch(self, z, direction, key=None):
+        """
+        Queues the 'depth' slices following z in the given direction for loading in the background. Requests still
+        queued from an earlier call are dropped.
+
+        :param z: The depth of the slice currently viewed
+        :param direction: 1 if scrolling towards the end of the stack, -1 if scrolling towards the start
+        :param key: Function returning the cache key of the slice at a given depth, for caches not keyed by depth
+
+        :type z: int
+        :type direction: int
+        :type key: function
+
+        :return: None
+        """
+        if direction == 0 or self.depth <= 0:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        for i in range(1, self.depth + 1):
+            nz = z + i * direction
+            if 0 <= nz <= self.maxz:
+                self._queue.put((generation, nz if key is None else key(nz)))
+
+    def clear(self):
+        """
+        Empties the cache and drops any pending prefetch requests. Hit and miss counters are kept.
+
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            self._slices.clear()
+            self.nbytes = 0
+
+    def close(self):
+        """
+        Empties the cache and stops the prefetch thread.
+
+        :return: None
+        """
+        self.clear()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread = None
+
+    def stats(self):
+        """
+        Summarizes cache usage, for tuning the budget and prefetch depth.
+
+        :return: Hit, miss and prefetch counts, hit rate, and the number of slices and bytes cached
+
+        :rtype: dict[str, int | float]
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'prefetched': self.prefetched,
+                    'hit_rate': float(self.hits) / requests if requests else 0.0,
+                    'slices': len(self._slices), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+    def _store(self, z, stack_slice, prefetched=False):
+        """
+        Adds a slice to the cache, evicting the least recently used slices until the cache is within budget.
+
+        :param z: The depth of the slice
+        :param stack_slice: The slice
+        :param prefetched: Whether the slice was loaded by the prefetch thread
+
+        :type z: int
+        :type stack_slice: numpy.ndarray
+        :type prefetched: bool
+
+        :return: None
+        """
+        with self._lock:
+            if z in self._slices:
+                self.nbytes -= self._slices.pop(z).nbytes
+            self._slices[z] = stack_slice
+            self.nbytes += stack_slice.nbytes
+            if prefetched:
+                self.prefetched += 1
+            while self.nbytes > self.max_bytes and len(self._slices) > 1:
+                _, evicted = self._slices.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def _run(self):
+        """
+        Body of the prefetch thread. Loads queued slices until stopped, skipping those already cached or queued by an
+        earlier prefetch request.
+
+        :return: None
+        """
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            generation, key = request
+            with self._lock:
+                if generation != self._generation or key in self._slices:
+                    continue
+            self._store(key, self.loader(key), prefetched=True)
@@ -0,0 +1,316 @@
+import numpy as np
+
+# Default side length of a grid cell, in the units of the indexed coordinates (image pixels for overlays)
+CELL_SIZE = 16.0
+
+
+class GridIndex(object):
+    """
+    Uniform grid over a set of 2D points, for finding the points near a position or inside a rectangle without testing
+    every one. Points are bucketed by cell and sorted by cell key, so the points of a column of cells are a contiguous
+    run found with a binary search. Points may also have a depth, so queries can be limited to a range of slices.
+    """
+    def __init__(self, x, y, z=None, cell=CELL_SIZE):
+        """
+        Constructor; buckets the points.
+
+        :param x: The x-coordinates of the points
+        :param y: The y-coordinates of the points
+        :param z: The depths of the points, if queries are to be limited to ranges of slices
+        :param cell: Side length of a grid cell
+
+        :type x: numpy.ndarray
+        :type y: numpy.ndarray
+        :type z: numpy.ndarray
+        :type cell: float
+        """
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.z = None if z is None else np.asarray(z)
+        self.cell = float(cell)
+        if len(self.x) == 0:
+            self._x0 = self._y0 = 0
+            self._rows = self._columns = 1
+        else:
+            self._x0 = int(np.floor(self.x.min() / self.cell))
+            self._y0 = int(np.floor(self.y.min() / self.cell))
+            self._rows = int(np.floor(self.y.max() / self.cell)) - self._y0 + 1
+            self._columns = int(np.floor(self.x.max() / self.cell)) - self._x0 + 1
+        keys = self._keys(self.x, self.y)
+        self.order = np.argsort(keys, kind='mergesort')
+        self.keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.x)
+
+    def _keys(self, x, y):
+        """
+        Returns the cell keys of positions; cells are numbered column by column.
+
+        :param x: The x-coordinates
+        :param y: The y-coordinates
+
+        :type x: numpy.ndarray
+        :type y: numpy.ndarray
+
+        :rtype: numpy.ndarray[numpy.int64]
+        """
+        cx = np.floor(np.asarray(x) / self.cell).astype(np.int64) - self._x0
+        cy = np.floor(np.asarray(y) / self.cell).astype(np.int64) - self._y0
+        return cx * self._rows + cy
+
+    def query_radius(self, px, py, radius, zrange=None):
+        """
+        Finds the points within a distance of a position.
+
+        :param px: The x-coordinate of the position
+        :param py: The y-coordinate of the position
+        :param radius: The distance
+        :param zrange: The first and last slice the points may lie in (any by default)
+
+        :type px: float
+        :type py: float
+        :type radius: float
+        :type zrange: tuple(int, int)
+
+        :return: The indices of the points, in no particular order
+
+        :rtype: numpy.ndarray[int]
+        """
+        candidates = self._in_zrange(self._candidates(px - radius, py - radius, px + radius, py + radius), zrange)
+        dist2 = (self.x[candidates] - px) ** 2 + (self.y[candidates] - py) ** 2
+        return candidates[dist2 <= radius * radius]
+
+    def query_rect(self, left, top, right, bottom, zrange=None):
+        """
+        Finds the points inside a rectangle.
+
+        :param left: The smallest x-coordinate of the rectangle
+        :param top: The smallest y-coordinate of the rectangle
+        :param right: The largest x-coordinate of the rectangle
+        :param bottom: The largest y-coordinate of the rectangle
+        :param zrange: The first and last slice the points may lie in (any by default)
+
+        :type left: float
+        :type top: float
+        :type right: float
+        :type bottom: float
+        :type zrange: tuple(int, int)
+
+        :return: The indices of the points, in no particular order
+
+        :rtype: numpy.ndarray[int]
+        """
+        candidates = self._in_zrange(self._candidates(left, top, right, bottom), zrange)
+        x, y = self.x[candidates], self.y[candidates]
+        return candidates[(x >= left) & (x <= right) & (y >= top) & (y <= bottom)]
+
+    def nearest(self, px, py, radius, mask=None, zrange=None):
+        """
+        Finds the point closest to a position, within a maximum distance.
+
+        :param px: The x-coordinate of the position
+        :param py: The y-coordinate of the position
+        :param radius: The maximum distance
+        :param mask: Which points may be returned (all by default)
+        :param zrange: The first and last slice the point may lie in (any by default)
+
+        :type px: float
+        :type py: float
+        :type radius: float
+        :type mask: numpy.ndarray[bool]
+        :type zrange: tuple(int, int)
+
+        :return: The index of the closest point, or None if there is none within the distance
+
+        :rtype: int | None
+        """
+        found = self.query_radius(px, py, radius, zrange)
+        if mask is not None:
+            found = found[mask[found]]
+        if len(found) == 0:
+            return None
+        dist2 = (self.x[found] - px) ** 2 + (self.y[found] - py) ** 2
+        return int(found[np.argmin(dist2)])
+
+    def _in_zrange(self, candidates, zrange):
+        """
+        Keeps the candidate points lying in a range of slices.
+
+        :param candidates: Indices of the points
+        :param zrange: The first and last slice of the range (None to keep all points)
+
+        :type candidates: numpy.ndarray[int]
+        :type zrange: tuple(int, int)
+
+        :rtype: numpy.ndarray[int]
+        """
+        if zrange is None or self.z is None:
+            return candidates
+        z = self.z[candidates]
+        return candidates[(z >= zrange[0]) & (z <= zrange[1])]
+
+    def _candidates(self, left, top, right, bottom):
+        """
+        Returns the points in all cells overlapping a rectangle.
+
+        :param left: The smallest x-coordinate of the rectangle
+        :param top: The smallest y-coordinate of the rectangle
+        :param right: The largest x-coordinate of the rectangle
+        :param bottom: The largest y-coordinate of the rectangle
+
+        :type left: float
+        :type top: float
+        :type right: float
+        :type bottom: float
+
+        :rtype: numpy.ndarray[int]
+        """
+        cx0 = max(int(np.floor(left / self.cell)) - self._x0, 0)
+        cx1 = min(int(np.floor(right / self.cell)) - self._x0, self._columns - 1)
+        cy0 = max(int(np.floor(top / self.cell)) - self._y0, 0)
+        cy1 = min(int(np.floor(bottom / self.cell)) - self._y0, self._rows - 1)
+        if cx1 < cx0 or cy1 < cy0:
+            return np.empty(0, dtype=np.intp)
+        columns = np.arange(cx0, cx1 + 1) * self._rows
+        starts = np.searchsorted(self.keys, columns + cy0, side='left')
+        ends = np.searchsorted(self.keys, columns + cy1, side='right')
+        if len(starts) == 1:
+            return self.order[starts[0]:ends[0]]
+        return np.concatenate([self.order[s:e] for s, e in zip(starts, ends)])
+
+
+class SegmentIndex(object):
+    """
+    Spatial index of line segments, built on a GridIndex of their midpoints: queries are widened by the largest
+    half-extent of any segment and the candidates then tested exactly. A segment lies in a range of slices if either
+    endpoint does.
+    """
+    def __init__(self, x0, y0, x1, y1, z0=None, z1=None, cell=CELL_SIZE):
+        """
+        Constructor; indexes the segments.
+
+        :param x0: The x-coordinates of the first endpoints
+        :param y0: The y-coordinates of the first endpoints
+        :param x1: The x-coordinates of the second endpoints
+        :param y1: The y-coordinates of the second endpoints
+        :param z0: The depths of the first endpoints, if queries are to be limited to ranges of slices
+        :param z1: The depths of the second endpoints
+        :param cell: Side length of a grid cell
+
+        :type x0: numpy.ndarray
+        :type y0: numpy.ndarray
+        :type x1: numpy.ndarray
+        :type y1: numpy.ndarray
+        :type z0: numpy.ndarray
+        :type z1: numpy.ndarray
+        :type cell: float
+        """
+        self.x0, self.y0 = np.asarray(x0, dtype=np.float64), np.asarray(y0, dtype=np.float64)
+        self.x1, self.y1 = np.asarray(x1, dtype=np.float64), np.asarray(y1, dtype=np.float64)
+        self.z0 = None if z0 is None else np.asarray(z0)
+        self.z1 = None if z1 is None else np.asarray(z1)
+        self.grid = GridIndex((self.x0 + self.x1) / 2, (self.y0 + self.y1) / 2, cell=cell)
+        if len(self.x0) == 0:
+            self.reach = 0.0
+        else:
+            self.reach = max(np.abs(self.x1 - self.x0).max(), np.abs(self.y1 - self.y0).max()) / 2
+
+    def __len__(self):
+        return len(self.x0)
+
+    def query_rect(self, left, top, right, bottom, zrange=None):
+        """
+        Finds the segments whose bounding boxes intersect a rectangle.
+
+        :param left: The smallest x-coordinate of the rectangle
+        :param top: The smallest y-coordinate of the rectangle
+        :param right: The largest x-coordinate of the rectangle
+        :param bottom: The largest y-coordinate of the rectangle
+        :param zrange: The first and last slice an endpoint must lie in (any by default)
+
+        :type left: float
+        :type top: float
+        :type right: float
+        :type bottom: float
+        :type zrange: tuple(int, int)
+
+        :return: The indices of the segments, in no particular order
+
+        :rtype: numpy.ndarray[int]
+        """
+        r = self.reach
+        candidates = self._in_zrange(self.grid.query_rect(left - r, top - r, right + r, bottom + r), zrange)
+        x0, y0, x1, y1 = self.x0[candidates], self.y0[candidates], self.x1[candidates], self.y1[candidates]
+        inside = (np.maximum(x0, x1) >= left) & (np.minimum(x0, x1) <= right) & (
+            np.maximum(y0, y1) >= top) & (np.minimum(y0, y1) <= bottom)
+        return candidates[inside]
+
+    def nearest(self, px, py, radius, mask=None, zrange=None):
+        """
+        Finds the segment closest to a position, within a maximum distance.
+
+        :param px: The x-coordinate of the position
+        :param py: The y-coordinate of the position
+        :param radius: The maximum distance
+        :param mask: Which segments may be returned (all by default)
+        :param zrange: The first and last slice an endpoint must lie in (any by default)
+
+        :type px: float
+        :type py: float
+        :type radius: float
+        :type mask: numpy.ndarray[bool]
+        :type zrange: tuple(int, int)
+
+        :return: The index of the closest segment, or None if there is none within the distance
+
+        :rtype: int | None
+        """
+        found = self.query_rect(px - radius, py - radius, px + radius, py + radius, zrange)
+        if mask is not None:
+            found = found[mask[found]]
+        if len(found) == 0:
+            return None
+        dist2 = self._distance2(found, px, py)
+        best = np.argmin(dist2)
+        if dist2[best] > radius * radius:
+            return None
+        return int(found[best])
+
+    def _distance2(self, segments, px, py):
+        """
+        Returns the squared distances from a position to segments.
+
+        :param segments: Indices of the segments
+        :param px: The x-coordinate of the position
+        :param py: The y-coordinate of the position
+
+        :type segments: numpy.ndarray[int]
+        :type px: float
+        :type py: float
+
+        :rtype: numpy.ndarray[float]
+        """
+        x0, y0 = self.x0[segments], self.y0[segments]
+        dx, dy = self.x1[segments] - x0, self.y1[segments] - y0
+        length2 = dx * dx + dy * dy
+        # Position of the closest point along each segment, clamped to its endpoints
+        t = np.clip(((px - x0) * dx + (py - y0) * dy) / np.where(length2 > 0, length2, 1), 0, 1)
+        return (x0 + t * dx - px) ** 2 + (y0 + t * dy - py) ** 2
+
+    def _in_zrange(self, candidates, zrange):
+        """
+        Keeps the candidate segments with an endpoint in a range of slices.
+
+        :param candidates: Indices of the segments
+        :param zrange: The first and last slice of the range (None to keep all segments)
+
+        :type candidates: numpy.ndarray[int]
+        :type zrange: tuple(int, int)
+
+        :rtype: numpy.ndarray[int]
+        """
+        if zrange is None or self.z0 is None:
+            return candidates
+        z0, z1 = self.z0[candidates], self.z1[candidates]
+        return candidates[((z0 >= zrange[0]) & (z0 <= zrange[1])) | ((z1 >= zrange[0]) & (z1 <= zrange[1]))]
@@ -1,4 +1,4 @@
-import sys, os
+import sys, os, time
 import copy as cp
 import numpy as np
 import PyQt4.QtCore as qc
@@ -8,6 +8,9 @@ import PointTable as pt
 import StackPoints as sps
 import tiffstack as ts
 import TimeSeriesHelper as tsh
+import contrast
+import SliceItem as si
+import StackLoader as sl
 
 # Empty color palettes filled in during initialization; public to the whole module for later access
 GREEN = []
@@ -15,6 +18,12 @@ RED = []
 ID = 0
 ts_helper = None
 
+# Largest number of slices above and below the current one whose overlay items can be shown
+MAX_DEPTH = 500
+
+# Tool tip of the point list's filter box, while its filter can be read
+FILTER_TIP = "Conditions on the columns of the point list, separated by commas, e.g. 'nmEdges >= 3, z 40..60'"
+
 
 class MainWindow(qg.QMainWindow):
     """
@@ -45,16 +54,15 @@ class MainWindow(qg.QMainWindow):
             ID += 1
 
         self.stack = None
-        self.open_stacks = []
-        self.scroll_z = None
+        self.points = None
         self.z = None
-        self._prev_selected_slice = None
         self.channel = None
         self._ptresize = False
         self.scale = 1.0
-        self.image = None
+        self.level = 0
         self._min_intensity = 7
         self._max_intensity = 255
+        self.contrast = contrast.ContrastEngine(self._min_intensity, self._max_intensity)
         self.COLORTABLE = []
         # Set default color table for 8-bit images
         if len(GREEN) == 0 or len(RED) == 0:
@@ -88,7 +96,9 @@ class MainWindow(qg.QMainWindow):
         palette.setColor(qg.QPalette.Background, qc.Qt.white)
         self.imageLabel.setPalette(palette)
 
-        self.scene.addWidget(self.imageLabel)
+        # The slice itself is drawn by an item on top of the label, which only provides the background and the size
+        # of the image area. As a child of the label's proxy it is left alone by code acting on top-level items.
+        self.imageItem = si.SliceItem(self.scene.addWidget(self.imageLabel))
 
         # Add removable toolbars for useful interaction and information display
         self.leftToolbar = setter.toolBar
@@ -122,22 +132,71 @@ class MainWindow(qg.QMainWindow):
         self.maxContrastSpinBox.valueChanged.connect(self.maxContrastBar.setValue)
         self.maxContrastBar.valueChanged.connect(self.maxContrastSpinBox.setValue)
 
+        # Curve mapping the contrast window onto display values
+        self.mappingComboBox = qg.QComboBox()
+        self.mappingComboBox.addItems(list(contrast.MAPPINGS))
+        self.mappingComboBox.setToolTip("Intensity mapping")
+        self.mappingComboBox.setFocusPolicy(qc.Qt.NoFocus)
+        self.gammaSpinBox = qg.QDoubleSpinBox()
+        self.gammaSpinBox.setRange(0.1, 5.0)
+        self.gammaSpinBox.setSingleStep(0.1)
+        self.gammaSpinBox.setValue(contrast.DEFAULT_GAMMA)
+        self.gammaSpinBox.setToolTip("Gamma")
+        self.gammaSpinBox.setEnabled(False)
+        self.mappingComboBox.currentIndexChanged.connect(lambda _: self._change_mapping())
+        self.gammaSpinBox.valueChanged.connect(lambda _: self._change_mapping())
+
+        # Number of slices above and below the current one whose overlay items are shown
+        self.depthSpinBox = qg.QSpinBox()
+        self.depthSpinBox.setRange(0, MAX_DEPTH)
+        self.depthSpinBox.setValue(1)
+        self.depthSpinBox.setPrefix(u"\u00b1")
+        self.depthSpinBox.setSuffix(" slices")
+        self.depthSpinBox.setToolTip("Depth of the overlay window")
+        self.depthSpinBox.setStatusTip(self.depthSpinBox.toolTip())
+        self.depthSpinBox.valueChanged.connect(self._change_depth)
+
         tempWidget = qg.QWidget(self.topToolbar)
         tempWidget.setLayout(qg.QGridLayout())
         tempWidget.layout().addWidget(self.minContrastSpinBox, 0, 0)
         tempWidget.layout().addWidget(self.minContrastBar, 0, 1)
         tempWidget.layout().addWidget(self.maxContrastSpinBox, 1, 0)
         tempWidget.layout().addWidget(self.maxContrastBar, 1, 1)
+        tempWidget.layout().addWidget(self.mappingComboBox, 0, 2)
+        tempWidget.layout().addWidget(self.gammaSpinBox, 1, 2)
+        tempWidget.layout().addWidget(self.depthSpinBox, 0, 3)
 
         # self.topToolbar.addWidget(self.zoomSpinBox)
         self.topToolbar.addWidget(tempWidget)
 
+        # Filter of the point list (see pointquery)
+        self.filterEdit = qg.QLineEdit()
+        self.filterEdit.setPlaceholderText("Filter, e.g. z 40..60, x > 100")
+        self.filterEdit.setToolTip(FILTER_TIP)
+        self.filterEdit.textChanged.connect(self._filter_points)
+        self.leftToolbar.addWidget(self.filterEdit)
+
         self.list = qg.QTableView(self)
         self.list.setFont(qg.QFont("Arial", 10))
         self.list.setSelectionBehavior(qg.QAbstractItemView.SelectRows)
+        self.list.setSortingEnabled(True)
         self.leftToolbar.addWidget(self.list)
         self.leftToolbar.hide()
 
+        # Time points and channels are loaded in the background; a busy indicator is shown in the status bar meanwhile.
+        # Preloaded stacks are kept in the shared pool, which only exists once the first window is made
+        self.loader = sl.StackLoader(lambda: ts_helper.pool, parent=self)
+        self.loader.loaded.connect(self._stack_loaded)
+        self.loader.failed.connect(self._stack_failed)
+        self._pending_channel = None
+        self.loadProgress = qg.QProgressBar()
+        self.loadProgress.setRange(0, 0)
+        self.loadProgress.setMaximumWidth(120)
+        self.loadProgress.hide()
+        self.statusBar().addPermanentWidget(self.loadProgress)
+        self.memoryLabel = qg.QLabel()
+        self.statusBar().addPermanentWidget(self.memoryLabel)
+
     def action_handler(self, handle, *args, **kwargs):
         """
         Custom universal handler for valid hidden functions. Uses a dictionary associating keywords with their
@@ -192,9 +251,9 @@ class MainWindow(qg.QMainWindow):
         if self.stack is not None:
             # Resize image and overlay to new size
             # Add drawing nodes to window display functions
-            self.view_slice(self.z)
             self.view.resize(self.splitter.width(), self.splitter.width())
             self.imageLabel.resize(self.splitter.width(), self.splitter.width())
+            self._fit_level()
             self.scene.setSceneRect(qc.QRectF(0, 0, self.imageLabel.width() - 2, self.imageLabel.height() - 2))
 
             # Now draw new nodes
@@ -222,7 +281,6 @@ class MainWindow(qg.QMainWindow):
         if self.stack is not None:
             # Add drawing nodes to window display functions
             self.z -= np.sign(event.delta())
-            self.scroll_z = self.z
             if self.z < 0:
                 self.z = 0
             if self.z > self.stack.maxz:
@@ -278,6 +336,7 @@ class MainWindow(qg.QMainWindow):
         """
         global ts_helper
         ts_helper.delete_window(self)
+        self.loader.close()
         qg.QMainWindow.closeEvent(self, event)
 
     def view_slice(self, z):
@@ -290,28 +349,38 @@ class MainWindow(qg.QMainWindow):
 
         :return: None
         """
-        a = self.stack.get_slice(z)
-        a = ts.adjust_contrast(a, self._min_intensity, self._max_intensity)
-        self.image = qg.QImage(a.tostring(), a.shape[0], a.shape[1], qg.QImage.Format_Indexed8)
+        frame_start = time.time()
+        # Use the smallest pyramid level that still has a pixel for every pixel on screen
+        self.level = self.stack.level_for(self.imageLabel.width() * self.scale)
+        a = self.stack.get_level(z, self.level)
+        self.contrast.set_range(self._min_intensity, self._max_intensity)
         if self.channel == 1:
             self.COLORTABLE = GREEN
         elif self.channel == 2:
             self.COLORTABLE = RED
-        self.image.setColorTable(self.COLORTABLE)
-        p = qg.QPixmap.fromImage(self.image)
-        self.imageLabel.setPixmap(p.scaled(self.imageLabel.width(), self.imageLabel.width()))
-        if z < self.z - 1 or z > self.z + 1:
-            for item in self.scene.items():
-                if item.parentItem() is None and not item.isWidget() and not item.isSelected():
-                    item.hide()
+        # Contrast is applied by the image item, only to the tiles in view
+        self.imageItem.setSlice(a, (self.stack.directory, z, self.level), self.contrast, self.COLORTABLE,
+                                frame_start)
+        self.imageItem.fitWidth(self.imageLabel.width())
         self.z = z
 
+    def _fit_level(self):
+        """
+        Rescales the displayed slice to the size of the image area, redrawing it if a different pyramid level is
+        needed for the new on-screen size.
+
+        :return: None
+        """
+        if self.stack.level_for(self.imageLabel.width() * self.scale) != self.level:
+            self.view_slice(self.z)
+        else:
+            self.imageItem.fitWidth(self.imageLabel.width())
+
     def _help_toolbar_resize(self, *_args):
         toplevel = None
         if len(_args) > 0:
             toplevel = _args[0]
         if toplevel is not None and toplevel:
-            self.points.cur_scale = float(self.splitter.width()) / self.stack.imarray.shape[1]
             self.points.draw(resize=True)
 
     def _node_select(self, *args, **kwargs):
@@ -332,8 +401,6 @@ class MainWindow(qg.QMainWindow):
         :return: None
         """
         deselect = False
-        if self._prev_selected_slice is None:
-            self._prev_selected_slice = self.z
         if 'deselect' in kwargs:
             deselect = kwargs['deselect']
 
@@ -344,26 +411,25 @@ class MainWindow(qg.QMainWindow):
                 ind = node.dfentry.i
             elif self.stack.type == 'Spines':
                 ind = node.dfentry.Idx
+            # The list may be sorted or filtered; nodes filtered out of it are only selected in the view
+            row = cur_model.source_position(ind)
+            if row < 0:
+                return
             if not deselect:
-                self.list.selectionModel().select(cur_model.index(ind, 0),
+                self.list.selectionModel().select(cur_model.index(row, 0),
                                                   qg.QItemSelectionModel.Select | qg.QItemSelectionModel.Rows)
             else:
-                self.list.selectionModel().select(cur_model.index(ind, 0),
+                self.list.selectionModel().select(cur_model.index(row, 0),
                                                   qg.QItemSelectionModel.Deselect | qg.QItemSelectionModel.Rows)
 
         if len(args) == 2:
-            selected = args[0]
-            deselected = args[1]
+            # Rows of the list are mapped back to rows of the database (the nodes' indices) through the proxy
+            proxy = self.list.model()
+            selected = proxy.mapSelectionToSource(args[0])
+            deselected = proxy.mapSelectionToSource(args[1])
 
             prev_row = None
 
-            prev_vis_range = range(self._prev_selected_slice - self.points.offset,
-                                   self._prev_selected_slice + self.points.offset + 1)
-
-            prev_scroll_range = []
-            if self.scroll_z is not None:
-                prev_scroll_range = range(self.scroll_z - self.points.offset, self.scroll_z + self.points.offset + 1)
-
             for node in selected.indexes():
                 if node.row() != prev_row:
                     prev_row = node.row()
@@ -379,23 +445,12 @@ class MainWindow(qg.QMainWindow):
                     if n.isSelected():
                         n.setSelected(False)
 
-            for i in prev_vis_range:
-                if i in self.points.nodes:
-                    for node in self.points.nodes[i]:
-                        if node.isVisible() and self.z not in prev_vis_range:
-                            node.hide()
-            for i in prev_scroll_range:
-                if i in self.points.nodes:
-                    for node in self.points.nodes[i]:
-                        if node.isVisible() and self.z not in prev_scroll_range:
-                            node.hide()
-
+            # Jumping to the node's slice is diffed against the slices shown by draw
             selection = self.list.selectionModel().selectedRows()
             if len(selection) > 0:
-                n = self.points.nodes_by_idx[selection[-1].row()]
+                n = self.points.nodes_by_idx[proxy.mapToSource(selection[-1]).row()]
                 self.view_slice(n.dfentry.z)
                 self.points.draw()
-        self._prev_selected_slice = self.z
 
     def _open(self, *args, **kwargs):
         """
@@ -424,18 +479,21 @@ class MainWindow(qg.QMainWindow):
                 self.stack = ts.TiffStack(fpath)
             except IOError:
                 return
+        # A stack opened directly replaces any switch still loading in the background
+        self.loader.cancel()
+        self.loadProgress.hide()
         try:
             self.channel = int(self.stack.channel.lstrip('ch'))
         except AttributeError:
             pass
 
-        if self.stack not in self.open_stacks:
-            try:
-                self.open_stacks.append(self.stack)
-            except MemoryError:
-                self.open_stacks[0] = self.stack
+        global ts_helper
+        ts_helper.pool.add(self.stack)
+        self._show_usage()
 
-        # Get min and max intensities if changed from default prior to load
+        # Fit the contrast controls to the stack's data type, then get min and max intensities if changed from default
+        # prior to load
+        self._fit_intensity_range()
         self._min_intensity = self.minContrastSpinBox.value()
         self._max_intensity = self.maxContrastSpinBox.value()
 
@@ -449,16 +507,21 @@ class MainWindow(qg.QMainWindow):
         self.points = sps.DrawingPointsWidget(self)
 
         if self.stack.type == 'Vascular':
-            choice = self.stack.node_db.dframe
+            # List nodes with their degree and branch order
+            choice = self.stack.node_db.dframe.join(self.stack.graph_metrics()[0])
         elif self.stack.type == 'Spines':
             choice = self.stack.stack_db.dframe
-        pointModel = pt.PointTable(choice)
+        pointModel = pt.PointProxy(pt.PointTable(choice))
+        # Start unsorted, in the order of the database
+        self.list.horizontalHeader().setSortIndicator(-1, qc.Qt.AscendingOrder)
         self.list.setModel(pointModel)
+        self._filter_points(self.filterEdit.text())
         self.list.selectionModel().selectionChanged.connect(lambda selected, deselected, func=self.action_handler: func(
             '_node_select', selected, deselected))
         del old
 
         self.scene.addWidget(self.points)
+        self.points.offset = self.depthSpinBox.value()
 
         # Create initial overlay and internal representation of graph data
         self.points.initPoints()
@@ -466,6 +529,7 @@ class MainWindow(qg.QMainWindow):
         # Pseudo-resize to fix point alignment after adding toolbar widgets
         self.view.resize(self.splitter.width(), self.splitter.width())
         self.imageLabel.resize(self.splitter.width(), self.splitter.width())
+        self._fit_level()
         self.scene.setSceneRect(qc.QRectF(0, 0, self.imageLabel.width() - 2, self.imageLabel.height() - 2))
 
         # Now draw new nodes
@@ -473,8 +537,8 @@ class MainWindow(qg.QMainWindow):
 
         self.minContrastSpinBox.valueChanged.connect(self._change_min_intensity)
         self.maxContrastSpinBox.valueChanged.connect(self._change_max_intensity)
-        global ts_helper
         ts_helper.setup_map(self.id)
+        self._preload_neighbours()
 
     def _find_points(self, *args, **kwargs):
         global ts_helper
@@ -584,6 +648,8 @@ class MainWindow(qg.QMainWindow):
             delta = -new_pos
             self.view.translate(delta.x(), delta.y())
             self.scale = 1.0
+        if self.stack is not None:
+            self._fit_level()
 
     def _change_min_intensity(self, i):
         """
@@ -611,13 +677,97 @@ class MainWindow(qg.QMainWindow):
         self._max_intensity = i
         self.view_slice(self.z)
 
+    def _filter_points(self, text):
+        """
+        Shows the points satisfying a filter in the point list. A filter that can't be read is marked on the filter
+        box, with the reason in its tool tip, and leaves the list as it was.
+
+        :param text: The filter
+
+        :type text: str
+
+        :return: None
+        """
+        model = self.list.model()
+        if model is None:
+            return
+        try:
+            model.set_filter(str(text))
+        except ValueError as e:
+            self.filterEdit.setStyleSheet("QLineEdit { color: red; }")
+            self.filterEdit.setToolTip(str(e))
+        else:
+            self.filterEdit.setStyleSheet("")
+            self.filterEdit.setToolTip(FILTER_TIP)
+
+    def _change_depth(self, depth):
+        """
+        Shows the overlay items within a number of slices of the current one. Only the slices entering or leaving the
+        window are updated.
+
+        :param depth: The number of slices above and below the current one
+
+        :type depth: int
+
+        :return: None
+        """
+        if self.points is None:
+            return
+        self.points.offset = depth
+        self.points.draw()
+
+    def _change_mapping(self, redraw=True):
+        """
+        Applies the intensity mapping and gamma currently chosen in the toolbar.
+
+        :param redraw: Whether to redraw the current slice with the new mapping
+
+        :type redraw: bool
+
+        :return: None
+        """
+        mapping = str(self.mappingComboBox.currentText())
+        self.gammaSpinBox.setEnabled(mapping == 'gamma')
+        self.contrast.set_mapping(mapping, self.gammaSpinBox.value())
+        if redraw and self.stack is not None:
+            self.view_slice(self.z)
+
+    def _fit_intensity_range(self):
+        """
+        Sets the range of the contrast controls to the intensities the current stack's data type can hold, so 16-bit
+        stacks can be adjusted over their full range. If the range changes, the contrast window is reset to span it
+        and the default mapping for the data type is selected. Does not redraw the slice.
+
+        :return: None
+        """
+        top = self.stack.max_intensity
+        if self.maxContrastSpinBox.maximum() == top:
+            return
+        controls = (self.minContrastSpinBox, self.minContrastBar, self.maxContrastSpinBox, self.maxContrastBar,
+                    self.mappingComboBox)
+        # Block signals so the slice isn't redrawn for every intermediate state
+        for control in controls:
+            control.blockSignals(True)
+        for control, value in zip(controls[:4], (0, 0, top, top)):
+            control.setRange(0, top)
+            control.setValue(value)
+        mapping = contrast.DEFAULT_MAPPINGS.get(self.stack.dtype.name, 'linear')
+        self.mappingComboBox.setCurrentIndex(contrast.MAPPINGS.index(mapping))
+        for control in controls:
+            control.blockSignals(False)
+        self._min_intensity = 0
+        self._max_intensity = top
+        self._change_mapping(redraw=False)
+
     def _change_view(self, *args, **kwargs):
         """
         Change the file seen in the current viewer.
 
         View either the previous or the next time point,
         if it exists, or switch between channels 1 and
-        2.
+        2. Stacks not already open are loaded in the
+        background, replacing any switch still loading;
+        the current slice stays interactive meanwhile.
 
         NOTE: Expects a working directory of only vascular
         stack TIFFs, alternating between channels 1 and 2,
@@ -636,64 +786,173 @@ class MainWindow(qg.QMainWindow):
         """
         if self.stack is None:
             return
-        dirpath = os.path.dirname(self.stack.directory)
+        find_points = 'find_points' in kwargs and kwargs['find_points']
+        # Keys pressed while a switch is loading move on from the stack being loaded
+        current = self.stack.directory
+        channel = self.channel
+        if self.loader.pending is not None and not find_points:
+            current, channel = self.loader.pending, self._pending_channel
+        try:
+            fname, channel = self._neighbour(current, args[0], channel)
+        except StackOutOfBoundsException as e:
+            print(e.args[0])
+            return
+
+        if fname is not None:
+            path = os.path.dirname(current) + '/' + fname
+            stack = ts_helper.pool.get(path)
+            if find_points:
+                if stack is None:
+                    stack = ts.TiffStack(path)
+                return stack
+            if stack is None:
+                stack = self.loader.request(path)
+            else:
+                self.loader.cancel()
+            if stack is not None:
+                self._show_stack(stack, channel)
+            else:
+                self._pending_channel = channel
+                self.loadProgress.show()
+                self.statusBar().showMessage('Loading {}...'.format(fname))
+
+    def _neighbour(self, current, key, channel):
+        """
+        Finds the file of the time point or channel next to a stack.
+
+        :param current: Path of the stack's TIFF file
+        :param key: Key from keyPressEvent; left and right change the time point, 1 and 2 the channel
+        :param channel: The channel of the stack
+
+        :type current: str
+        :type key: int
+        :type channel: int
+
+        :return: The name of the neighbouring file (None if the key changes nothing) and its channel
+
+        :rtype: tuple(str | None, int)
+
+        :raises StackOutOfBoundsException: If there is no such time point
+        """
+        dirpath = os.path.dirname(current)
         flist = [f for f in os.listdir(dirpath) if f.endswith('.tif') and not f.startswith('._')]
         if self.stack.type == 'Spines':
             flist = sorted(flist, key=lambda f_name: int(f_name.split('_')[1].lstrip('s')))
-        curr_index = flist.index(os.path.basename(self.stack.directory))
+        curr_index = flist.index(os.path.basename(current))
         fname = None
-        key = args[0]
-        try:
-            # Deal with time point change
-            if key == qc.Qt.Key_Right:
-                if curr_index < len(flist) - 3:
-                    fname = flist[curr_index + 2]
-                    if not fname.endswith('.tif'):
-                        raise StackOutOfBoundsException(
-                            "No future time point (end of hyperstack)"
-                        )
-                else:
+        # Deal with time point change
+        if key == qc.Qt.Key_Right:
+            if curr_index < len(flist) - 3:
+                fname = flist[curr_index + 2]
+                if not fname.endswith('.tif'):
                     raise StackOutOfBoundsException(
                         "No future time point (end of hyperstack)"
                     )
-            elif key == qc.Qt.Key_Left:
-                if curr_index > 1:
-                    fname = flist[curr_index - 2]
-                    if not fname.endswith('.tif'):
-                        raise StackOutOfBoundsException(
-                            "No previous time point (beginning of hyperstack)"
-                        )
-                else:
+            else:
+                raise StackOutOfBoundsException(
+                    "No future time point (end of hyperstack)"
+                )
+        elif key == qc.Qt.Key_Left:
+            if curr_index > 1:
+                fname = flist[curr_index - 2]
+                if not fname.endswith('.tif'):
                     raise StackOutOfBoundsException(
                         "No previous time point (beginning of hyperstack)"
                     )
+            else:
+                raise StackOutOfBoundsException(
+                    "No previous time point (beginning of hyperstack)"
+                )
+
+        # Deal with channel change
+        elif key == qc.Qt.Key_1 and channel != 1:
+            channel = 1
+            fname = flist[curr_index - 1]
+        elif key == qc.Qt.Key_2 and channel != 2:
+            channel = 2
+            fname = flist[curr_index + 1]
+        return fname, channel
+
+    def _show_stack(self, stack, channel):
+        """
+        Makes a loaded stack the one displayed, at the current depth, and starts preloading its neighbours.
 
-            # Deal with channel change
-            elif key == qc.Qt.Key_1 and self.channel != 1:
-                self.channel = 1
-                fname = flist[curr_index - 1]
-            elif key == qc.Qt.Key_2 and self.channel != 2:
-                self.channel = 2
-                fname = flist[curr_index + 1]
+        :param stack: The stack to display
+        :param channel: Its channel
 
-        except StackOutOfBoundsException as e:
-            print(e.args[0])
-            return
+        :type stack: tiffstack.TiffStack
+        :type channel: int
 
-        if fname is not None:
-            for stack in self.open_stacks:
-                if stack.fname == fname:
-                    self.stack = stack
-            if self.stack.fname != fname:
-                if 'find_points' in kwargs and kwargs['find_points']:
-                    return ts.TiffStack(dirpath + '/' + fname)
-                self.stack = ts.TiffStack(dirpath + '/' + fname)
-            self.view_slice(self.z)
-            if self.stack not in self.open_stacks:
-                try:
-                    self.open_stacks.append(self.stack)
-                except MemoryError:
-                    self.open_stacks[0] = self.stack
+        :return: None
+        """
+        self.stack = stack
+        self.channel = channel
+        self._fit_intensity_range()
+        self.view_slice(self.z)
+        ts_helper.pool.add(self.stack)
+        self._show_usage()
+        self._preload_neighbours()
+
+    def _show_usage(self):
+        """
+        Shows the memory held by open stacks in the status bar.
+
+        :return: None
+        """
+        usage = ts_helper.pool.usage()
+        self.memoryLabel.setText('{} stacks, {:.0f}/{:.0f} MB'.format(
+            usage['stacks'], usage['nbytes'] / 1048576.0, usage['max_bytes'] / 1048576.0))
+
+    def _preload_neighbours(self):
+        """
+        Speculatively loads the previous and next time points and the other channel of the current stack, so
+        switching to them is instant.
+
+        :return: None
+        """
+        paths = []
+        for key in (qc.Qt.Key_Right, qc.Qt.Key_Left, qc.Qt.Key_1, qc.Qt.Key_2):
+            try:
+                fname, _ = self._neighbour(self.stack.directory, key, self.channel)
+            except (StackOutOfBoundsException, IndexError):
+                continue
+            if fname is None or fname == self.stack.fname:
+                continue
+            path = os.path.dirname(self.stack.directory) + '/' + fname
+            if path not in ts_helper.pool:
+                paths.append(path)
+        self.loader.preload(paths)
+
+    def _stack_loaded(self, path, stack):
+        """
+        Slot receiving a stack loaded in the background; displays it.
+
+        :param path: Path of the stack's TIFF file
+        :param stack: The loaded stack
+
+        :type path: str
+        :type stack: tiffstack.TiffStack
+
+        :return: None
+        """
+        self.loadProgress.hide()
+        self.statusBar().clearMessage()
+        self._show_stack(stack, self._pending_channel)
+
+    def _stack_failed(self, path, message):
+        """
+        Slot receiving the error of a stack that failed to load in the background.
+
+        :param path: Path of the stack's TIFF file
+        :param message: The error message
+
+        :type path: str
+        :type message: str
+
+        :return: None
+        """
+        self.loadProgress.hide()
+        self.statusBar().showMessage('Could not load {}: {}'.format(os.path.basename(path), message))
 
 
 class _MyGraphicsView(qg.QGraphicsView):
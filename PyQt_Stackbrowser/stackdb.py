@@ -1,4 +1,4 @@
-import pandas as pd
+import mapmanager
 
 
 class StackDb:
@@ -14,30 +14,11 @@ class StackDb:
 
         :type fname: str
         """
-        self.data = {}
-        with open(fname, 'rU') as f:
-            line = f.readline().split(';')
-            if len(line) > 0:
-                line = line[:-1]
-            for pair in line:
-                _ = pair.split('=')
-                val = _[1]
-                if val.isdigit():
-                    val = int(val)
-                elif val == 'None':
-                    val = None
-                else:
-                    try:
-                        val = float(val)
-                    except ValueError:
-                        pass
-                self.data.update({_[0]: val})
-
-        self.dframe = pd.read_csv(fname, skiprows=1)
+        self.data, self.dframe = mapmanager.read(fname)
 
         if 'voxelx' in self.data:
             self.dx = self.data['voxelx']
         if 'voxely' in self.data:
             self.dy = self.data['voxely']
         if 'voxelz' in self.data:
-            self.dz = self.data['voxelz']
\ No newline at end of file
+            self.dz = self.data['voxelz']
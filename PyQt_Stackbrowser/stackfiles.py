@@ -0,0 +1,26 @@
+import os
+
+# Directories of the vascular databases, next to the stack images
+NODE_DIR = 'nodes'
+SLAB_DIR = 'slabs'
+EDGE_DIR = 'edges'
+
+# Scaling factor to go from um data to pixels for rendering
+# (number below is in um/pixel).
+DX = 0.216
+DY = 0.216
+
+
+def vascular_db_paths(directory):
+    """
+    Returns the paths of the node, slab and edge databases of a vascular stack, kept in directories next to the image.
+
+    :param directory: Path of the stack image
+
+    :type directory: str
+
+    :rtype: tuple(str, str, str)
+    """
+    prefix = os.path.basename(directory).split('ch')[0]
+    return tuple('{0}/{1}/{2}'.format(os.path.dirname(directory), db_dir, prefix + suffix)
+                 for db_dir, suffix in ((NODE_DIR, 'nT.txt'), (SLAB_DIR, 'sD.txt'), (EDGE_DIR, 'eT.txt')))
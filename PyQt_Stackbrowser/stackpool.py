@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+
+# Default memory budget of the stacks kept open, in bytes
+POOL_BYTES = 2 * 1024 * 1024 * 1024
+
+
+class StackPool(object):
+    """
+    Memory-bounded pool of open TiffStacks, shared by all windows of the application. Stacks are kept in least
+    recently used order and evicted oldest-first once their total size (image data and databases, see
+    TiffStack.nbytes) exceeds the budget. Stacks still displayed in a window are never evicted.
+    """
+    def __init__(self, max_bytes=POOL_BYTES, in_use=None):
+        """
+        Constructor; creates an empty pool.
+
+        :param max_bytes: Memory budget of the pool, in bytes
+        :param in_use: Function returning the stacks currently displayed, which must not be evicted
+
+        :type max_bytes: int
+        :type in_use: function
+        """
+        self.max_bytes = max_bytes
+        self.in_use = in_use
+        self.evicted = 0
+        self._stacks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        return path in self._stacks
+
+    def __len__(self):
+        return len(self._stacks)
+
+    def get(self, path):
+        """
+        Returns the open stack read from the given file, marking it as the most recently used.
+
+        :param path: Path of the stack's TIFF file
+
+        :type path: str
+
+        :return: The stack, or None if it is not open
+
+        :rtype: tiffstack.TiffStack | None
+        """
+        with self._lock:
+            stack = self._stacks.pop(path, None)
+            if stack is not None:
+                self._stacks[path] = stack
+            return stack
+
+    def add(self, stack):
+        """
+        Adds a stack to the pool (or marks it as the most recently used), then evicts the least recently used stacks
+        not in use until the pool is within budget.
+
+        :param stack: The stack to add
+
+        :type stack: tiffstack.TiffStack
+
+        :return: None
+        """
+        with self._lock:
+            self._stacks.pop(stack.directory, None)
+            self._stacks[stack.directory] = stack
+        self.evict()
+
+    def evict(self):
+        """
+        Evicts the least recently used stacks not in use until the pool is within budget. Evicted stacks release
+        their cached slices.
+
+        :return: None
+        """
+        keep = set(id(stack) for stack in self.in_use()) if self.in_use is not None else set()
+        with self._lock:
+            sizes = OrderedDict((path, stack.nbytes) for path, stack in self._stacks.items())
+            nbytes = sum(sizes.values())
+            for path, size in sizes.items():
+                if nbytes <= self.max_bytes:
+                    break
+                stack = self._stacks[path]
+                if id(stack) in keep:
+                    continue
+                del self._stacks[path]
+                stack.close()
+                nbytes -= size
+                self.evicted += 1
+
+    def usage(self):
+        """
+        Summarizes the memory held by the pool.
+
+        :return: The number of stacks open, their total size and the budget in bytes, and the number of stacks
+                 evicted so far
+
+        :rtype: dict[str, int]
+        """
+        with self._lock:
+            return {'stacks': len(self._stacks), 'nbytes': sum(stack.nbytes for stack in self._stacks.values()),
+                    'max_bytes': self.max_bytes, 'evicted': self.evicted}
@@ -1,27 +1,34 @@
 import os
+import threading
 import tifffile as tf
 import Tkinter as Tk
 import tkFileDialog
 import numpy as np
 import pandas as pd
-import igraph as ig
+import graphbuild as gb
+import graphexport as ge
+import graphmetrics as gm
 import nodedb as nd
 import slabdb as sd
 import edgedb as ed
 import stackdb
 import linedb as ld
-
-NODE_DIR = 'nodes'
-SLAB_DIR = 'slabs'
-EDGE_DIR = 'edges'
+import slicecache as sc
+import contrast
+import dbcache
+import stackfiles as sf
 
 STACKDB_DIR = '../stackdb'
 LINE_DIR = '../line'
 
-# Scaling factor to go from um data to pixels for rendering
-# (number below is in um/pixel).
-DX = 0.216
-DY = 0.216
+# Read stacks one page at a time (memory-mapping them where possible) instead of loading the whole file up front
+LAZY = True
+
+# Smallest width (in pixels) of a slice's most downsampled pyramid level
+MIN_LEVEL_WIDTH = 64
+
+# Attributes holding a stack's databases, where present
+DB_ATTRS = ('node_db', 'slab_db', 'edge_db', 'stack_db', 'line_db')
 
 
 class TiffStack:
@@ -30,20 +37,37 @@ class TiffStack:
     Requires TiffFile package.
     """
 
-    def __init__(self, directory):
+    def __init__(self, directory, lazy=None, cache_bytes=sc.CACHE_BYTES, prefetch_depth=sc.PREFETCH_DEPTH):
         """
         Constructor; loads image.
 
         :param directory: Directory of the image to load,
                           or file path if not a child of
                           the working directory.
+        :param lazy: Whether to read pages on demand rather
+                     than loading the whole stack into memory
+                     (module-level LAZY by default).
+        :param cache_bytes: Memory budget of the slice cache
+                            used in lazy mode, in bytes.
+        :param prefetch_depth: Number of slices to read ahead
+                               while scrolling in lazy mode.
 
         :type directory: str
+        :type lazy: bool
+        :type cache_bytes: int
+        :type prefetch_depth: int
         """
+        if lazy is None:
+            lazy = LAZY
         if directory == '':
             raise IOError
         self.directory = directory
         self.fname = os.path.basename(self.directory)
+        self.cache = None
+        self.pyramid = None
+        self._last_z = None
+        self._db_bytes = None
+        self._metrics = None
         _ = self.fname.split('_')
 
         if len(_) == 3:
@@ -52,9 +76,7 @@ class TiffStack:
             except IndexError:
                 pass
             self.type = 'Spines'
-            self.image = tf.TiffFile(self.directory)
-            self.imarray = self.image.asarray()
-            self.dtype = self.imarray.dtype
+            self._load_image(lazy, cache_bytes, prefetch_depth)
             self._stackdb_dir = '{0}/{1}/{2}'.format(
                 os.path.dirname(self.directory),
                 STACKDB_DIR, self.fname.split('ch')[0] + 'db2.txt')
@@ -67,8 +89,8 @@ class TiffStack:
                 self.dx = self.stack_db.dx
                 self.dy = self.stack_db.dy
             except AttributeError:
-                self.dx = DX
-                self.dy = DY
+                self.dx = sf.DX
+                self.dy = sf.DY
                 pass
 
         if len(_) == 4:
@@ -78,27 +100,40 @@ class TiffStack:
             except IndexError:
                 pass
             self.type = 'Vascular'
-            self.image = tf.TiffFile(self.directory)
+            self._load_image(lazy, cache_bytes, prefetch_depth)
+            self.dx, self.dy = sf.DX, sf.DY
+            self._node_dir, self._slab_dir, self._edge_dir = sf.vascular_db_paths(self.directory)
+            self.node_db = nd.NodeDb.from_csv(self._node_dir, sf.DX, sf.DY)
+            self.slab_db = sd.SlabDb.from_csv(self._slab_dir, sf.DX, sf.DY)
+            self.edge_db = ed.EdgeDb.from_csv(self._edge_dir)
+            self.dx, self.dy = sf.DX, sf.DY
+
+    def _load_image(self, lazy, cache_bytes, prefetch_depth):
+        """
+        Opens the TIFF file and sets up 'imarray', either as a fully loaded array or as a TiffPages view that decodes
+        pages on demand. The data is kept at its original bit depth; mapping it to display values is left to the
+        viewer (see contrast.ContrastEngine). Lazy stacks read slices through a SliceCache, and downsampled slices
+        (see get_level) are kept in a cache of their own.
+
+        :param lazy: Whether to read pages on demand
+        :param cache_bytes: Memory budget of the slice cache, in bytes
+        :param prefetch_depth: Number of slices to prefetch while scrolling
+
+        :type lazy: bool
+        :type cache_bytes: int
+        :type prefetch_depth: int
+
+        :return: None
+        """
+        self.image = tf.TiffFile(self.directory)
+        if lazy:
+            self.imarray = TiffPages(self.image, self.directory)
+            self.dtype = self.imarray.dtype
+            self.cache = sc.SliceCache(self._read_slice, self.maxz, cache_bytes, prefetch_depth)
+        else:
             self.imarray = self.image.asarray()
             self.dtype = self.imarray.dtype
-            self.dx, self.dy = DX, DY
-            self._node_dir = '{0}/{1}/{2}'.format(
-                os.path.dirname(self.directory),
-                NODE_DIR, self.fname.split('ch')[0] + 'nT.txt')
-            self._slab_dir = '{0}/{1}/{2}'.format(
-                os.path.dirname(self.directory),
-                SLAB_DIR, self.fname.split('ch')[0] + 'sD.txt')
-            self._edge_dir = '{0}/{1}/{2}'.format(
-                os.path.dirname(self.directory),
-                EDGE_DIR, self.fname.split('ch')[0] + 'eT.txt')
-            self.node_db = nd.NodeDb(pd.read_csv(self._node_dir), DX, DY)
-            self.slab_db = sd.SlabDb(pd.read_csv(self._slab_dir), DX, DY)
-            self.edge_db = ed.EdgeDb(pd.read_csv(self._edge_dir))
-            self.dx, self.dy = DX, DY
-
-        if self.dtype.name == 'uint16':
-            self.imarray = np.sqrt(self.imarray).astype('uint8')
-        #     # self.imarray = self.imarray.view('uint8')[:, ::2, :]
+        self.pyramid = sc.SliceCache(self._read_level, self.maxz, cache_bytes // 4, prefetch_depth)
 
     def load(self, attr):
         """
@@ -112,14 +147,16 @@ class TiffStack:
         to_load = makedialog('~/Desktop')
         if attr in self.__dict__.keys():
             if attr.endswith('db'):
-                to_load = pd.read_csv(to_load)
+                to_load = dbcache.read_csv(to_load)
                 if self.type == 'Vascular' and attr in ['node_db', 'slab_db']:
-                    n = self.__dict__[attr].__class__(to_load, DX, DY)
+                    n = self.__dict__[attr].__class__(to_load, sf.DX, sf.DY)
                     print(n)
                     self.__dict__[attr] = n
                 else:
                     n = self.__dict__[attr].__class__(to_load)
                     self.__dict__[attr] = n
+                self._db_bytes = None
+                self._metrics = None
 
     def get_slice(self, z):
         """
@@ -134,7 +171,108 @@ class TiffStack:
         :rtype: numpy.ndarray[][][int]
         """
         if 0 <= z <= self.maxz:
-            return self.imarray[z]
+            if self.cache is None:
+                return self.imarray[z]
+            stack_slice = self.cache.get(z)
+            # Read ahead in the direction the stack is being scrolled
+            self.cache.prefetch(z, self._scroll_direction(z))
+            return stack_slice
+
+    def get_level(self, z, level):
+        """
+        Returns the stack slice at the requested z-value, downsampled by a factor of 2 'level' times. Levels are
+        computed from the next finer level on first use and cached.
+
+        :param z: The depth of the stack slice being requested
+        :param level: The pyramid level; 0 is the full-resolution slice
+
+        :type z: int
+        :type level: int
+
+        :return: The requested slice
+
+        :rtype: numpy.ndarray[][][int]
+        """
+        if level <= 0:
+            return self.get_slice(z)
+        if 0 <= z <= self.maxz:
+            stack_slice = self.pyramid.get((z, level))
+            self.pyramid.prefetch(z, self._scroll_direction(z), key=lambda nz: (nz, level))
+            return stack_slice
+
+    def level_for(self, width):
+        """
+        Picks the most downsampled pyramid level that is still at least the given width, i.e. the smallest level that
+        does not lose detail when displayed at that width.
+
+        :param width: The on-screen width of the slice, in pixels
+
+        :type width: float
+
+        :return: The pyramid level
+
+        :rtype: int
+        """
+        full_width = self.imarray.shape[2]
+        level = 0
+        while full_width >> (level + 1) >= max(width, MIN_LEVEL_WIDTH):
+            level += 1
+        return level
+
+    def _scroll_direction(self, z):
+        """
+        Compares a requested depth with the previous one to tell which way the stack is being scrolled.
+
+        :param z: The depth being requested
+
+        :type z: int
+
+        :return: 1 if scrolling towards the end of the stack, -1 towards the start, 0 if unknown or not scrolling
+
+        :rtype: int
+        """
+        direction = 0
+        if self._last_z is not None:
+            direction = int(np.sign(z - self._last_z))
+        self._last_z = z
+        return direction
+
+    def _read_level(self, key):
+        """
+        Computes a pyramid level of a slice by downsampling the next finer level.
+
+        :param key: The depth of the slice and the level to compute
+
+        :type key: tuple(int, int)
+
+        :return: The downsampled slice
+
+        :rtype: numpy.ndarray
+        """
+        z, level = key
+        if level == 1:
+            finer = self.imarray[z] if self.cache is None else self.cache.get(z)
+        else:
+            finer = self.pyramid.get((z, level - 1))
+        return downsample(finer)
+
+    def _read_slice(self, z):
+        """
+        Reads a slice into memory for the slice cache; memory-mapped slices are copied so that caching them
+        actually keeps them resident.
+
+        :param z: The depth of the slice
+
+        :type z: int
+
+        :return: The slice
+
+        :rtype: numpy.ndarray
+        """
+        stack_slice = self.imarray[z]
+        if isinstance(stack_slice, np.memmap):
+            stack_slice = np.array(stack_slice)
+        return stack_slice
 
     @property
     def maxz(self):
@@ -147,37 +285,239 @@ class TiffStack:
         """
         return self.imarray.shape[0] - 1
 
-    def tograph(self):
-        g = ig.Graph()
-        g.add_vertices(self.node_db.dframe.shape[0])
-        for field in list(self.node_db.dframe):
-            if not self.node_db.dframe[field].isnull().values.any():
-                g.vs[field] = self.node_db.dframe[field].as_matrix().tolist()
-            else:
-                temp = self.node_db.dframe[field].as_matrix().tolist()
-                g.vs[field] = [str(i) for i in temp]
-        for edge in self.edge_db.dframe.itertuples():
-            g.add_edges([(int(edge.targetIdx), int(edge.sourceIdx))])
-
-            slabs = str(self.slab_db.dframe.loc[self.slab_db.dframe['edgeIdx'] == edge.i].T.to_dict().values())
-            g.es[edge.i]['Slabs'] = slabs
-
-        for field in list(self.edge_db.dframe):
-            if not self.edge_db.dframe[field].isnull().values.any():
-                g.es[field] = self.edge_db.dframe[field].as_matrix().tolist()
-            else:
-                temp = self.edge_db.dframe[field].as_matrix().tolist()
-                g.es[field] = [str(i) for i in temp]
-
-        g.write_graphml(self.fname.split('_ch')[0] + '.graphml')
+    @property
+    def max_intensity(self):
+        """
+        The largest intensity the stack's data type can hold.
+
+        :return: The maximum intensity (255 for non-integer data)
+
+        :rtype: int
+        """
+        if self.dtype.kind in 'ui':
+            return int(np.iinfo(self.dtype).max)
+        return 255
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the stack: its image data and its databases. Only the cached slices of lazy stacks are counted,
+        as the rest is read from disk on demand.
+
+        :return: The size of the stack in memory, in bytes
+
+        :rtype: int
+        """
+        nbytes = self.pyramid.nbytes
+        if self.cache is None:
+            nbytes += self.imarray.nbytes
+        else:
+            nbytes += self.cache.nbytes
+        if self._db_bytes is None:
+            # Databases don't change once loaded, so are only measured once
+            self._db_bytes = sum(int(getattr(self, attr).dframe.memory_usage(deep=True).sum())
+                                 for attr in DB_ATTRS if hasattr(self, attr))
+        return nbytes + self._db_bytes
+
+    def close(self):
+        """
+        Releases the stack's cached slices and stops its prefetch threads. The stack can still be used afterwards;
+        slices are then read again.
+
+        :return: None
+        """
+        for cache in (self.cache, self.pyramid):
+            if cache is not None:
+                cache.close()
+
+    def tograph(self, write=True):
+        """
+        Builds the graph of the stack's vascular network (see graphbuild.build_graph), with one vertex per node and one
+        edge per edge, and the geometry of each edge's slabs attached as numeric arrays.
+
+        :param write: Whether to also write the graph to a GraphML file next to the stack
+
+        :type write: bool
 
+        :rtype: igraph.Graph
+        """
+        g = gb.build_graph(self.node_db.dframe, self.edge_db.dframe, self.slab_db.dframe)
+        if write:
+            gb.write_graphml(g, self.fname.split('_ch')[0] + '.graphml')
         return g
 
+    def graph_metrics(self):
+        """
+        Returns the metrics of the stack's vascular network (see graphmetrics.compute), computed on first use and kept
+        until a database is reloaded.
+
+        :return: The node metrics and edge metrics, indexed as the node and edge databases
+        :rtype: tuple(pandas.DataFrame, pandas.DataFrame)
+        """
+        if self._metrics is None:
+            self._metrics = gm.compute(self.node_db, self.edge_db, self.slab_db)
+        return self._metrics
+
+    def export_graph(self, binary=False):
+        """
+        Writes the graph of the stack's vascular network next to the stack, straight from its databases (see
+        graphexport), without building it in memory.
+
+        :param binary: Whether to write the compact binary format (.npz) instead of GraphML
+
+        :type binary: bool
+
+        :return: Path of the file written
+        :rtype: str
+        """
+        write, ext = (ge.write_binary, '.npz') if binary else (ge.write_graphml, '.graphml')
+        fname = self.fname.split('_ch')[0] + ext
+        write(self.node_db.dframe, self.edge_db.dframe, self.slab_db.dframe, fname)
+        return fname
+
+
+class TiffPages(object):
+    """
+    Read-only, array-like view of the pages of a TIFF file. A page is only read from disk when it is indexed, and
+    files whose pages are stored uncompressed and back to back are memory-mapped instead. Shape and dtype come from
+    the page headers, so nothing is decoded up front. Supports the part of the numpy interface the browsers use
+    (shape, dtype, len() and indexing along the first axis).
+    """
+
+    def __init__(self, image, fpath, transform=None):
+        """
+        Constructor; reads the page headers and memory-maps the pixel data if possible.
+
+        :param image: The open TIFF file
+        :param fpath: Path of the TIFF file (used for memory-mapping)
+        :param transform: Optional function applied to every page after it is read
+
+        :type image: tifffile.TiffFile
+        :type fpath: str
+        :type transform: function
+        """
+        self.image = image
+        self.pages = image.pages
+        self.transform = transform
+        self.page_shape = tuple(self.pages[0].shape)
+        self.dtype = np.dtype(self.pages[0].dtype).newbyteorder('=')
+        # TiffFile reads through a single file handle, so decoding is serialized
+        self._lock = threading.Lock()
+        self._mmap = self._memmap(fpath)
+
+    def _memmap(self, fpath):
+        """
+        Memory-maps the stack if every page is uncompressed, contiguous and the same distance from the previous one.
+
+        :param fpath: Path of the TIFF file
+
+        :type fpath: str
+
+        :return: The memory-mapped stack, or None if the file layout does not allow it
+
+        :rtype: numpy.memmap | None
+        """
+        try:
+            segments = [page.is_contiguous for page in self.pages]
+        except AttributeError:
+            return None
+        if not all(segments):
+            return None
+        start, size = segments[0]
+        if size != int(np.prod(self.page_shape)) * self.dtype.itemsize:
+            return None
+        for i, (offset, _) in enumerate(segments):
+            if offset != start + i * size:
+                return None
+        dtype = self.dtype.newbyteorder(self.image.byteorder)
+        return np.memmap(fpath, dtype=dtype, mode='r', offset=start, shape=self.shape)
+
+    @property
+    def shape(self):
+        return (len(self.pages),) + self.page_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def is_memmapped(self):
+        return self._mmap is not None
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __array__(self, dtype=None):
+        a = self[:]
+        if dtype is not None:
+            a = a.astype(dtype)
+        return a
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            if isinstance(key[0], slice):
+                return self[key[0]][(slice(None),) + key[1:]]
+            return self[key[0]][key[1:]]
+        if isinstance(key, slice):
+            return np.array([self[z] for z in range(*key.indices(len(self)))])
+        z = int(key)
+        if z < 0:
+            z += len(self)
+        if not 0 <= z < len(self):
+            raise IndexError('page {} out of range for a stack of {} pages'.format(key, len(self)))
+        page = self._read(z)
+        if self.transform is not None:
+            page = self.transform(page)
+        return page
+
+    def _read(self, z):
+        """
+        Reads a single page.
+
+        :param z: Index of the page
+
+        :type z: int
+
+        :return: The page data
+
+        :rtype: numpy.ndarray
+        """
+        if self._mmap is not None:
+            page = self._mmap[z]
+            if not page.dtype.isnative:
+                page = page.astype(self.dtype)
+            return page
+        with self._lock:
+            return self.pages[z].asarray()
+
+
+def downsample(stack_slice):
+    """
+    Halves the width and height of a slice by averaging each 2x2 block of pixels. An odd last row or column is
+    dropped.
+
+    :param stack_slice: The slice to downsample
+
+    :type stack_slice: numpy.ndarray[][int]
+
+    :return: The downsampled slice, of the same data type
+
+    :rtype: numpy.ndarray[][int]
+    """
+    h, w = stack_slice.shape[0] // 2 * 2, stack_slice.shape[1] // 2 * 2
+    integer = stack_slice.dtype.kind in 'ui'
+    blocks = stack_slice[:h, :w].astype(np.uint32 if integer else np.float64)
+    total = blocks[0::2, 0::2] + blocks[1::2, 0::2] + blocks[0::2, 1::2] + blocks[1::2, 1::2]
+    if integer:
+        return ((total + 2) // 4).astype(stack_slice.dtype)
+    return (total / 4).astype(stack_slice.dtype)
+
 
 def adjust_contrast(stack_slice, new_min, new_max):
     """
     Convenience function that performs contrast stretching on a single slice of the stack. Stretches the image
-    histogram to fall within the privided minimum and maximum intensities.
+    histogram to fall within the privided minimum and maximum intensities. See contrast.ContrastEngine for repeated
+    adjustments with the same window.
 
     :param stack_slice: An unaltered slice from the original stack
     :param new_min: The new minimum intensity
@@ -190,10 +530,7 @@ def adjust_contrast(stack_slice, new_min, new_max):
     :return: The requested slice with adjusted contrast
     :rtype: numpy.ndarray[][][int]
     """
-    stack_slice = (stack_slice - new_min * 1.0) * 255 / (new_max - new_min)
-    stack_slice[stack_slice <= 0] = 0
-    stack_slice[stack_slice >= 255] = 255
-    return stack_slice.astype('uint8')
+    return contrast.ContrastEngine(new_min, new_max, fold_8bit=False).apply(stack_slice)
 
 
 def new():
@@ -0,0 +1,57 @@
+class VisibilityManager(object):
+    """
+    Tracks the window of slices whose overlay items are shown. Moving the window hides the slices leaving it and
+    shows those entering it, found as the set difference of the previous and new window, so a scroll step touches
+    two slices whatever the size of the window, and a jump to any slice is handled the same way.
+    """
+    def __init__(self, show, hide):
+        """
+        Constructor; starts with no slice shown.
+
+        :param show: Function showing the items of the given slices
+        :param hide: Function hiding the items of the given slices
+
+        :type show: function
+        :type hide: function
+        """
+        self.show = show
+        self.hide = hide
+        self.shown = set()
+
+    def __contains__(self, z):
+        return z in self.shown
+
+    def update(self, top, bot):
+        """
+        Moves the window to a range of slices. The window is updated before the leaving slices are hidden, so items
+        spanning slices can check whether they are still in it.
+
+        :param top: The first slice of the range
+        :param bot: The last slice of the range
+
+        :type top: int
+        :type bot: int
+
+        :return: The slices entering and leaving the window, in increasing order
+        :rtype: tuple(list[int], list[int])
+        """
+        window = set(range(top, bot + 1))
+        entering = sorted(window - self.shown)
+        leaving = sorted(self.shown - window)
+        self.shown = window
+        if leaving:
+            self.hide(leaving)
+        if entering:
+            self.show(entering)
+        return entering, leaving
+
+    def clear(self):
+        """
+        Hides every slice shown.
+
+        :return: None
+        """
+        leaving = sorted(self.shown)
+        self.shown = set()
+        if leaving:
+            self.hide(leaving)
@@ -1,4 +1,5 @@
 import os
+import threading
 import tifffile as tf
 import Tkinter as Tk
 import tkFileDialog
@@ -23,6 +24,9 @@ LINE_DIR = '../line'
 DX = 0.216
 DY = 0.216
 
+# Read stacks one page at a time (memory-mapping them where possible) instead of loading the whole file up front
+LAZY = True
+
 
 class TiffStack:
     """
@@ -30,16 +34,22 @@ class TiffStack:
     Requires TiffFile package.
     """
 
-    def __init__(self, directory):
+    def __init__(self, directory, lazy=None):
         """
         Constructor; loads image.
 
         :param directory: Directory of the image to load,
                           or file path if not a child of
                           the working directory.
+        :param lazy: Whether to read pages on demand rather
+                     than loading the whole stack into memory
+                     (module-level LAZY by default).
 
         :type directory: str
+        :type lazy: bool
         """
+        if lazy is None:
+            lazy = LAZY
         self.directory = directory
         self.fname = os.path.basename(self.directory)
         _ = self.fname.split('_')
@@ -50,9 +60,7 @@ class TiffStack:
             except IndexError:
                 pass
             self.type = 'Spines'
-            self.image = tf.TiffFile(self.directory)
-            self.imarray = self.image.asarray()
-            self.dtype = self.imarray.dtype
+            self._load_image(lazy)
             self._stackdb_dir = '{0}/{1}/{2}'.format(
                 os.path.dirname(self.directory),
                 STACKDB_DIR, self.fname.split('ch')[0] + 'db2.txt')
@@ -76,9 +84,7 @@ class TiffStack:
             except IndexError:
                 pass
             self.type = 'Vascular'
-            self.image = tf.TiffFile(self.directory)
-            self.imarray = self.image.asarray()
-            self.dtype = self.imarray.dtype
+            self._load_image(lazy)
             self.dx, self.dy = DX, DY
             self._node_dir = '{0}/{1}/{2}'.format(
                 os.path.dirname(self.directory),
@@ -94,9 +100,28 @@ class TiffStack:
             self.edge_db = ed.EdgeDb(pd.read_csv(self._edge_dir))
             self.dx, self.dy = DX, DY
 
-        if self.dtype.name == 'uint16':
-            self.imarray = np.floor(np.sqrt(self.imarray)).astype('uint8')
-            # self.imarray = self.imarray.view('uint8')[:, ::2, :]
+    def _load_image(self, lazy):
+        """
+        Opens the TIFF file and sets up 'imarray', either as a fully loaded array or as a TiffPages view that decodes
+        pages on demand. 16-bit stacks are reduced to 8 bits, per page in the lazy case.
+
+        :param lazy: Whether to read pages on demand
+
+        :type lazy: bool
+
+        :return: None
+        """
+        self.image = tf.TiffFile(self.directory)
+        if lazy:
+            self.imarray = TiffPages(self.image, self.directory)
+            self.dtype = self.imarray.dtype
+            if self.dtype.name == 'uint16':
+                self.imarray.transform = _to_uint8
+        else:
+            self.imarray = self.image.asarray()
+            self.dtype = self.imarray.dtype
+            if self.dtype.name == 'uint16':
+                self.imarray = _to_uint8(self.imarray)
 
     def load(self, attr):
         """
@@ -172,6 +197,136 @@ class TiffStack:
         return g
 
 
+class TiffPages(object):
+    """
+    Read-only, array-like view of the pages of a TIFF file. A page is only read from disk when it is indexed, and
+    files whose pages are stored uncompressed and back to back are memory-mapped instead. Shape and dtype come from
+    the page headers, so nothing is decoded up front. Supports the part of the numpy interface the browsers use
+    (shape, dtype, len() and indexing along the first axis).
+    """
+
+    def __init__(self, image, fpath, transform=None):
+        """
+        Constructor; reads the page headers and memory-maps the pixel data if possible.
+
+        :param image: The open TIFF file
+        :param fpath: Path of the TIFF file (used for memory-mapping)
+        :param transform: Optional function applied to every page after it is read
+
+        :type image: tifffile.TiffFile
+        :type fpath: str
+        :type transform: function
+        """
+        self.image = image
+        self.pages = image.pages
+        self.transform = transform
+        self.page_shape = tuple(self.pages[0].shape)
+        self.dtype = np.dtype(self.pages[0].dtype).newbyteorder('=')
+        # TiffFile reads through a single file handle, so decoding is serialized
+        self._lock = threading.Lock()
+        self._mmap = self._memmap(fpath)
+
+    def _memmap(self, fpath):
+        """
+        Memory-maps the stack if every page is uncompressed, contiguous and the same distance from the previous one.
+
+        :param fpath: Path of the TIFF file
+
+        :type fpath: str
+
+        :return: The memory-mapped stack, or None if the file layout does not allow it
+
+        :rtype: numpy.memmap | None
+        """
+        try:
+            segments = [page.is_contiguous for page in self.pages]
+        except AttributeError:
+            return None
+        if not all(segments):
+            return None
+        start, size = segments[0]
+        if size != int(np.prod(self.page_shape)) * self.dtype.itemsize:
+            return None
+        for i, (offset, _) in enumerate(segments):
+            if offset != start + i * size:
+                return None
+        dtype = self.dtype.newbyteorder(self.image.byteorder)
+        return np.memmap(fpath, dtype=dtype, mode='r', offset=start, shape=self.shape)
+
+    @property
+    def shape(self):
+        return (len(self.pages),) + self.page_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def is_memmapped(self):
+        return self._mmap is not None
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __array__(self, dtype=None):
+        a = self[:]
+        if dtype is not None:
+            a = a.astype(dtype)
+        return a
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            if isinstance(key[0], slice):
+                return self[key[0]][(slice(None),) + key[1:]]
+            return self[key[0]][key[1:]]
+        if isinstance(key, slice):
+            return np.array([self[z] for z in range(*key.indices(len(self)))])
+        z = int(key)
+        if z < 0:
+            z += len(self)
+        if not 0 <= z < len(self):
+            raise IndexError('page {} out of range for a stack of {} pages'.format(key, len(self)))
+        page = self._read(z)
+        if self.transform is not None:
+            page = self.transform(page)
+        return page
+
+    def _read(self, z):
+        """
+        Reads a single page.
+
+        :param z: Index of the page
+
+        :type z: int
+
+        :return: The page data
+
+        :rtype: numpy.ndarray
+        """
+        if self._mmap is not None:
+            page = self._mmap[z]
+            if not page.dtype.isnative:
+                page = page.astype(self.dtype)
+            return page
+        with self._lock:
+            return self.pages[z].asarray()
+
+
+def _to_uint8(imarray):
+    """
+    Reduces 16-bit image data to 8 bits by taking its square root.
+
+    :param imarray: The 16-bit data
+
+    :type imarray: numpy.ndarray
+
+    :return: The 8-bit data
+
+    :rtype: numpy.ndarray
+    """
+    return np.sqrt(imarray).astype('uint8')
+
+
 def adjust_contrast(stack_slice, new_min, new_max):
     """
     Convenience function that performs contrast stretching on a single slice of the stack. Stretches the image